@@ -0,0 +1,134 @@
+"""
+This script locates the image files of the games and caches the decoded
+sprites in a sprite atlas, so that importing a game does not need pygame.
+
+Image files are looked up in the directory of this file, not in the current
+working directory. The first time a game is imported, its images are decoded
+with pygame and converted into rasterizer Sprites, which are packed side by
+side along x into a single uint8 array of shape (total width, max height, 4):
+premultiplied RGB in the first three channels and alpha in the last one. The
+atlas is saved as sprite_cache/<name>.npy, with an index sprite_cache/<name>.json
+giving the position and size of each sprite and the size and modification
+time of its source file. Later imports (e.g. in every worker process) memory
+map the .npy file instead of decoding the images. The atlas is rebuilt when a
+source file changes. If the cache directory cannot be written, the atlas is
+only kept in memory.
+"""
+
+import json
+import os
+
+import numpy as np
+
+import rasterizer
+
+ASSET_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(ASSET_DIR, 'sprite_cache')
+ATLAS_VERSION = 1
+
+
+def asset_path(filename):
+    return os.path.join(ASSET_DIR, filename)
+
+
+def _sources(files):
+    """
+    Return the size and modification time of each source file, used to tell
+    whether a stored atlas is up to date.
+    """
+    sources = {}
+    for name, filename in files.items():
+        stat = os.stat(asset_path(filename))
+        sources[name] = [filename, stat.st_size, int(stat.st_mtime)]
+    return sources
+
+
+def build_atlas(files):
+    """
+    Decode the images and pack them into an atlas.
+
+    Arguments:
+        files: dict mapping sprite names to image file names.
+    Return:
+        atlas: uint8 array of shape (total width, max height, 4).
+        sprites: dict mapping sprite names to [x, width, height], the
+        position of the sprite along the first axis of the atlas and its size.
+    """
+    import pygame
+    decoded = []
+    for name in sorted(files):
+        decoded.append((name, rasterizer.sprite_from_surface(pygame.image.load(asset_path(files[name])))))
+    atlas = np.zeros((sum(sprite.width for _, sprite in decoded),
+                      max(sprite.height for _, sprite in decoded), 4), dtype=np.uint8)
+    sprites = {}
+    x = 0
+    for name, sprite in decoded:
+        atlas[x:x + sprite.width, :sprite.height, :3] = sprite.rgb
+        atlas[x:x + sprite.width, :sprite.height, 3] = sprite.alpha
+        sprites[name] = [x, sprite.width, sprite.height]
+        x += sprite.width
+    return atlas, sprites
+
+
+def _read_atlas(name, sources):
+    """
+    Return the stored atlas (memory mapped) and its sprite index, or None if
+    it is missing or out of date.
+    """
+    try:
+        with open(os.path.join(CACHE_DIR, name + '.json')) as f:
+            index = json.load(f)
+        if index.get('version') != ATLAS_VERSION or index.get('sources') != sources:
+            return None
+        atlas = np.load(os.path.join(CACHE_DIR, name + '.npy'), mmap_mode='r')
+        if list(atlas.shape) != index['shape']:
+            return None
+        return atlas, index['sprites']
+    except (IOError, OSError, ValueError, KeyError):
+        return None
+
+
+def _write_atlas(name, atlas, index):
+    """
+    Store the atlas and its index. Each file is written under a temporary name
+    and renamed, so that processes starting at the same time never read a
+    partial file.
+    """
+    try:
+        if not os.path.isdir(CACHE_DIR):
+            os.makedirs(CACHE_DIR)
+        suffix = '.%d.tmp' % os.getpid()
+        path = os.path.join(CACHE_DIR, name + '.npy')
+        with open(path + suffix, 'wb') as f:
+            np.save(f, atlas)
+        os.rename(path + suffix, path)
+        path = os.path.join(CACHE_DIR, name + '.json')
+        with open(path + suffix, 'w') as f:
+            json.dump(index, f, sort_keys=True)
+        os.rename(path + suffix, path)
+    except (IOError, OSError):
+        pass # read-only install: the atlas stays in memory
+
+
+def load_sprites(name, files):
+    """
+    Return a dict of rasterizer Sprites, one per entry of files, read from
+    the atlas called name (built and stored first if needed).
+
+    Arguments:
+        name: str, name of the atlas, e.g. 'pong'.
+        files: dict mapping sprite names to image file names.
+    """
+    sources = _sources(files)
+    stored = _read_atlas(name, sources)
+    if stored is None:
+        atlas, sprites = build_atlas(files)
+        _write_atlas(name, atlas, {'version': ATLAS_VERSION, 'sources': sources,
+                                   'shape': list(atlas.shape), 'sprites': sprites})
+    else:
+        atlas, sprites = stored
+    result = {}
+    for sprite_name, (x, width, height) in sprites.items():
+        cell = atlas[x:x + width, :height]
+        result[str(sprite_name)] = rasterizer.Sprite(cell[:, :, :3], cell[:, :, 3])
+    return result
@@ -0,0 +1,379 @@
+"""
+Benchmarks of the games: Pong, HunterPrey, their batched versions VectorPong
+and VectorHunterPrey, and Pong in a SubprocEnvPool. The sweep covers
+two_players, num_hunters/num_preys, render and observation modes, step or
+step_into (the cases with step_into=True), batch sizes and worker counts.
+Each case runs in its own process and reports:
+    steps_per_sec: game steps per second (a batched call of N games counts N steps).
+    latency_p50, latency_p99: seconds per call to step.
+    alloc_bytes_per_step: peak memory allocated during a call to step, as seen
+    by tracemalloc. None on interpreters without tracemalloc.reset_peak
+    (Python < 3.9), with the reason in alloc_note: always the case for
+    HunterPrey and VectorHunterPrey, which only run on Python 2.
+    peak_rss: peak resident memory of the process running the case, in bytes.
+
+Usage (from the repository root):
+    python benchmarks/run.py [--quick] [--filter TEXT] [--steps N] [--output FILE]
+                             [--baseline FILE] [--tolerance 0.2] [--save-baseline FILE]
+
+--output writes the results as JSON. --save-baseline stores them as the new
+baseline. --baseline compares steps_per_sec with a stored baseline and exits
+with status 1 if a case is slower by more than the tolerance, or if a case of
+the baseline selected by this run has no steps_per_sec any more (it failed,
+was skipped or is not in the sweep). Baselines are only meaningful on the
+machine that produced them.
+
+HunterPrey is written for Python 2: under Python 3 its cases, and those of
+VectorHunterPrey, are reported as skipped.
+"""
+
+import argparse
+import functools
+import json
+import os
+import platform
+import subprocess
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from profiling import timer
+
+GRAY_80 = [80, 80, True] # ObservationSpec((80, 80), grayscale=True)
+
+
+def case_name(case):
+    return case['game'] + ''.join('/%s=%s' % (key, case[key]) for key in sorted(case) if key != 'game')
+
+
+def build_cases(quick):
+    """
+    Return the list of benchmark cases. Each case is a dict with a 'game' key
+    and the parameters of that game.
+    """
+    pong_modes = [('headless', 'pixels', None), ('headless', 'pixels', GRAY_80),
+                  ('none', 'vector', None), ('headless', 'vector', None)]
+    hunter_prey_modes = [('headless', 'pixels', None), ('headless', 'pixels', GRAY_80),
+                         ('none', 'vector', None)]
+    sizes = [(2, 3), (10, 20), (50, 100)]
+    batches = [1, 64, 512]
+    workers = [1, 2, 4]
+    if quick:
+        pong_modes = pong_modes[1:3]
+        hunter_prey_modes = hunter_prey_modes[1:]
+        sizes = sizes[:1]
+        batches = [64]
+        workers = [2]
+
+    cases = []
+    for two_players in (True, False):
+        for render_mode, observation_type, spec in pong_modes:
+            cases.append(dict(game='pong', two_players=two_players, render_mode=render_mode,
+                              observation_type=observation_type, spec=spec))
+    # the same games stepped with step_into, writing into preallocated arrays
+    for render_mode, observation_type, spec in pong_modes:
+        cases.append(dict(game='pong', two_players=True, render_mode=render_mode,
+                          observation_type=observation_type, spec=spec, step_into=True))
+    for num_hunters, num_preys in sizes:
+        for render_mode, observation_type, spec in hunter_prey_modes:
+            for step_into in (False, True):
+                case = dict(game='hunter_prey', num_hunters=num_hunters, num_preys=num_preys,
+                            render_mode=render_mode, observation_type=observation_type, spec=spec)
+                if step_into:
+                    case['step_into'] = True
+                cases.append(case)
+    for batch in batches:
+        for render in (False, True):
+            cases.append(dict(game='vector_pong', batch=batch, render=render))
+            cases.append(dict(game='vector_hunter_prey', batch=batch, num_hunters=2, num_preys=3,
+                              render=render))
+    for num_workers in workers:
+        cases.append(dict(game='pool', workers=num_workers, envs_per_worker=4, spec=GRAY_80))
+    return cases
+
+
+def make_spec(spec):
+    if spec is None:
+        return None
+    import observation
+    return observation.ObservationSpec(spec[:2], grayscale=spec[2])
+
+
+def make_pool_env(spec):
+    import pong
+    return pong.Pong(render_mode='headless', observation_spec=make_spec(spec))
+
+
+def consume(states):
+    # HunterPrey builds the state of a prey when it is accessed: touch them all
+    for state in states:
+        pass
+
+
+def make_stepper(case, rng):
+    """
+    Build the game of a case.
+
+    Return:
+        step: function without arguments advancing the game(s) by one step
+        with random actions.
+        batch: number of game steps done by one call to step.
+        close: function releasing the game(s).
+    """
+    game = case['game']
+    nothing = lambda: None
+    if game == 'pong':
+        import pong
+        env = pong.Pong(two_players=case['two_players'], render_mode=case['render_mode'],
+                        observation_spec=make_spec(case['spec']),
+                        observation_type=case['observation_type'])
+        actions = rng.randint(0, 3, size=(4096, 2 if case['two_players'] else 1)).tolist()
+        counter = [0]
+
+        def step():
+            counter[0] += 1
+            if case.get('step_into'):
+                env.step_into(actions[counter[0] % len(actions)])
+            else:
+                consume(env.step(actions[counter[0] % len(actions)])[0])
+        return step, 1, nothing
+    if game == 'hunter_prey':
+        import hunter_prey_2
+        env = hunter_prey_2.HunterPrey(case['num_hunters'], case['num_preys'],
+                                       render_mode=case['render_mode'],
+                                       observation_spec=make_spec(case['spec']),
+                                       observation_type=case['observation_type'])
+        actions = rng.randint(0, 5, size=(4096, case['num_preys'])).tolist()
+        counter = [0]
+
+        def step():
+            counter[0] += 1
+            if case.get('step_into'):
+                env.step_into(actions[counter[0] % len(actions)])
+            else:
+                consume(env.step(actions[counter[0] % len(actions)])[0])
+        return step, 1, nothing
+    if game == 'vector_pong':
+        import vector_pong
+        env = vector_pong.VectorPong(case['batch'], seed=0)
+        actions = rng.randint(0, 3, size=(64, case['batch'], 2))
+        frames = np.zeros((case['batch'], 2, vector_pong.SCREENWIDTH, vector_pong.SCREENHEIGHT, 3),
+                          dtype=np.uint8)
+        counter = [0]
+
+        def step():
+            counter[0] += 1
+            env.step(actions[counter[0] % len(actions)])
+            if case['render']:
+                env.render(out=frames)
+        return step, case['batch'], nothing
+    if game == 'vector_hunter_prey':
+        import vector_hunter_prey
+        env = vector_hunter_prey.VectorHunterPrey(case['batch'], case['num_hunters'], case['num_preys'], seed=0)
+        actions = rng.randint(0, 5, size=(64, case['batch'], case['num_preys']))
+        frames = np.zeros((case['batch'], case['num_preys'], vector_hunter_prey.SCREENWIDTH,
+                           vector_hunter_prey.SCREENHEIGHT, 3), dtype=np.uint8)
+        counter = [0]
+
+        def step():
+            counter[0] += 1
+            env.step(actions[counter[0] % len(actions)])
+            if case['render']:
+                env.render(out=frames)
+        return step, case['batch'], nothing
+    if game == 'pool':
+        import env_pool
+        pool = env_pool.SubprocEnvPool(functools.partial(make_pool_env, case['spec']),
+                                       case['workers'], case['envs_per_worker'], seed=0)
+        actions = rng.randint(0, 3, size=(64, pool.num_envs, 2))
+        counter = [0]
+
+        def step():
+            counter[0] += 1
+            pool.step(actions[counter[0] % len(actions)])
+        return step, pool.num_envs, pool.close
+    raise ValueError('unknown game ' + game)
+
+
+def allocated_per_step(step, count):
+    """
+    Mean over count calls of the peak memory allocated during step, or None
+    if tracemalloc cannot reset its peak (Python < 3.9).
+    """
+    try:
+        import tracemalloc
+        tracemalloc.reset_peak
+    except (ImportError, AttributeError):
+        return None
+    tracemalloc.start()
+    total = 0
+    for _ in range(count):
+        tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        step()
+        total += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+    return float(total) / count
+
+
+def peak_rss():
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def measure(case, steps, warmup):
+    """
+    Run one case in the current process and return its measurements.
+    """
+    if case['game'] in ('hunter_prey', 'vector_hunter_prey') and sys.version_info[0] >= 3:
+        return {'skipped': 'hunter_prey_2 requires Python 2'}
+    rng = np.random.RandomState(0)
+    step, batch, close = make_stepper(case, rng)
+    try:
+        for _ in range(warmup):
+            step()
+        latencies = np.zeros(steps)
+        for k in range(steps):
+            start = timer()
+            step()
+            latencies[k] = timer() - start
+        alloc = allocated_per_step(step, min(steps, 50))
+    finally:
+        close()
+    p50, p99 = np.percentile(latencies, [50, 99])
+    result = {'steps_per_sec': steps * batch / latencies.sum(),
+              'latency_p50': p50,
+              'latency_p99': p99,
+              'alloc_bytes_per_step': None if alloc is None else alloc / batch,
+              'peak_rss': peak_rss(),
+              'batch': batch,
+              'steps': steps}
+    if alloc is None:
+        result['alloc_note'] = 'not measured: tracemalloc.reset_peak needs Python 3.9+'
+    return result
+
+
+def run_in_subprocess(case, steps, warmup):
+    """
+    Run one case in a new interpreter, so that the peak RSS and the pygame
+    state of a case do not leak into the next one.
+    """
+    env = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT='1')
+    command = [sys.executable, os.path.abspath(__file__), '--case', json.dumps(case),
+               '--steps', str(steps), '--warmup', str(warmup)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+    out, err = process.communicate()
+    for line in out.decode('utf-8', 'replace').splitlines():
+        if line.startswith('RESULT '):
+            return json.loads(line[len('RESULT '):])
+    lines = err.decode('utf-8', 'replace').strip().splitlines()
+    return {'error': lines[-1] if lines else 'exit status %d' % process.returncode}
+
+
+def compare(results, baseline, tolerance, expected=()):
+    """
+    Compare steps_per_sec with the baseline.
+
+    Arguments:
+        results: the results of this run, by case name.
+        baseline: the results of the baseline, by case name.
+        tolerance: allowed relative slowdown.
+        expected: names of the baseline cases this run should have measured,
+        in addition to the names of results.
+    Return:
+        The names of the failed cases: slower than (1 - tolerance) times
+        their baseline, or measured in the baseline but without a
+        steps_per_sec in this run (error, skipped, or not run at all).
+    """
+    failures = []
+    for name in sorted(set(results) | set(expected)):
+        old = baseline.get(name, {}).get('steps_per_sec')
+        result = results.get(name, {'error': 'not run'})
+        new = result.get('steps_per_sec')
+        if old is None:
+            if new is not None:
+                print('%-90s %10s -> %10.1f  (no baseline)' % (name, '-', new))
+            continue
+        if new is None:
+            failures.append(name)
+            print('%-90s %10.1f -> FAILED: %s' % (name, old, result.get('error') or result.get('skipped')))
+            continue
+        ratio = new / old
+        flag = ''
+        if ratio < 1 - tolerance:
+            failures.append(name)
+            flag = '  REGRESSION'
+        print('%-90s %10.1f -> %10.1f  x%.2f%s' % (name, old, new, ratio, flag))
+    return failures
+
+
+def format_result(name, result):
+    if 'steps_per_sec' not in result:
+        return '%-90s %s' % (name, result.get('skipped') or result.get('error'))
+    alloc = result['alloc_bytes_per_step']
+    return '%-90s %10.1f steps/s  p50 %8.3f ms  p99 %8.3f ms  alloc %s  rss %.1f MB' % (
+        name, result['steps_per_sec'], 1000 * result['latency_p50'], 1000 * result['latency_p99'],
+        'n/a (%s)' % result.get('alloc_note') if alloc is None else '%d B' % alloc,
+        (result['peak_rss'] or 0) / 2.0**20)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Pong and HunterPrey.')
+    parser.add_argument('--quick', action='store_true', help='run a small subset of the sweep')
+    parser.add_argument('--filter', default='', help='only run the cases whose name contains this text')
+    parser.add_argument('--steps', type=int, default=500, help='timed calls to step per case')
+    parser.add_argument('--warmup', type=int, default=20, help='untimed calls to step per case')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare with the results stored in this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed relative slowdown before a case counts as a regression')
+    parser.add_argument('--save-baseline', help='store the results as a baseline in this JSON file')
+    parser.add_argument('--case', help=argparse.SUPPRESS) # internal: run one case and print its result
+    args = parser.parse_args()
+
+    if args.case:
+        print('RESULT ' + json.dumps(measure(json.loads(args.case), args.steps, args.warmup)))
+        return 0
+
+    results = {}
+    for case in build_cases(args.quick):
+        name = case_name(case)
+        if args.filter not in name:
+            continue
+        results[name] = run_in_subprocess(case, args.steps, args.warmup)
+        print(format_result(name, results[name]))
+        sys.stdout.flush()
+
+    report = {'python': platform.python_version(),
+              'numpy': np.__version__,
+              'platform': platform.platform(),
+              'cpu_count': os.cpu_count() if hasattr(os, 'cpu_count') else None,
+              'results': results}
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        # with --quick, the baseline cases outside of the quick subset are not expected
+        expected = [] if args.quick else [name for name in baseline if args.filter in name]
+        failures = compare(results, baseline, args.tolerance, expected)
+        if failures:
+            print('%d failure(s) against %s' % (len(failures), args.baseline))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
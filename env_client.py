@@ -0,0 +1,142 @@
+"""
+This script builds the 'EnvClient' class, the asyncio client of an
+env_server.EnvServer (python 3 only).
+
+Requests can be sent concurrently, e.g. one step per game driven by an actor
+with asyncio.gather: they go out at once, so the server handles them in the
+same pass (see env_server.py), and each reply wakes up the coroutine waiting
+for it. The server replies in order, so the replies are matched to the
+requests in order.
+
+On the same machine (a Unix domain socket, or TCP to a loopback address) the
+states are read from the server's /dev/shm files by default, without going
+through the socket.
+"""
+
+import asyncio
+import collections
+
+import numpy as np
+
+import env_server
+
+LOOPBACK = ('127.0.0.1', 'localhost', '::1')
+
+
+class EnvClient:
+    def __init__(self, reader, writer, shared_memory):
+        """
+        Use EnvClient.connect to create a client.
+        """
+        self.reader = reader
+        self.writer = writer
+        self.shared_memory = shared_memory
+        self.pending = collections.deque() # futures of the requests sent, in order
+        self.mapped = {} # /dev/shm path -> array mapped from it
+        self.stepping = set() # games with a step in flight
+        self.receiver = asyncio.ensure_future(self._receive())
+
+    @classmethod
+    async def connect(cls, address, shared_memory=None):
+        """
+        Arguments:
+            address: path of a Unix domain socket, or (host, port).
+            shared_memory: boolean, read the states from /dev/shm. None
+            (default) uses it for Unix sockets and loopback addresses.
+        """
+        if isinstance(address, tuple):
+            reader, writer = await asyncio.open_connection(*address)
+            local = address[0] in LOOPBACK
+        else:
+            reader, writer = await asyncio.open_unix_connection(address)
+            local = True
+        return cls(reader, writer, local if shared_memory is None else shared_memory)
+
+    async def _receive(self):
+        """
+        Read the replies and hand each one to the oldest pending request.
+        """
+        try:
+            while True:
+                header = await self.reader.readexactly(env_server.HEADER.size)
+                text_size, payload_size = env_server.HEADER.unpack(header)
+                data = bytearray(header + await self.reader.readexactly(text_size + payload_size))
+                future = self.pending.popleft()
+                if not future.cancelled():
+                    future.set_result(env_server.decode(data))
+        except (asyncio.IncompleteReadError, ConnectionError) as error:
+            while self.pending:
+                future = self.pending.popleft()
+                if not future.done():
+                    future.set_exception(ConnectionError('the server closed the connection: %r' % error))
+
+    async def request(self, message):
+        """
+        Send a request and return its reply, (message, payload).
+        """
+        future = asyncio.get_event_loop().create_future()
+        self.pending.append(future)
+        self.writer.write(env_server.encode(message))
+        await self.writer.drain()
+        reply, payload = await future
+        if 'error' in reply:
+            raise RuntimeError('the server failed:\n' + reply['error'])
+        return reply, payload
+
+    async def info(self):
+        """
+        Return {'game', 'kwargs', 'num_envs'} of the server.
+        """
+        reply, _ = await self.request({'op': 'info'})
+        return reply
+
+    async def reset(self, env, seed=None):
+        """
+        Start a new game in game env of the server, reseeded with seed if it
+        is not None.
+
+        Return:
+            The first states of the new game, as the states returned by step.
+        """
+        reply, payload = await self.request({'op': 'reset', 'env': env, 'seed': seed, 'shm': self.shared_memory})
+        return self._states(reply, payload)
+
+    async def step(self, env, action_list):
+        """
+        Step game env of the server.
+
+        Return:
+            The same values as the step function of the game. The states are
+            a list with one array or None per agent. With shared memory they
+            are read-only views on the server's file, valid until the next
+            step of that game.
+        """
+        if env in self.stepping:
+            raise RuntimeError('game %d already has a step in flight' % env)
+        self.stepping.add(env)
+        try:
+            reply, payload = await self.request({'op': 'step', 'env': env, 'actions': [int(a) for a in action_list],
+                                                 'shm': self.shared_memory})
+        finally:
+            self.stepping.discard(env)
+        return (self._states(reply, payload),) + tuple(reply['result'])
+
+    def _states(self, reply, payload):
+        """
+        Return the list of states of a reset or step reply.
+        """
+        info = reply.get('states')
+        if info is None:
+            return [None] * len(reply['has_state'])
+        if 'path' in info:
+            array = self.mapped.get(info['path'])
+            if array is None or list(array.shape) != info['shape']:
+                array = self.mapped[info['path']] = np.load(info['path'], mmap_mode='r')
+        else:
+            array = np.frombuffer(payload, dtype=np.dtype(info['dtype'])).reshape(info['shape'])
+        return [array[k] if present else None for k, present in enumerate(reply['has_state'])]
+
+    async def close(self):
+        self.writer.close()
+        self.receiver.cancel()
+        self.mapped.clear()
@@ -0,0 +1,241 @@
+"""
+This script builds the 'SubprocEnvPool' class, which runs Pong or HunterPrey
+games in several worker processes. Each worker owns a group of games and
+steps them in a loop. The states, rewards and terminals of all games are
+written by the workers straight into arrays in shared memory, so the parent
+process reads the batched results without pickling any frame: only a short
+command goes through the pipe of each worker.
+
+step_async sends the actions and returns immediately, so the learner can run
+its inference while the games are simulated. step_wait then blocks until all
+workers are done.
+"""
+
+import ctypes
+import multiprocessing
+import random
+import traceback
+
+import numpy as np
+
+
+def _shared_array(shape, dtype):
+    """
+    Allocate a zeroed block of shared memory holding an array of the given
+    shape and dtype. It must be created before the workers are started.
+
+    Return:
+        (raw, shape, dtype), to be turned into an array by _as_array in any
+        process.
+    """
+    dtype = np.dtype(dtype)
+    nbytes = int(np.prod(shape)) * dtype.itemsize
+    return multiprocessing.RawArray(ctypes.c_byte, max(nbytes, 1)), tuple(shape), dtype.str
+
+
+def _as_array(raw, shape, dtype):
+    """
+    Return the NumPy array backed by a block from _shared_array, without copy.
+    """
+    dtype = np.dtype(dtype)
+    nbytes = int(np.prod(shape)) * dtype.itemsize
+    return np.ctypeslib.as_array(raw)[:nbytes].view(dtype).reshape(shape)
+
+
+def _write_result(result, j, states, rewards, terminals, dones, alive):
+    """
+    Write the values returned by the step function of game j into row j of the
+    shared arrays.
+    """
+    if len(result) == 4:
+        # Pong: states, rewards, terminal, scores
+        terminals[j] = result[2]
+        dones[j] = result[2]
+        alive[j] = True
+    else:
+        # HunterPrey: states, reward_list, terminal_list, isalive, total_score, over.
+        # When the game is over, the states are those of the new game, where every prey is alive.
+        terminals[j] = result[2]
+        dones[j] = result[5]
+        alive[j] = True if result[5] else result[3]
+    rewards[j] = result[1]
+    if states is None:
+        return
+    for i, state in enumerate(result[0]):
+        if state is None:
+            # dead preys have no state
+            states[j, i] = 0
+        else:
+            states[j, i] = state
+
+
+def _probe(make_env, conn):
+    """
+    Build one game, step it once and report the number of actions it takes,
+    the number of agents it returns states for and the shape and dtype of a
+    state (None and None for a game without states, in 'none' mode).
+    """
+    try:
+        env = make_env()
+        if hasattr(env, 'num_preys'):
+            num_actions = env.num_preys # HunterPrey
+        else:
+            num_actions = 2 if env.two_players else 1 # Pong
+        result = env.step([0] * num_actions)
+        states = result[0]
+        state = next((state for state in states if state is not None), None)
+        if state is None:
+            conn.send((num_actions, len(result[1]), None, None))
+        else:
+            conn.send((num_actions, len(states), state.shape, state.dtype.str))
+    except Exception:
+        conn.send(traceback.format_exc())
+    conn.close()
+
+
+def _worker(make_env, rows, seed, blocks, conn):
+    """
+    Main loop of a worker process: build one game per row of the shared
+    arrays in the slice rows, then step all of them each time 'step' is
+    received, reading the actions from and writing the results into these
+    rows.
+    """
+    # the forked processes start with the same random state
+    random.seed(seed)
+    np.random.seed(None if seed is None else seed % 2**32)
+    try:
+        buffers = [None if block is None else _as_array(*block)[rows] for block in blocks]
+        actions = buffers[0]
+        envs = [make_env() for _ in range(rows.stop - rows.start)]
+        conn.send(None)
+        while True:
+            command = conn.recv()
+            if command == 'step':
+                for j, env in enumerate(envs):
+                    result = env.step(actions[j].tolist())
+                    _write_result(result, j, *buffers[1:])
+                conn.send(None)
+            elif command == 'close':
+                break
+    except (KeyboardInterrupt, EOFError):
+        pass
+    except Exception:
+        conn.send(traceback.format_exc())
+    conn.close()
+
+
+class SubprocEnvPool:
+    def __init__(self, make_env, num_workers, envs_per_worker=1, seed=None):
+        """
+        Arguments:
+            make_env: function without arguments returning a new Pong or
+            HunterPrey instance, e.g. lambda: Pong(render_mode='headless').
+            Use a render mode other than 'human'.
+            num_workers: int, number of worker processes.
+            envs_per_worker: int, number of games run by each worker.
+            seed: int or None. Worker k seeds its random generators with
+            seed + k. None seeds them from the system.
+
+        The results are available in these arrays, which have one row per game
+        (num_envs = num_workers * envs_per_worker), games of worker k being
+        the rows [k * envs_per_worker, (k + 1) * envs_per_worker):
+            states: (num_envs, num_agents) + state_shape, zeros for dead preys.
+            None if the games have no states (render_mode 'none' with pixel
+            states), state_shape is None then.
+            rewards: (num_envs, num_agents) float.
+            terminals: (num_envs, num_agents) boolean, Pong terminal or
+            HunterPrey terminal_list.
+            dones: (num_envs,) boolean, Pong terminal or HunterPrey over.
+            alive: (num_envs, num_agents) boolean, False for dead preys.
+        """
+        self.num_workers = num_workers
+        self.envs_per_worker = envs_per_worker
+        self.num_envs = num_workers * envs_per_worker
+
+        # the shapes are known from a game stepped in a separate process, so
+        # that the parent never builds a game itself
+        parent_conn, child_conn = multiprocessing.Pipe()
+        probe = multiprocessing.Process(target=_probe, args=(make_env, child_conn))
+        probe.start()
+        info = parent_conn.recv()
+        probe.join()
+        if not isinstance(info, tuple):
+            raise RuntimeError('make_env failed:\n' + info)
+        self.num_actions, self.num_agents, self.state_shape, state_dtype = info
+
+        n, a = self.num_envs, self.num_agents
+        blocks = [_shared_array((n, self.num_actions), np.int64),       # actions
+                  None if self.state_shape is None else
+                  _shared_array((n, a) + self.state_shape, state_dtype), # states
+                  _shared_array((n, a), np.float64),                    # rewards
+                  _shared_array((n, a), bool),                          # terminals
+                  _shared_array((n,), bool),                            # dones
+                  _shared_array((n, a), bool)]                          # alive
+        self.actions, self.states, self.rewards, self.terminals, self.dones, self.alive = \
+            [None if block is None else _as_array(*block) for block in blocks]
+
+        self.conns = []
+        self.processes = []
+        for k in range(num_workers):
+            rows = slice(k * envs_per_worker, (k + 1) * envs_per_worker)
+            parent_conn, child_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_worker, args=(
+                make_env, rows, None if seed is None else seed + k, blocks, child_conn))
+            process.daemon = True
+            process.start()
+            child_conn.close()
+            self.conns.append(parent_conn)
+            self.processes.append(process)
+        self.waiting = False
+        self.closed = False
+        self._receive()
+
+    def _receive(self):
+        errors = [message for message in [conn.recv() for conn in self.conns] if message is not None]
+        if errors:
+            self.close()
+            raise RuntimeError('a worker failed:\n' + errors[0])
+
+    def step_async(self, actions):
+        """
+        Send the actions to the workers and return without waiting.
+
+        Argument:
+            actions: array-like of shape (num_envs, num_actions), num_actions
+            being the length of the action_list of the games.
+        """
+        if self.waiting:
+            raise RuntimeError('step_wait must be called before the next step_async')
+        self.actions[...] = actions
+        for conn in self.conns:
+            conn.send('step')
+        self.waiting = True
+
+    def step_wait(self):
+        """
+        Wait for the workers to finish stepping.
+
+        Return:
+            states, rewards, terminals, dones, alive: the shared arrays. They
+            are overwritten by the next step, copy them to keep them longer.
+        """
+        self._receive()
+        self.waiting = False
+        return self.states, self.rewards, self.terminals, self.dones, self.alive
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close(self):
+        if self.closed:
+            return
+        for conn, process in zip(self.conns, self.processes):
+            if process.is_alive():
+                try:
+                    conn.send('close')
+                except (IOError, OSError):
+                    pass
+        for process in self.processes:
+            process.join()
+        self.closed = True
@@ -0,0 +1,342 @@
+"""
+This script builds the 'EnvServer' class, a process hosting many Pong or
+HunterPrey games that clients reset and step through a Unix domain socket or
+a TCP socket, so that actors do not need to import the games themselves.
+env_client.py is the asyncio client (python 3 only). The server also runs on
+python 2, which HunterPrey needs.
+
+The server waits on all its connections at once and coalesces the requests:
+every request that arrived by the time it wakes up is handled in the same
+pass, then all the replies are sent, so a client with several requests in
+flight (e.g. one per game it drives) gets them served in one round trip. The
+games are still stepped one after the other, with their own step function.
+
+Messages, in both directions, are a header of two big-endian uint32 (length
+of the JSON part, length of the binary part), a JSON object, then the binary
+part. Requests:
+    {'op': 'info'}: reply {'game', 'kwargs', 'num_envs'}.
+    {'op': 'reset', 'env': i, 'seed': int or None, 'shm': boolean}: start a
+    new game in game i (its reset method: reseeded if seed is not None),
+    reply {'has_state', 'states'} for the first states of the game.
+    {'op': 'step', 'env': i, 'actions': [...], 'shm': boolean}: step game i,
+    reply {'result': the values returned by step after the states,
+    'has_state': one boolean per agent, 'states': see below}.
+A failed request gets the reply {'error': message}.
+
+With 'shm' true (the client runs on the same machine), the states of game i
+are written into an .npy file in /dev/shm, of shape (num_agents,) + state
+shape, which the client maps into memory: 'states' is {'path', 'shape',
+'dtype'}, and the file is rewritten by the next step of game i. Otherwise
+'states' is {'shape', 'dtype'} and the states are the binary part of the
+reply. Agents without a state (dead preys) read as zeros. A client must wait
+for the reply of a step before stepping the same game again.
+"""
+
+import argparse
+import errno
+import json
+import os
+import select
+import signal
+import socket
+import struct
+import sys
+import tempfile
+import traceback
+
+import numpy as np
+
+import episodes
+import observation
+
+HEADER = struct.Struct('!II')
+
+
+def encode(message, payload=b''):
+    """
+    Return the bytes of a message: a JSON-serializable dict and a binary
+    payload.
+    """
+    text = json.dumps(message).encode('utf-8')
+    return HEADER.pack(len(text), len(payload)) + text + payload
+
+
+def decode(buffer):
+    """
+    Take the first complete message out of buffer (a bytearray).
+
+    Return:
+        (message, payload), or None if buffer does not hold a complete
+        message yet. A message whose JSON part can not be decoded is taken
+        out of buffer all the same, then ValueError is raised.
+    """
+    if len(buffer) < HEADER.size:
+        return None
+    text_size, payload_size = HEADER.unpack(bytes(buffer[:HEADER.size]))
+    end = HEADER.size + text_size + payload_size
+    if len(buffer) < end:
+        return None
+    text = bytes(buffer[HEADER.size:HEADER.size + text_size])
+    payload = bytes(buffer[HEADER.size + text_size:end])
+    del buffer[:end]
+    # JSON and UTF-8 decoding errors are ValueErrors
+    return json.loads(text.decode('utf-8')), payload
+
+
+def _plain(value):
+    """
+    Convert what a step returned (lists, tuples, NumPy scalars and arrays)
+    into JSON-serializable values.
+    """
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    return value
+
+
+class _Connection:
+    def __init__(self, sock):
+        self.sock = sock
+        self.incoming = bytearray()
+        self.outgoing = bytearray()
+
+
+class EnvServer:
+    def __init__(self, address, game, num_envs, **kwargs):
+        """
+        Arguments:
+            address: path of a Unix domain socket, or (host, port) of a TCP
+            socket.
+            game: 'pong' or 'hunter_prey', see episodes.GAMES.
+            num_envs: int, number of games.
+            kwargs: arguments of the games, which must be JSON serializable:
+            observation_spec is given as the dict of the arguments of
+            observation.ObservationSpec. render_mode defaults to 'headless',
+            'human' is not allowed.
+        """
+        kwargs.setdefault('render_mode', 'headless')
+        if kwargs['render_mode'] == 'human':
+            raise ValueError("the games of a server can not use render_mode 'human'")
+        self.game = game
+        self.kwargs = kwargs
+        self.game_kwargs = dict(kwargs)
+        if kwargs.get('observation_spec') is not None:
+            spec = dict((str(key), value) for key, value in kwargs['observation_spec'].items())
+            self.game_kwargs['observation_spec'] = observation.ObservationSpec(**spec)
+        self.envs = [episodes.make_game(game, **self.game_kwargs) for _ in range(num_envs)]
+        self.shared = [None] * num_envs # the /dev/shm array of each game, made on its first step
+        self.address = address
+        if isinstance(address, tuple):
+            self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        else:
+            if os.path.exists(address):
+                os.remove(address)
+            self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(address)
+        self.listener.listen(64)
+        self.listener.setblocking(False)
+        self.connections = {} # socket -> _Connection
+        self.running = False
+
+    def serve_forever(self):
+        """
+        Handle the requests until close is called (from a request handler or
+        another thread) or the process is interrupted.
+        """
+        self.running = True
+        try:
+            while self.running:
+                sockets = list(self.connections)
+                writing = [sock for sock in sockets if self.connections[sock].outgoing]
+                readable, writable, _ = select.select([self.listener] + sockets, writing, [], 0.5)
+                for sock in writable:
+                    self._send(self.connections[sock])
+                requests = []
+                for sock in readable:
+                    if sock is self.listener:
+                        self._accept()
+                        continue
+                    connection = self.connections.get(sock)
+                    if connection is not None and self._receive(connection):
+                        while True:
+                            try:
+                                message = decode(connection.incoming)
+                            except ValueError as error:
+                                # only this request fails, its reply says why
+                                requests.append((connection, error))
+                                continue
+                            if message is None:
+                                break
+                            requests.append((connection, message[0]))
+                if requests:
+                    self.handle(requests)
+        finally:
+            self.close()
+
+    def _accept(self):
+        try:
+            sock, _ = self.listener.accept()
+        except (IOError, OSError):
+            return
+        sock.setblocking(False)
+        if sock.family == socket.AF_INET:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.connections[sock] = _Connection(sock)
+
+    def _receive(self, connection):
+        """
+        Read what arrived on a connection. Return False if it was closed.
+        """
+        try:
+            data = connection.sock.recv(1 << 20)
+        except (IOError, OSError):
+            data = b''
+        if not data:
+            self._drop(connection)
+            return False
+        connection.incoming.extend(data)
+        return True
+
+    def _send(self, connection):
+        try:
+            sent = connection.sock.send(connection.outgoing)
+        except (IOError, OSError) as error:
+            if getattr(error, 'errno', None) in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return
+            self._drop(connection)
+            return
+        del connection.outgoing[:sent]
+
+    def _drop(self, connection):
+        self.connections.pop(connection.sock, None)
+        connection.sock.close()
+
+    def handle(self, requests):
+        """
+        Handle the requests that arrived together, a list of (connection,
+        message), and queue the replies in the same order. message is the
+        ValueError raised by decode for a request that could not be decoded.
+        """
+        replies = []
+        for connection, message in requests:
+            try:
+                replies.append((connection,) + self._handle(message))
+            except Exception:
+                replies.append((connection, {'error': traceback.format_exc()}, b''))
+        for connection, reply, payload in replies:
+            if connection.sock in self.connections:
+                connection.outgoing.extend(encode(reply, payload))
+                self._send(connection)
+
+    def _handle(self, message):
+        if isinstance(message, ValueError):
+            raise ValueError('the request is not valid JSON: %s' % message)
+        if not isinstance(message, dict):
+            raise ValueError('a request must be a JSON object, not %s' % type(message).__name__)
+        op = message.get('op')
+        if op == 'info':
+            return {'game': self.game, 'kwargs': self.kwargs, 'num_envs': len(self.envs)}, b''
+        i = int(message['env'])
+        if not 0 <= i < len(self.envs):
+            raise ValueError('env must be in [0, %d)' % len(self.envs))
+        env = self.envs[i]
+        if op == 'reset':
+            env.reset(seed=message.get('seed'))
+            # the first states of the new game, without stepping it
+            if env.observation_type == 'vector':
+                states = env.features()
+            else:
+                states = env.render()
+            return self._states_reply(i, {}, states, message.get('shm'))
+        if op != 'step':
+            raise ValueError('unknown op ' + str(op))
+
+        result = env.step(message['actions'])
+        return self._states_reply(i, {'result': _plain(list(result[1:]))}, result[0], message.get('shm'))
+
+    def _states_reply(self, i, reply, states, shm):
+        """
+        Add the states of game i to a reply, in its /dev/shm file if shm is
+        true, else in the payload. Return (reply, payload).
+        """
+        has_state = [state is not None for state in states]
+        reply['has_state'] = has_state
+        if not any(has_state):
+            return reply, b''
+        first = np.asarray(next(state for state in states if state is not None))
+        shape = (len(states),) + first.shape
+        if shm:
+            buffer = self._shared(i, shape, first.dtype)
+        else:
+            buffer = np.empty(shape, dtype=first.dtype)
+        for k, state in enumerate(states):
+            if state is None:
+                buffer[k] = 0
+            else:
+                buffer[k] = state
+        reply['states'] = {'shape': list(shape), 'dtype': first.dtype.str}
+        if shm:
+            reply['states']['path'] = buffer.filename
+            return reply, b''
+        return reply, buffer.tobytes()
+
+    def _shared(self, i, shape, dtype):
+        """
+        Return the /dev/shm array of game i, made (again) if it does not
+        have that shape and dtype.
+        """
+        buffer = self.shared[i]
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            if buffer is not None:
+                os.remove(buffer.filename)
+            directory = '/dev/shm' if os.path.isdir('/dev/shm') else None
+            handle, path = tempfile.mkstemp(prefix='env_server_%d_' % i, suffix='.npy', dir=directory)
+            os.close(handle)
+            buffer = self.shared[i] = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=shape)
+        return buffer
+
+    def close(self):
+        """
+        Stop serving, close the sockets and remove the /dev/shm files.
+        """
+        self.running = False
+        for connection in list(self.connections.values()):
+            self._drop(connection)
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+            if not isinstance(self.address, tuple) and os.path.exists(self.address):
+                os.remove(self.address)
+        for i, buffer in enumerate(self.shared):
+            if buffer is not None:
+                os.remove(buffer.filename)
+                self.shared[i] = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve Pong or HunterPrey games over a socket.')
+    parser.add_argument('game', choices=sorted(episodes.GAMES))
+    parser.add_argument('--num-envs', type=int, default=16)
+    parser.add_argument('--unix', help='path of the Unix domain socket')
+    parser.add_argument('--port', type=int, help='TCP port, on --host')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--kwargs', default='{}', help='arguments of the games, as JSON')
+    args = parser.parse_args()
+    if (args.unix is None) == (args.port is None):
+        parser.error('give one of --unix and --port')
+    address = args.unix if args.unix is not None else (args.host, args.port)
+    kwargs = dict((str(key), value) for key, value in json.loads(args.kwargs).items())
+    server = EnvServer(address, args.game, args.num_envs, **kwargs)
+    # a terminated server still removes its socket and /dev/shm files
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    sys.stderr.write('serving %d %s games on %s\n' % (args.num_envs, args.game, address))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+This script builds the 'EpisodeRecorder' and 'EpisodeReplayer' classes, which
+store games as the seed and the actions of each episode instead of their
+frames, and regenerate the frames on demand.
+
+A game started with a seed only draws random numbers from its own generator,
+so its whole run is a function of its arguments, its seed and the actions it
+receives. The recorder starts each episode by restarting its game in place
+with a new seed (the reset method of the games, which leaves the game as a new
+one built with that seed) and logs the actions of every step. The replayer builds the same
+game headless (or with any other observation settings, which do not change
+the run) and steps it through the logged actions again.
+
+A log is saved as a .npz file holding:
+    meta: the game name and its arguments, as UTF-8 JSON bytes.
+    seeds: int64 array of shape (num_episodes,).
+    lengths: int64 array of shape (num_episodes,), the number of steps of
+    each episode.
+    actions: int8 array of shape (total_steps, num_actions), the actions of
+    all the episodes one after the other.
+"""
+
+import importlib
+import json
+import random
+
+import numpy as np
+
+# game name -> (module, class), imported on demand (hunter_prey_2 only runs on python 2)
+GAMES = {'pong': ('pong', 'Pong'), 'hunter_prey': ('hunter_prey_2', 'HunterPrey')}
+
+# arguments of the games that only change how the states are shown, not the run
+OBSERVATION_ARGS = ('render_mode', 'observation_spec', 'observation_type', 'view_size', 'profile')
+
+
+def make_game(game, **kwargs):
+    """
+    Build the game called game (a key of GAMES) with the arguments kwargs.
+    """
+    if game not in GAMES:
+        raise ValueError('game must be one of ' + str(sorted(GAMES)))
+    module, name = GAMES[game]
+    return getattr(importlib.import_module(module), name)(**kwargs)
+
+
+class EpisodeRecorder:
+    def __init__(self, game, seed=None, **kwargs):
+        """
+        Build a game and record its episodes. The first episode starts now.
+
+        Arguments:
+            game: 'pong' or 'hunter_prey', see GAMES.
+            seed: int, seed of the first episode, or None to draw it from the
+            random module.
+            kwargs: arguments of the game. Those which change the run (e.g.
+            num_hunters, two_players, frame_skip) must be JSON serializable,
+            the others (OBSERVATION_ARGS) are not recorded.
+        """
+        self.game = game
+        self.kwargs = kwargs
+        self.run_kwargs = dict((key, value) for key, value in kwargs.items() if key not in OBSERVATION_ARGS)
+        json.dumps(self.run_kwargs) # fail now rather than when saving
+        self.seeds = []
+        self.lengths = []
+        self.actions = []
+        self.env = None
+        self.reset(seed)
+
+    def reset(self, seed=None):
+        """
+        Start a new episode: restart the game in place with a new seed (see
+        the reset method of the games), keeping its profiler and buffers.
+
+        Arguments:
+            seed: int, or None to draw it from the random module.
+        """
+        seed = random.getrandbits(32) if seed is None else int(seed)
+        if self.env is None:
+            self.env = make_game(self.game, seed=seed, **self.kwargs)
+        else:
+            self.env.reset(seed=seed)
+        self.seeds.append(seed)
+        self.lengths.append(0)
+
+    def step(self, action_list):
+        """
+        Step the game with action_list, log the actions and return what the
+        step of the game returns.
+        """
+        self.actions.append([int(action) for action in action_list])
+        self.lengths[-1] += 1
+        return self.env.step(action_list)
+
+    def save(self, path):
+        """
+        Save the log of every episode recorded so far to the .npz file path.
+        """
+        meta = json.dumps({'game': self.game, 'kwargs': self.run_kwargs})
+        actions = np.array(self.actions, dtype=np.int8)
+        if not self.actions:
+            actions = actions.reshape((0, 0))
+        np.savez_compressed(path, meta=np.frombuffer(meta.encode('utf-8'), dtype=np.uint8),
+                            seeds=np.array(self.seeds, dtype=np.int64),
+                            lengths=np.array(self.lengths, dtype=np.int64),
+                            actions=actions)
+
+
+class EpisodeReplayer:
+    def __init__(self, path):
+        """
+        Load a log saved by EpisodeRecorder.save.
+        """
+        with np.load(path) as data:
+            meta = json.loads(bytearray(data['meta']).decode('utf-8'))
+            self.seeds = data['seeds'].tolist()
+            self.lengths = data['lengths'].tolist()
+            self.actions = data['actions']
+        self.game = meta['game']
+        self.kwargs = dict((str(key), value) for key, value in meta['kwargs'].items())
+        # first step of each episode in actions
+        self.starts = np.concatenate([[0], np.cumsum(self.lengths)]).astype(np.int64).tolist()
+
+    def __len__(self):
+        return len(self.seeds)
+
+    def episode_actions(self, index):
+        """
+        Return the actions of episode index, an int8 array of shape
+        (length, num_actions).
+        """
+        return self.actions[self.starts[index]:self.starts[index + 1]]
+
+    def episode(self, index, render_mode='headless', **kwargs):
+        """
+        Replay episode index and yield what each of its steps returns, the
+        states included.
+
+        Arguments:
+            index: int, index of the episode.
+            render_mode: 'headless' (default) or 'none', see RENDER_MODES of
+            the game.
+            kwargs: other observation arguments of the game (e.g.
+            observation_spec, observation_type), see OBSERVATION_ARGS.
+        """
+        for key in kwargs:
+            if key not in OBSERVATION_ARGS:
+                raise ValueError(key + ' changes the run of the game, it can not be replayed differently')
+        env = make_game(self.game, seed=self.seeds[index], render_mode=render_mode,
+                        **dict(self.kwargs, **kwargs))
+        for action_list in self.episode_actions(index).tolist():
+            yield env.step(action_list)
@@ -0,0 +1,113 @@
+"""
+This script builds the 'FrameStack' class, a wrapper around Pong or HunterPrey
+that returns, for each agent, its last k states stacked together, as DQN uses
+them.
+
+The history of all agents is kept in a single preallocated ring buffer of
+shape (num_agents, 2 * k) + state_shape. Each state is written twice, at
+positions p and p + k, so that the last k states are always the contiguous
+slice [p + 1, p + k + 1) of the buffer: the stacked states are returned as a
+view of the buffer, without any copy or allocation. The view is only valid
+until the next call to step.
+
+The history of an agent is restarted (filled with its next state) when its
+episode ends: after a Pong terminal, when a HunterPrey game is over, and after
+a prey is killed. Agents without a state (dead preys) read as zeros.
+"""
+
+import numpy as np
+
+
+def restarts(result):
+    """
+    Find where the histories of the agents restart from what a step (or
+    step_into) of Pong or HunterPrey returned.
+
+    Return:
+        restart_now: boolean array, agents whose history restarts with the
+        states of result.
+        restart_next: boolean array, agents whose history restarts with the
+        states of the next step.
+    """
+    num_agents = len(result[1])
+    if len(result) == 4:
+        # Pong: states, rewards, terminal, scores. The states are those of the
+        # finished game, the next ones start a new game.
+        restart_now = np.zeros(num_agents, dtype=bool)
+        restart_next = np.zeros(num_agents, dtype=bool)
+        restart_next[:] = result[2] # one flag from step, one per player from step_into
+    else:
+        # HunterPrey: states, reward_list, terminal_list, isalive, total_score, over.
+        # When the game is over, the states are already those of the new game.
+        restart_now = np.full(num_agents, bool(result[5]))
+        restart_next = np.array(result[2], dtype=bool) & ~restart_now
+    return restart_now, restart_next
+
+
+class FrameStack:
+    def __init__(self, env, k=4):
+        """
+        Arguments:
+            env: a Pong or a HunterPrey instance.
+            k: int, number of stacked states.
+        """
+        self.env = env
+        self.k = k
+        self.buffer = None # allocated on the first step, when the state shape is known
+        self.position = 0
+        self.restart = None # agents whose history restarts with their next state
+
+    def __getattr__(self, name):
+        return getattr(self.env, name)
+
+    def step(self, action_list):
+        """
+        Step the wrapped game. Returns the same values as its step function,
+        except that the states are replaced by an array of shape
+        (num_agents, k) + state_shape, oldest state first.
+        """
+        result = list(self.env.step(action_list))
+        restart_now, restart_next = restarts(result)
+        result[0] = self.push(result[0], restart_now)
+        self.restart |= restart_next
+        return tuple(result)
+
+    def push(self, states, restart=None):
+        """
+        Append one state per agent to the history and return the stacked view.
+
+        Arguments:
+            states: sequence with one state (array) or None per agent.
+            restart: boolean array, agents whose history starts over with this state.
+        """
+        if self.buffer is None:
+            first = next((state for state in states if state is not None), None)
+            if first is None:
+                raise ValueError('the first push must have at least one state')
+            self.buffer = np.zeros((len(states), 2 * self.k) + first.shape, dtype=first.dtype)
+            self.restart = np.ones(len(states), dtype=bool)
+        if restart is not None:
+            self.restart |= restart
+
+        k = self.k
+        self.position = (self.position + 1) % k
+        p = self.position
+        for i, state in enumerate(states):
+            if state is None:
+                # no state, e.g. a dead prey: clear its history
+                self.buffer[i] = 0
+                self.restart[i] = True
+            elif self.restart[i]:
+                self.buffer[i] = state
+                self.restart[i] = False
+            else:
+                self.buffer[i, p] = state
+                self.buffer[i, p + k] = state
+        return self.stacked()
+
+    def stacked(self):
+        """
+        Return the view of shape (num_agents, k) + state_shape on the last k
+        states of every agent, oldest first.
+        """
+        return self.buffer[:, self.position + 1:self.position + 1 + self.k]
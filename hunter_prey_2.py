@@ -11,19 +11,18 @@ You can externally control the hunters by input action for each hunter, but you
 not control preys externally. They are internally programmed to move for escaping
 from the hunters."""
 
+import assets
 import hunter_prey_utils_2
-import pygame
+import observation
+import profiling
+import rasterizer
+import snapshot
+import spatial_hash
 import numpy as np
 import sys
 import random
 import os
-import skimage.io
-import skimage.transform
-import skimage.color
-import matplotlib.pyplot as plt
 
-import pygame.surfarray as surfarray
-from pygame.locals import *
 from itertools import cycle
 
 FPS = 20 # frame per second
@@ -39,24 +38,66 @@ HUNTER_SPEED = 4 # moving speed of hunters (pixels/frame)
 PREY_SPEED = 10 # moving speed of preys (pixels/frame)
 RAND_MOVE_PROB = 0.01 # the probability of a PREY to move randomly
 DETECTION_RADIUS = 90 # the detection radius for hunter
-# initial the game
 
-#os.environ["SDL_VIDEODRIVER"] = "dummy"
-pygame.init()
-FPSCLOCK = pygame.time.Clock()
-SCREEN = pygame.display.set_mode((SCREENWIDTH, SCREENHEIGHT))
-pygame.display.set_caption('Hunter Prey')
+# render modes
+# 'human': draw to the window, update the display and throttle to FPS
+# 'headless': draw to an offscreen frame buffer, no display update and no throttling
+# 'none': skip drawing, states are returned as None
+RENDER_MODES = ('human', 'headless', 'none')
+
+# observation types
+# 'pixels': the states are rendered images of the whole arena
+# 'vector': the states are feature vectors built from the game variables, see HunterPrey.features
+# 'egocentric': the states are rendered images of a window centred on each prey, see HunterPrey.prey_views
+OBSERVATION_TYPES = ('pixels', 'vector', 'egocentric')
+
+VIEW_SIZE = 64 # default side of the window of the 'egocentric' states, in pixels
+
+MAX_BONUS = 2 # a bonus is added every frame while there is at most one on the field
 
-IMAGES = hunter_prey_utils_2.load()
+# initial the game
 
-HUNTER_WIDTH = IMAGES['hunter'].get_width()
-HUNTER_HEIGHT = IMAGES['hunter'].get_height()
-PREY_WIDTH = IMAGES['prey_self'].get_width()
-PREY_HEIGHT = IMAGES['prey_self'].get_height()
-BONUS_SIZE = IMAGES['bonus'].get_height()
+# sprites read from the cached atlas, read-only and shared by every instance.
+# pygame is only imported and initialized when a game in 'human' mode is created.
+SPRITES = assets.load_sprites('hunter_prey', hunter_prey_utils_2.FILES)
+
+# the window, opened by init_display and only drawn to by games in 'human'
+# mode. Each game renders into its own frame buffer.
+SCREEN = None
+
+HUNTER_WIDTH = SPRITES['hunter'].width
+HUNTER_HEIGHT = SPRITES['hunter'].height
+PREY_WIDTH = SPRITES['prey_self'].width
+PREY_HEIGHT = SPRITES['prey_self'].height
+BONUS_SIZE = SPRITES['bonus'].height
+
+# a hunter kills a prey closer than KILL_RADIUS, a prey takes a bonus at most BONUS_RADIUS away
+KILL_RADIUS = (HUNTER_HEIGHT + PREY_HEIGHT)/2
+BONUS_RADIUS = (BONUS_SIZE + PREY_HEIGHT)/2
+# the cells of the spatial hash grids are as large as the largest query radius
+GRID_CELL_SIZE = max(KILL_RADIUS, BONUS_RADIUS)
+
+
+def init_display(width=SCREENWIDTH, height=SCREENHEIGHT):
+    """
+    Initialize pygame and open the window, once, when the first game in
+    'human' mode is created, with the size of its arena.
+    """
+    global SCREEN
+    if SCREEN is None:
+        import pygame
+        # display-less machines fall back to the dummy video driver
+        if sys.platform.startswith('linux') and not os.environ.get('DISPLAY'):
+            os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        pygame.init()
+        SCREEN = pygame.display.set_mode((width, height))
+        pygame.display.set_caption('Hunter Prey')
+    return SCREEN
 
 class HunterPrey:
-    def __init__(self, num_hunters, num_preys):
+    def __init__(self, num_hunters, num_preys, render_mode='human', observation_spec=None,
+                 observation_type='pixels', profile=False, frame_skip=1, arena_size=None, view_size=VIEW_SIZE,
+                 seed=None):
         """
         self.hunter_list: a list containing all hunters, each hunter is a dict,
         where hunter['x'] is the x coordinate, and hunter['y'] is the y coordinate
@@ -70,41 +111,129 @@ class HunterPrey:
         Arguments:
             num_hunters: int, number of hunters in the game.
             num_preys: int, number of preys in the game.
+            render_mode: 'human' (default), 'headless' or 'none'. See RENDER_MODES.
+            observation_spec: an observation.ObservationSpec giving the size,
+            color and dtype of the states, or None for full size RGB uint8 frames.
+            observation_type: 'pixels' (default), 'vector' or 'egocentric'. See OBSERVATION_TYPES.
+            profile: boolean, if True the phases of step are timed, see profile_stats.
+            frame_skip: int, number of frames advanced by each call to step,
+            repeating the actions. Only the last frame is rendered.
+            arena_size: (width, height) of the arena in pixels, or None for
+            (SCREENWIDTH, SCREENHEIGHT). The background image is tiled over
+            arenas larger than it.
+            view_size: int, side of the window of the 'egocentric' states.
+            seed: int, seed of the random generator of the game, or None to
+            draw it from the random module (so that random.seed reproduces
+            the games). The generator is kept when the game is reset.
         """
+        if render_mode not in RENDER_MODES:
+            raise ValueError('render_mode must be one of ' + str(RENDER_MODES))
+        if observation_type not in OBSERVATION_TYPES:
+            raise ValueError('observation_type must be one of ' + str(OBSERVATION_TYPES))
+        if int(frame_skip) != frame_skip or frame_skip < 1:
+            raise ValueError('frame_skip must be a positive int')
+        width, height = (SCREENWIDTH, SCREENHEIGHT) if arena_size is None else arena_size
+        if int(width) != width or int(height) != height or min(width, height) < BONUS_SIZE:
+            raise ValueError('arena_size must be two ints of at least ' + str(BONUS_SIZE))
+        if int(view_size) != view_size or view_size < 1:
+            raise ValueError('view_size must be a positive int')
         self.FPS = FPS
+        self.render_mode = render_mode
+        self.observation_spec = observation_spec
+        self.observation_type = observation_type
+        self.profiler = profiling.StepProfiler() if profile else None
+        self.frame_skip = int(frame_skip)
+        self.arena_size = (int(width), int(height))
+        self.width, self.height = self.arena_size
+        self.view_size = int(view_size)
+        # frame buffer, backgrounds and clock (human mode) of this instance, kept when the game is reset
+        self.frame = None
+        self.canvas = None
+        self.dirty_rects = []
+        self.window = None # copy of what the window shows, see keep_window
+        self.clock = None
+        if observation_type != 'egocentric' or render_mode == 'human':
+            # the whole arena, for the 'pixels' states and the window
+            self.frame = np.zeros((self.width, self.height, 3), dtype=np.uint8)
+            self.canvas = rasterizer.Canvas(self.frame, rasterizer.tile(SPRITES['background'], self.width, self.height))
+        if observation_type == 'egocentric':
+            # the background of a window at (x, y) is view_background[x % tile width:, y % tile height:]
+            background = SPRITES['background']
+            self.view_background = rasterizer.tile(background, background.width + self.view_size,
+                                                   background.height + self.view_size).rgb
+        if render_mode == 'human':
+            import pygame
+            init_display(self.width, self.height)
+            self.clock = pygame.time.Clock()
+        # random generator of this instance, kept when the game is reset
+        self.seed = random.getrandbits(32) if seed is None else int(seed)
+        self.rng = np.random.RandomState(self.seed)
         self.num_hunters = num_hunters
         self.num_preys = num_preys
         self.initial_num_prey = num_preys
-        # Construct hunter list
-        self.hunter_list = []
-        for i in xrange(num_hunters):
-            hunter = {}
-            hunter['x'] = random.randint(0, int(SCREENWIDTH - HUNTER_WIDTH))
-            hunter['y'] = random.randint(0, int(SCREENHEIGHT - HUNTER_HEIGHT))
-            self.hunter_list.append(hunter)
-
-        # Construct prey list
-        self.prey_list = []
-        self.isalive = []
-        for i in xrange(num_preys):
-            prey = {}
-            prey['x'] = random.randint(0, int(SCREENWIDTH - PREY_WIDTH))
-            prey['y'] = random.randint(0, int(SCREENHEIGHT - PREY_HEIGHT))
-            self.prey_list.append(prey)
-            self.isalive.append(True)
+        # the lists, dicts and grids of the game, filled by reset and reused by every new game
+        self.hunter_list = [{} for i in xrange(num_hunters)]
+        self.prey_list = [{} for i in xrange(num_preys)]
+        self.isalive = [True] * num_preys
+        self.nearest_prey_list = [0] * num_hunters
+        self.continous_moving_step = [0] * num_hunters
+        self.bonus_list = []
+        self.hunter_grid = spatial_hash.SpatialHash(GRID_CELL_SIZE)
+        self.prey_grid = spatial_hash.SpatialHash(GRID_CELL_SIZE)
+        # rewards and kills of the preys, summed over the frames of a step by move
+        self.reward_list = [0.0] * num_preys
+        self.terminal_list = [False] * num_preys
+        self.outputs = None # arrays filled by step_into when it is not given any, made on its first call
+        self.work = None    # frames drawn by step_into before observation_spec, made on its first call
+        self.reset()
+
+    def reset(self, seed=None):
+        """
+        Start a new game in place: the hunters and the preys are placed at
+        random and every prey is alive again, drawing from the random
+        generator of the game exactly as a new game does. The lists, dicts
+        and grids of the game are reused.
+
+        Argument:
+            seed: int to reseed the random generator with, or None to go on
+            with it. HunterPrey(..., seed=s) and reset(seed=s) start the same
+            game.
+        """
+        if seed is not None:
+            self.seed = int(seed)
+            self.rng.seed(self.seed)
+        for hunter in self.hunter_list:
+            hunter['x'] = self.rng.randint(0, int(self.width - HUNTER_WIDTH) + 1)
+            hunter['y'] = self.rng.randint(0, int(self.height - HUNTER_HEIGHT) + 1)
+        for i, prey in enumerate(self.prey_list):
+            prey['x'] = self.rng.randint(0, int(self.width - PREY_WIDTH) + 1)
+            prey['y'] = self.rng.randint(0, int(self.height - PREY_HEIGHT) + 1)
+            self.isalive[i] = True
+
+        self.build_grids()
 
         # total score
         self.total_score = 0
 
-        self.nearest_prey_list = []
-        self.continous_moving_step = []
-
         # bonus list
-        self.bonus_list = []
+        del self.bonus_list[:]
 
-        for i in xrange(num_hunters):
-            self.nearest_prey_list.append(random.randint(0, num_preys-1))
-            self.continous_moving_step.append(random.randint(7, 12))
+        for i in xrange(self.num_hunters):
+            self.nearest_prey_list[i] = self.rng.randint(0, self.num_preys)
+            self.continous_moving_step[i] = self.rng.randint(7, 13)
+
+    def build_grids(self):
+        """
+        Fill the spatial hash grids of the hunters and of the living preys,
+        indexed by their position in hunter_list and prey_list.
+        """
+        self.hunter_grid.clear()
+        for i, hunter in enumerate(self.hunter_list):
+            self.hunter_grid.insert(i, hunter['x'], hunter['y'])
+        self.prey_grid.clear()
+        for i, prey in enumerate(self.prey_list):
+            if self.isalive[i]:
+                self.prey_grid.insert(i, prey['x'], prey['y'])
 
     def step(self, action_list):
         """
@@ -122,6 +251,75 @@ class HunterPrey:
             reward: a list with length=num_hunters. Each entry corresponds to
             the one-frame reward for each hunter.
             self.terminal: boolean. True if game over.
+
+        The actions are repeated for frame_skip frames, or until every prey
+        is dead. The rewards are summed over these frames, and a prey is
+        terminal if it was killed in any of them.
+        """
+        isalive = [True] * self.num_preys
+        states, total_score, over = self._step(action_list, isalive, None)
+        return states, list(self.reward_list), list(self.terminal_list), isalive, total_score, over
+
+    def step_into(self, action_list, out=None):
+        """
+        Same as step, but the results are written into preallocated arrays
+        instead of new lists and arrays, so that a rollout loop allocates no
+        new buffers at each step.
+
+        Arguments:
+            action_list: same as step.
+            out: the tuple of arrays returned by output_arrays, or None to
+            use the arrays of this game, made on the first call.
+        Return:
+            out, (states, rewards, terminals, isalive, total_score, over),
+            filled with what step would return. The states of dead preys are
+            zeros, total_score and over are 0-d arrays. The arrays are
+            overwritten by the next call.
+        """
+        if out is None:
+            if self.outputs is None:
+                self.outputs = self.output_arrays()
+            out = self.outputs
+        states, rewards, terminals, isalive, total_score, over = out
+        if states is None and self.render_mode != 'none':
+            raise ValueError('out has no states array, see output_arrays')
+        _, score, game_over = self._step(action_list, isalive, states)
+        total_score[...] = score
+        over[...] = game_over
+        rewards[:] = self.reward_list
+        terminals[:] = self.terminal_list
+        return out
+
+    def output_arrays(self):
+        """
+        Return new arrays for step_into: states, of shape (num_preys,) +
+        state shape (None in 'none' mode), rewards (float32), terminals and
+        isalive (boolean), of shape (num_preys,), total_score (float64) and
+        over (boolean), of shape ().
+        """
+        P = self.num_preys
+        if self.observation_type == 'vector':
+            states = np.zeros((P, 3 * (P + self.num_hunters + MAX_BONUS)), dtype=np.float32)
+        elif self.render_mode == 'none':
+            states = None
+        else:
+            size = (self.view_size, self.view_size) if self.observation_type == 'egocentric' else self.arena_size
+            if self.observation_spec is None:
+                states = np.zeros((P,) + size + (3,), dtype=np.uint8)
+            else:
+                states = np.zeros((P,) + self.observation_spec.shape(*size), dtype=self.observation_spec.dtype)
+        return (states, np.zeros(P, dtype=np.float32), np.zeros(P, dtype=bool), np.zeros(P, dtype=bool),
+                np.zeros((), dtype=np.float64), np.zeros((), dtype=bool))
+
+    def _step(self, action_list, isalive, out):
+        """
+        Advance the game as step does: the rewards and terminals go into
+        self.reward_list and self.terminal_list, the isalive flags before the
+        reset into isalive (a list or array), and the states are drawn into
+        out if it is not None.
+
+        Return:
+            states, total_score, over.
         """
 
         # check action_list
@@ -130,11 +328,71 @@ class HunterPrey:
         if max(action_list) > 4 or min(action_list) < 0:
             raise ValueError('action index must be int from 0 to 4!!')
 
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.start()
+
+        for i in xrange(self.num_preys):
+            self.reward_list[i] = 0.0
+            self.terminal_list[i] = False
+        for frame in xrange(self.frame_skip):
+            if frame > 0:
+                self.total_score += 1 # the score of the previous frame, which did not end the game
+            self.move(action_list)
+            if sum(self.isalive) == 0:
+                break
+
+        # remove killed preys from prey list.
+        #self.prey_list = [m for n, m in enumerate(self.prey_list) if n not in killed_set]
+        #self.num_preys = len(self.prey_list)
+
+        total_score = self.total_score
+        isalive[:] = self.isalive
+        # Check if terminal. If there is no prey in the prey_list, then terminal=True, and start a new game.
+        if sum(self.isalive) == 0:
+            over = True
+            self.reset()
+        else:
+            over = False
+            self.total_score += 1
+        if profiler is not None:
+            profiler.lap('reset')
+
+        if self.observation_type == 'vector':
+            if self.render_mode == 'human':
+                self.render()
+            states = self.features(out)
+            if profiler is not None:
+                profiler.lap('features')
+        else:
+            states = self.render(out)
+
+        if self.render_mode == 'human':
+            import pygame
+            # Update the view
+            pygame.display.update()
+            # Update time
+            self.clock.tick(self.FPS)
+            if profiler is not None:
+                profiler.lap('display')
+        if profiler is not None:
+            profiler.stop()
+
+        return states, total_score, over
+
+    def move(self, action_list):
+        """
+        Advance the preys, the hunters and the bonuses by one frame. The
+        rewards of that frame are added to self.reward_list, and the preys
+        killed in that frame are set in self.terminal_list.
+        """
+        profiler = self.profiler
+
         # append bonus
-        if random.random() < 1.0 and len(self.bonus_list) <= 1:
+        if self.rng.random_sample() < 1.0 and len(self.bonus_list) <= 1:
             bonus = {}
-            bonus['x'] = random.randint(0, int(SCREENWIDTH - BONUS_SIZE))
-            bonus['y'] = random.randint(0, int(SCREENHEIGHT - BONUS_SIZE))
+            bonus['x'] = self.rng.randint(0, int(self.width - BONUS_SIZE) + 1)
+            bonus['y'] = self.rng.randint(0, int(self.height - BONUS_SIZE) + 1)
             self.bonus_list.append(bonus)
 
         # preys' movement
@@ -158,86 +416,32 @@ class HunterPrey:
                 # move right
                 self.prey_list[i]['x'] += PREY_SPEED
                 # Don't let it outbound
-                if self.prey_list[i]['x'] >= int(SCREENWIDTH - PREY_WIDTH):
-                    self.prey_list[i]['x'] = int(SCREENWIDTH - PREY_WIDTH)
+                if self.prey_list[i]['x'] >= int(self.width - PREY_WIDTH):
+                    self.prey_list[i]['x'] = int(self.width - PREY_WIDTH)
             elif action == 3:
                 # move down
                 self.prey_list[i]['y'] += PREY_SPEED
                 # Don't let it outbound
-                if self.prey_list[i]['y'] >= int(SCREENHEIGHT - PREY_HEIGHT):
-                    self.prey_list[i]['y'] = int(SCREENHEIGHT - PREY_HEIGHT)
+                if self.prey_list[i]['y'] >= int(self.height - PREY_HEIGHT):
+                    self.prey_list[i]['y'] = int(self.height - PREY_HEIGHT)
+            self.prey_grid.move(i, self.prey_list[i]['x'], self.prey_list[i]['y'])
+        if profiler is not None:
+            profiler.lap('preys')
 
         # HUNTERs' movement (Move towards the direction of the NEAREST hunter)
+        # the scripted policy decides the actions of all hunters at once
+        hunter_x = np.array([[hunter['x'] for hunter in self.hunter_list]])
+        hunter_y = np.array([[hunter['y'] for hunter in self.hunter_list]])
+        prey_x = np.array([[prey['x'] for prey in self.prey_list]])
+        prey_y = np.array([[prey['y'] for prey in self.prey_list]])
+        target = np.array([self.nearest_prey_list])
+        steps = np.array([self.continous_moving_step])
+        hunter_action_list = hunter_actions(self.rng, hunter_x, hunter_y, prey_x, prey_y,
+                                            np.array([self.isalive]), target, steps)[0].tolist()
+        self.nearest_prey_list = target[0].tolist()
+        self.continous_moving_step = steps[0].tolist()
         for i in xrange(self.num_hunters):
-            # with prob RAND_MOVE_PROB, a prey moves randomly:
-            if random.random() <  RAND_MOVE_PROB:
-                hunter_action = random.randint(0, 4)
-            else:
-                # Find the nearest prey
-                hunter = self.hunter_list[i]
-
-                if self.continous_moving_step[i] > 0 and self.isalive[self.nearest_prey_list[i]] == True and random.random() < 0.8:
-                    self.continous_moving_step[i] -= 1
-                    nearest_prey = self.prey_list[self.nearest_prey_list[i]]
-                else:
-                    #for i in xrange(self.num_preys):
-                    #    if self.isalive[i]:
-                    #        alive_preys.append(self.prey_list[i])
-                    # list(enumerate(self.prey_list))
-                    sorted_enumerate = sorted(list(enumerate(self.prey_list)), key=lambda w: abs(w[1]['x'] - hunter['x']) + abs(w[1]['y'] - hunter['y']))
-                    while True:
-                        nearest_prey_idx = sorted_enumerate[0][0]
-                        nearest_prey = sorted_enumerate[0][1]
-                        if self.isalive[nearest_prey_idx]:
-                            break
-                        sorted_enumerate = sorted_enumerate[1:]
-                    self.nearest_prey_list[i] = nearest_prey_idx
-                    self.continous_moving_step[i] = random.randint(7, 12)
-
-                # Find the best moving direction
-                x_distance = abs(nearest_prey['x'] - hunter['x'])
-                y_distance = abs(nearest_prey['y'] - hunter['y'])
-
-                # if the nearest hunter is out of detection range, move randomly
-                if x_distance ** 2 + y_distance ** 2 > DETECTION_RADIUS ** 2 and self.continous_moving_step[i] >= 0:
-                    hunter_action = random.randint(0, 4)
-
-                #if np.sqrt((nearest_prey['x']-hunter['x'])**2 + (nearest_prey['y']-hunter['y'])**2) > 50:
-                #    continue
-                else:
-                    if nearest_prey['x'] < hunter['x']:
-                        # prey need to move left
-                        move_left = True
-                    else:
-                        move_left = False
-
-                    if nearest_prey['y'] < hunter['y']:
-                        # prey need to move up
-                        move_up = True
-                    else:
-                        move_up = False
-
-                    if move_up == True and move_left == True:
-                        if x_distance > y_distance:
-                            hunter_action = 0
-                        else:
-                            hunter_action = 1
-                    elif move_up == True and move_left == False:
-                        if x_distance > y_distance:
-                            hunter_action = 2
-                        else:
-                            hunter_action = 1
-                    elif move_up == False and move_left == True:
-                        if x_distance > y_distance:
-                            hunter_action = 0
-                        else:
-                            hunter_action = 3
-                    else:
-                        if x_distance > y_distance:
-                            hunter_action = 2
-                        else:
-                            hunter_action = 3
-
+            hunter_action = hunter_action_list[i]
             # After the moving direction is determined, move each prey just the same way as moving hunters.
             if hunter_action == 0:
                 # move left
@@ -252,92 +456,133 @@ class HunterPrey:
             elif hunter_action == 2:
                 # move right
                 self.hunter_list[i]['x'] += HUNTER_SPEED
-                if self.hunter_list[i]['x'] >= int(SCREENWIDTH - HUNTER_WIDTH):
-                    self.hunter_list[i]['x'] = int(SCREENWIDTH - HUNTER_WIDTH)
+                if self.hunter_list[i]['x'] >= int(self.width - HUNTER_WIDTH):
+                    self.hunter_list[i]['x'] = int(self.width - HUNTER_WIDTH)
             elif hunter_action == 3:
                 # move down
                 self.hunter_list[i]['y'] += HUNTER_SPEED
-                if self.hunter_list[i]['y'] >= int(SCREENHEIGHT - HUNTER_HEIGHT):
-                    self.hunter_list[i]['y'] = int(SCREENHEIGHT - HUNTER_HEIGHT)
+                if self.hunter_list[i]['y'] >= int(self.height - HUNTER_HEIGHT):
+                    self.hunter_list[i]['y'] = int(self.height - HUNTER_HEIGHT)
+            self.hunter_grid.move(i, self.hunter_list[i]['x'], self.hunter_list[i]['y'])
+        if profiler is not None:
+            profiler.lap('hunters')
 
         # Check if any hunter kill any prey, and then assign rewards.
-        reward_list = [] # len = num_preys
-        terminal_list = []
-        for i in xrange(self.num_preys):
-            reward_list.append(0.0)
-            terminal_list.append(False)
+        reward_list = self.reward_list # len = num_preys
+        terminal_list = self.terminal_list
         #killed_set = set() # A set containing the indices of killed preys
         for i in xrange(self.num_preys):
             if not self.isalive[i]:
                 continue
             is_killed = False
-            for j in xrange(self.num_hunters):
+            prey = self.prey_list[i]
+            # only the hunters in the grid cells around the prey can reach it
+            for j in self.hunter_grid.query(prey['x'], prey['y'], KILL_RADIUS):
                 if self.is_killed(self.hunter_list[j], self.prey_list[i]): # is_killed will return True if that hunter kill that prey.
                     #killed_set.add(i)
                     # reward that hunter
-                    reward_list[i] = PENALTY
                     is_killed = True
                     self.isalive[i] = False
                     terminal_list[i] = True
 
             if is_killed == False:
-                reward_list[i] = REWARD
-
-        for i in xrange(self.num_preys):
-            if not self.isalive[i]:
-                continue
-            prey = self.prey_list[i]
-            for bonus in self.bonus_list:
-                if np.sqrt((bonus['x']-prey['x'])**2 + (bonus['y']-prey['y'])**2) <= (BONUS_SIZE + PREY_HEIGHT)/2:
-                    self.bonus_list.remove(bonus)
+                reward_list[i] += REWARD
+            else:
+                reward_list[i] += PENALTY
+                self.prey_grid.remove(i)
+        if profiler is not None:
+            profiler.lap('kills')
+
+        # Bonuses: in prey order, each living prey takes the first bonus of
+        # bonus_list that it reaches and that is still there (there are at
+        # most two bonuses, so a prey never takes more than one).
+        reached = {} # prey index -> indices in bonus_list of the bonuses it reaches
+        for k, bonus in enumerate(self.bonus_list):
+            for i in self.prey_grid.query(bonus['x'], bonus['y'], BONUS_RADIUS):
+                prey = self.prey_list[i]
+                if (bonus['x']-prey['x'])**2 + (bonus['y']-prey['y'])**2 <= BONUS_RADIUS**2:
+                    reached.setdefault(i, []).append(k)
+        taken = set()
+        for i in sorted(reached):
+            for k in reached[i]:
+                if k not in taken:
+                    taken.add(k)
                     reward_list[i] += BONUS
                     self.total_score += BONUS
+                    break
+        if taken:
+            self.bonus_list = [bonus for k, bonus in enumerate(self.bonus_list) if k not in taken]
+        if profiler is not None:
+            profiler.lap('bonuses')
 
-
-        # remove killed preys from prey list.
-        #self.prey_list = [m for n, m in enumerate(self.prey_list) if n not in killed_set]
-        #self.num_preys = len(self.prey_list)
-
-        total_score = self.total_score
-        isalive = self.isalive
-        # Check if terminal. If there is no prey in the prey_list, then terminal=True, and initialize the game.
-        if sum(self.isalive) == 0:
-            initial_num_hunter = self.num_hunters
-            initial_num_prey = self.initial_num_prey
-            over = True
-            former_FPS = self.FPS
-            self.__init__(num_hunters=initial_num_hunter, num_preys=initial_num_prey)
-            self.FPS = former_FPS
-        else:
-            over = False
-            self.total_score += 1
-
-        # Draw images and build state for each player (hunter)
-        SCREEN.blit(IMAGES['background'], (0, 0))
-        for hunter in self.hunter_list:
-            SCREEN.blit(IMAGES['hunter'], (hunter['x'], hunter['y']))
-        for bonus in self.bonus_list:
-            SCREEN.blit(IMAGES['bonus'], (bonus['x'], bonus['y']))
-
-        states = []
-        for i in xrange(self.num_preys):
-            for j in xrange(self.num_preys):
-                # The prey itself is black
-                if self.isalive[j] == False:
-                    continue
-                if j == i:
-                    SCREEN.blit(IMAGES['prey_self'], (self.prey_list[j]['x'], self.prey_list[j]['y']))
-                # Other hunters is grey
+    def render(self, out=None):
+        """
+        Draw the current frame and return the state for each prey, in the
+        format given by observation_spec.
+
+        If out, an array of shape (num_preys,) + state shape, is given, every
+        state is built at once and written into it, zeros for dead preys, and
+        out is returned instead.
+
+        The layer shared by every prey (background, hunters, bonuses and all
+        living preys drawn as 'prey_other') is drawn once by the rasterizer.
+        The returned states are an observation.LazyStates: the state of prey i
+        is built from that layer, by redrawing prey i as 'prey_self', only
+        when it is first accessed. Dead preys have no state and read as None.
+        In 'human' mode the frame with every prey drawn as 'prey_self' is
+        copied to the window. In 'none' mode nothing is drawn and every state
+        is None.
+
+        The frame buffer is a rasterizer.Canvas, redrawn only where sprites
+        changed. Afterwards self.dirty_rects lists the rectangles (x0, y0, x1,
+        y1) of the full size frame outside of which no state changed since the
+        previous render (the whole frame after the first one).
+
+        With observation_type 'egocentric' the states are the windows returned
+        by prey_views instead, and the full size frame is only drawn for the
+        window in 'human' mode.
+        """
+        if self.render_mode == 'none':
+            return [None] * self.num_preys
+        frame = self.frame
+        alive = [j for j in xrange(self.num_preys) if self.isalive[j]]
+        positions = [(prey['x'], prey['y']) for prey in self.prey_list]
+        if self.observation_type == 'egocentric':
+            states = self.prey_views(alive, out)
+        if self.canvas is not None:
+            # Draw the layer shared by every player. The frame is kept from the
+            # last render, only the rectangles where a sprite changed are redrawn.
+            items = [(SPRITES['hunter'], hunter['x'], hunter['y']) for hunter in self.hunter_list]
+            items.extend((SPRITES['bonus'], bonus['x'], bonus['y']) for bonus in self.bonus_list)
+            items.extend((SPRITES['prey_other'], positions[j][0], positions[j][1]) for j in alive)
+            self.dirty_rects = self.canvas.draw(items)
+
+        if self.observation_type != 'egocentric' and out is not None:
+            # built now, so the frame itself is the shared layer
+            for i in xrange(self.num_preys):
+                if self.isalive[i]:
+                    self.prey_state(frame, positions, alive, i, out[i])
                 else:
-                    SCREEN.blit(IMAGES['prey_other'], (self.prey_list[j]['x'], self.prey_list[j]['y']))
-            # The state for each hunter
-            image_data = pygame.surfarray.array3d(pygame.display.get_surface())
-            states.append(image_data)
-
-        for j in xrange(self.num_preys):
-            if self.isalive[j] == False:
-                continue
-            SCREEN.blit(IMAGES['prey_self'], (self.prey_list[j]['x'], self.prey_list[j]['y']))
+                    out[i] = 0
+            states = out
+        elif self.observation_type != 'egocentric':
+            layer = frame.copy()
+            states = observation.LazyStates(lambda i: self.prey_state(layer, positions, alive, i), self.isalive)
+
+        if self.render_mode == 'human' or self.window is not None:
+            # the window shows every prey as 'prey_self'
+            if self.window is None:
+                window = frame.copy()
+            else:
+                window = self.window
+                window[...] = frame
+            for j in alive:
+                rasterizer.blit(window, SPRITES['prey_self'], positions[j][0], positions[j][1])
+            if self.render_mode == 'human':
+                import pygame
+                pygame.surfarray.blit_array(SCREEN, window)
+        if self.profiler is not None:
+            self.profiler.lap('draw')
 
         """# print score on screen
         message = 'AI score: %d' % self.score
@@ -349,13 +594,236 @@ class HunterPrey:
         text2 = font.render(message2, 1, (50, 50, 50))
         SCREEN.blit(text2, (10, 40))"""
 
-        # Update the view
-        pygame.display.update()
-        # Update time
-        FPSCLOCK.tick(self.FPS)
+        return states
 
-        return states, reward_list, terminal_list, isalive, total_score, over
+    def prey_state(self, layer, positions, alive, i, out=None):
+        """
+        Build the state of prey i from the shared layer: the prey itself is
+        black, and the preys drawn after it stay on top of it, as in a full
+        redraw.
 
+        Arguments:
+            layer: the shared layer, with every living prey drawn as 'prey_other'.
+            positions: list of (x, y), the position of each prey.
+            alive: list of the indices of the living preys.
+            i: int, index of the prey.
+            out: array to write the state into, or None for a new one.
+        """
+        if self.profiler is not None:
+            start = profiling.timer()
+        if out is None:
+            frame = layer.copy()
+        else:
+            # drawn in place when no conversion is needed, else in the work frame of this game
+            if self.observation_spec is None:
+                frame = out
+            else:
+                if self.work is None:
+                    self.work = np.empty(layer.shape, dtype=np.uint8)
+                frame = self.work
+            frame[...] = layer
+        x, y = positions[i]
+        rasterizer.blit(frame, SPRITES['prey_self'], x, y)
+        # only the pixels under prey i changed, redraw the later preys clipped to them
+        under = frame[x:x + PREY_WIDTH, y:y + PREY_HEIGHT]
+        for j in alive:
+            if j > i and abs(positions[j][0] - x) < PREY_WIDTH and abs(positions[j][1] - y) < PREY_HEIGHT:
+                rasterizer.blit(under, SPRITES['prey_other'], positions[j][0] - x, positions[j][1] - y)
+        if self.observation_spec is not None:
+            frame = self.observation_spec.process(frame, out=out)
+        if self.profiler is not None:
+            # states are built lazily, possibly after step returned: each one is recorded on its own
+            self.profiler.record('prey_state', profiling.timer() - start)
+        return frame
+
+    def prey_views(self, alive, out=None):
+        """
+        Render the 'egocentric' state of each living prey: a window of
+        view_size * view_size pixels centred on the prey, drawn directly from
+        the game variables, so that its cost does not depend on the size of
+        the arena. It is the same as the crop of the full size state of the
+        prey, the pixels outside of the arena being black. Only the entities
+        found in the spatial hash cells around the window are drawn.
+
+        Arguments:
+            alive: list of the indices of the living preys.
+            out: array of shape (num_preys,) + state shape to write the states
+            into, or None.
+        Return:
+            a list with length=num_preys, the state of each prey in the format
+            given by observation_spec, or None for dead preys. out if given,
+            with zeros for dead preys.
+        """
+        if self.profiler is not None:
+            start = profiling.timer()
+        k = self.view_size
+        if out is None:
+            views = np.empty((len(alive), k, k, 3), dtype=np.uint8)
+            slots = xrange(len(alive))
+        else:
+            # one view per prey, drawn in place when no conversion is needed
+            if self.observation_spec is None:
+                views = out
+            else:
+                if self.work is None:
+                    self.work = np.empty((self.num_preys, k, k, 3), dtype=np.uint8)
+                views = self.work
+            slots = alive
+        background = self.view_background
+        tile_width, tile_height = SPRITES['background'].width, SPRITES['background'].height
+        # every sprite overlapping the window has its top-left corner in this square
+        radius = k // 2 + 1 + max(HUNTER_WIDTH, HUNTER_HEIGHT, PREY_WIDTH, PREY_HEIGHT)
+        for n, i in zip(slots, alive):
+            view = views[n]
+            x0 = self.prey_list[i]['x'] + PREY_WIDTH // 2 - k // 2
+            y0 = self.prey_list[i]['y'] + PREY_HEIGHT // 2 - k // 2
+            view[...] = background[x0 % tile_width:x0 % tile_width + k, y0 % tile_height:y0 % tile_height + k]
+            # outside of the arena
+            view[:max(0, -x0)] = 0
+            view[max(0, self.width - x0):] = 0
+            view[:, :max(0, -y0)] = 0
+            view[:, max(0, self.height - y0):] = 0
+            # same order as the full size frame: hunters, bonuses, then preys by index
+            center_x, center_y = x0 + k // 2, y0 + k // 2
+            for j in sorted(self.hunter_grid.query(center_x, center_y, radius)):
+                hunter = self.hunter_list[j]
+                rasterizer.blit(view, SPRITES['hunter'], hunter['x'] - x0, hunter['y'] - y0)
+            for bonus in self.bonus_list:
+                rasterizer.blit(view, SPRITES['bonus'], bonus['x'] - x0, bonus['y'] - y0)
+            for j in sorted(self.prey_grid.query(center_x, center_y, radius)):
+                sprite = SPRITES['prey_self'] if j == i else SPRITES['prey_other']
+                rasterizer.blit(view, sprite, self.prey_list[j]['x'] - x0, self.prey_list[j]['y'] - y0)
+        if self.observation_spec is not None:
+            views = self.observation_spec.process(views, out=out)
+        if out is not None:
+            for i in xrange(self.num_preys):
+                if not self.isalive[i]:
+                    out[i] = 0
+            states = out
+        else:
+            states = [None] * self.num_preys
+            for n, i in enumerate(alive):
+                states[i] = views[n]
+        if self.profiler is not None:
+            self.profiler.record('prey_views', profiling.timer() - start)
+        return states
+
+    def keep_window(self):
+        """
+        Keep a copy of the frame the window shows (every living prey drawn as
+        'prey_self') in self.window, redrawn by every render, also in
+        'headless' mode where there is no window. Used to record videos. The
+        full size frame must be drawn: 'human' mode, or observation_type
+        'pixels'.
+
+        Return:
+            self.window, uint8 of shape (width, height, 3).
+        """
+        if self.frame is None:
+            raise ValueError('the game does not draw its full size frame')
+        if self.window is None:
+            self.window = np.zeros_like(self.frame)
+        return self.window
+
+    def profile_stats(self):
+        """
+        Return the timing statistics of the phases of step, as returned by
+        profiling.StepProfiler.stats: 'preys' (bonus spawn and prey moves),
+        'hunters' (chase logic and moves), 'kills', 'bonuses', 'reset' (game
+        over), 'draw' (shared layer of pixel states), 'features' (vector
+        states), 'display' (human mode) and 'step' (the whole step).
+        'prey_state' times the build of each pixel state, once per state
+        accessed, and 'prey_views' the build of the 'egocentric' states.
+        Empty if the game was created with profile=False.
+        """
+        if self.profiler is None:
+            return {}
+        return self.profiler.stats()
+
+    def features(self, out=None):
+        """
+        Return the state of each prey as a feature vector, without drawing.
+
+        Row i of the returned float32 array, of shape
+        (num_preys, 3 * (num_preys + num_hunters + MAX_BONUS)), is the state
+        of prey i: first prey i itself as (x, y, alive), then the other living
+        preys, the hunters and the bonuses, each as (dx, dy, 1) relative to
+        prey i and sorted from the nearest to the farthest. Each group has a
+        fixed size (num_preys - 1, num_hunters and MAX_BONUS entries), missing
+        entries (dead preys, absent bonuses) are left as zeros at its end.
+        Coordinates are the centers of the sprites divided by the screen size.
+        The array is out if given.
+        """
+        scale = np.array([self.width, self.height], dtype=np.float32)
+        preys = np.array([[prey['x'], prey['y']] for prey in self.prey_list], dtype=np.float32)
+        preys = (preys + (PREY_WIDTH / 2.0, PREY_HEIGHT / 2.0)) / scale
+        hunters = np.array([[hunter['x'], hunter['y']] for hunter in self.hunter_list], dtype=np.float32)
+        hunters = (hunters + (HUNTER_WIDTH / 2.0, HUNTER_HEIGHT / 2.0)) / scale
+        bonuses = np.zeros((MAX_BONUS, 2), dtype=np.float32)
+        for i, bonus in enumerate(self.bonus_list):
+            bonuses[i] = bonus['x'], bonus['y']
+        bonuses = (bonuses + BONUS_SIZE / 2.0) / scale
+        alive = np.array(self.isalive, dtype=bool)
+
+        # a prey is not one of its own "other preys", it is sorted last and cut off
+        other_preys = alive[None, :] & ~np.eye(self.num_preys, dtype=bool)
+        groups = [np.concatenate([preys, alive[:, None]], axis=1),
+                  nearest_first(preys[None, :, :] - preys[:, None, :], other_preys)[:, :self.num_preys - 1],
+                  nearest_first(hunters[None, :, :] - preys[:, None, :],
+                                np.ones((self.num_preys, self.num_hunters), dtype=bool)),
+                  nearest_first(bonuses[None, :, :] - preys[:, None, :],
+                                np.tile(np.arange(MAX_BONUS) < len(self.bonus_list), (self.num_preys, 1)))]
+        states = np.concatenate([group.reshape((self.num_preys, -1)) for group in groups], axis=1)
+        if out is None:
+            return states.astype(np.float32)
+        out[...] = states
+        return out
+
+    def clone_state(self):
+        """
+        Return the dynamic state of the game (positions, isalive,
+        nearest_prey_list, continous_moving_step, bonuses, score and random
+        generator) as a flat float64 array, see snapshot.py. Its length only
+        depends on num_hunters and num_preys. restore_state sets it back,
+        after which the game goes on exactly as it did after clone_state.
+        """
+        bonuses = [0] * (2 * MAX_BONUS)
+        for k, bonus in enumerate(self.bonus_list):
+            bonuses[2 * k:2 * k + 2] = bonus['x'], bonus['y']
+        return np.concatenate([snapshot.pack_numbers([self.total_score, len(self.bonus_list)]),
+                               [hunter['x'] for hunter in self.hunter_list],
+                               [hunter['y'] for hunter in self.hunter_list],
+                               [prey['x'] for prey in self.prey_list],
+                               [prey['y'] for prey in self.prey_list],
+                               self.isalive, self.nearest_prey_list, self.continous_moving_step, bonuses,
+                               snapshot.rng_state(self.rng)])
+
+    def restore_state(self, state):
+        """
+        Set the dynamic state of the game from an array returned by
+        clone_state of a game with the same num_hunters and num_preys. The
+        spatial hash grids are rebuilt, the frame buffer is left as it is and
+        the next render redraws what changed.
+        """
+        H, P = self.num_hunters, self.num_preys
+        state = np.asarray(state, dtype=np.float64)
+        if state.shape != (3 + 4 * H + 3 * P + 2 * MAX_BONUS + snapshot.RNG_SIZE,):
+            raise ValueError('state must be an array returned by clone_state of a game of the same size')
+        self.total_score, num_bonuses = snapshot.unpack_numbers(state[:3])
+        values = state[3:-snapshot.RNG_SIZE].astype(np.int64).tolist()
+        hunter_x, hunter_y = values[:H], values[H:2 * H]
+        prey_x, prey_y = values[2 * H:2 * H + P], values[2 * H + P:2 * H + 2 * P]
+        isalive = values[2 * H + 2 * P:2 * H + 3 * P]
+        values = values[2 * H + 3 * P:]
+        self.nearest_prey_list = values[:H]
+        self.continous_moving_step = values[H:2 * H]
+        bonuses = values[2 * H:]
+        self.hunter_list = [{'x': x, 'y': y} for x, y in zip(hunter_x, hunter_y)]
+        self.prey_list = [{'x': x, 'y': y} for x, y in zip(prey_x, prey_y)]
+        self.isalive = [bool(alive) for alive in isalive]
+        self.bonus_list = [{'x': bonuses[2 * k], 'y': bonuses[2 * k + 1]} for k in xrange(num_bonuses)]
+        self.build_grids()
+        snapshot.set_rng_state(self.rng, state[-snapshot.RNG_SIZE:])
 
     def is_killed(self, hunter, prey):
         """
@@ -365,14 +833,92 @@ class HunterPrey:
         Return:
             Boolean. True if killed and False otherwise.
             """
-        dist = np.sqrt((hunter['x']-prey['x'])**2 + (hunter['y']-prey['y'])**2)
+        dist2 = (hunter['x']-prey['x'])**2 + (hunter['y']-prey['y'])**2
         # if the L2 distance between hunter and prey is less than the sum of their radius, then killed.
-        if dist < (HUNTER_HEIGHT + PREY_HEIGHT)/2:
+        if dist2 < KILL_RADIUS**2:
             return True
         else:
             return False
 
+def nearest_first(offsets, present):
+    """
+    Sort groups of entities from the nearest to the farthest.
+
+    Arguments:
+        offsets: float array of shape (n, k, 2), the offsets of k entities
+        relative to each of n preys.
+        present: boolean array of shape (n, k), False for missing entities.
+    Return:
+        float array of shape (n, k, 3), rows of (dx, dy, 1) sorted by distance
+        for each prey, followed by rows of zeros for the missing entities.
+    """
+    distance = (offsets ** 2).sum(axis=2)
+    distance[~present] = np.inf
+    order = np.argsort(distance, axis=1, kind='mergesort')
+    rows = np.arange(len(offsets))[:, None]
+    flags = present[rows, order][:, :, None]
+    return np.concatenate([np.where(flags, offsets[rows, order], 0), flags], axis=2)
+
+def hunter_actions(rng, hunter_x, hunter_y, prey_x, prey_y, isalive, target, steps):
+    """
+    The scripted policy of the hunters, for every hunter of a batch of games
+    at once. A hunter moves randomly with probability RAND_MOVE_PROB.
+    Otherwise it keeps chasing its target with probability 0.8 if the target
+    is alive and its chase is not over, or targets its nearest living prey
+    (Manhattan distance, the first one in case of tie) for 7 to 12 steps. It
+    moves towards the target along the axis of the largest distance, or
+    randomly if the target is further than DETECTION_RADIUS.
+
+    A hunter only looks at the preys, so the hunters are independent and are
+    all decided from one hunters x preys distance matrix. The random numbers
+    are drawn for all hunters together.
+
+    Arguments:
+        rng: np.random or a np.random.RandomState.
+        hunter_x, hunter_y: int arrays of shape (num_envs, num_hunters).
+        prey_x, prey_y: int arrays of shape (num_envs, num_preys).
+        isalive: boolean array of shape (num_envs, num_preys), with at least
+        one living prey per game.
+        target, steps: int arrays of shape (num_envs, num_hunters), the
+        nearest_prey_list and continous_moving_step of each game, updated in
+        place.
+    Return:
+        int array of shape (num_envs, num_hunters), the hunters' actions.
+    """
+    shape = target.shape
+    rows = np.arange(shape[0])[:, None]
+    random_move = rng.random_sample(shape) < RAND_MOVE_PROB
+    random_action = rng.randint(0, 5, size=shape)
+
+    # keep chasing the same prey, or target the nearest living one
+    chase = ~random_move
+    keep = chase & (steps > 0) & isalive[rows, target] & (rng.random_sample(shape) < 0.8)
+    update = chase & ~keep
+    steps[keep] -= 1
+    if update.any():
+        distance = np.abs(prey_x[:, None, :] - hunter_x[:, :, None]) + \
+                   np.abs(prey_y[:, None, :] - hunter_y[:, :, None])
+        distance[~np.broadcast_to(isalive[:, None, :], distance.shape)] = np.iinfo(distance.dtype).max
+        target[update] = distance.argmin(axis=2)[update]
+        steps[update] = rng.randint(7, 13, size=int(np.count_nonzero(update)))
+
+    # Find the best moving direction
+    target_x = prey_x[rows, target]
+    target_y = prey_y[rows, target]
+    x_distance = np.abs(target_x - hunter_x)
+    y_distance = np.abs(target_y - hunter_y)
+    chase_action = np.where(x_distance > y_distance,
+                            np.where(target_x < hunter_x, 0, 2),
+                            np.where(target_y < hunter_y, 1, 3))
+    # if the target is out of detection range, move randomly
+    out_of_range = x_distance ** 2 + y_distance ** 2 > DETECTION_RADIUS ** 2
+    return np.where(random_move | out_of_range, random_action, chase_action)
+
 def human_play():
+    import pygame
+    import skimage.color
+    import skimage.transform
+    import matplotlib.pyplot as plt
     num_hunters =2
     num_preys =2
     game_state = HunterPrey(num_hunters=num_hunters, num_preys=num_preys)
@@ -396,12 +942,12 @@ def human_play():
         states, reward, terminal, isalive_list, total_score, over = game_state.step(action)
         if over:
             print total_score
-        plt.subplot(1, 2, 1)
-        plt.imsave('prey1.jpg', states[0])
-        plt.imshow(skimage.color.rgb2grey(skimage.transform.resize(states[0], (80, 80))), cmap='gray')
-        plt.subplot(1, 2, 2)
-        plt.imsave('prey2.jpg', states[1])
-        plt.imshow(skimage.color.rgb2grey(skimage.transform.resize(states[1], (80, 80))), cmap='gray')
+        for i in xrange(2):
+            if states[i] is None: # dead prey
+                continue
+            plt.subplot(1, 2, i + 1)
+            plt.imsave('prey%d.jpg' % (i + 1), states[i])
+            plt.imshow(skimage.color.rgb2grey(skimage.transform.resize(states[i], (80, 80))), cmap='gray')
         plt.show()
         """print ('##############')
         print ('reward list: ' + str(reward))
@@ -1,20 +1,26 @@
-import pygame
+import assets
 """
 This script loads all the images for every elements in the game: background, hunters, preys.
 """
 
+# image file of each element, in the directory of the package
+FILES = {
+    'prey_self': 'prey_self.png',
+    'prey_other': 'prey_other.png',
+    'background': 'background_pong.png',
+    'hunter': 'hunter2.png',
+    'bonus': 'bonus.jpg',
+}
+
 def load():
+    """
+    Load the images as pygame surfaces. The window must be open (see init_display).
+    """
+    import pygame
 
     IMAGES = {}
 
-    IMAGES['prey_self'] = pygame.image.load('prey_self.png').convert_alpha()
-
-    IMAGES['prey_other'] = pygame.image.load('prey_other.png').convert_alpha()
-
-    IMAGES['background'] = pygame.image.load('background_pong.png').convert_alpha()
-
-    IMAGES['hunter'] = pygame.image.load('hunter2.png').convert_alpha()
-
-    IMAGES['bonus'] = pygame.image.load('bonus.jpg').convert_alpha()
+    for name, filename in FILES.items():
+        IMAGES[name] = pygame.image.load(assets.asset_path(filename)).convert_alpha()
 
-    return IMAGES
\ No newline at end of file
+    return IMAGES
@@ -0,0 +1,184 @@
+"""
+This script builds the 'ObservationSpec' class, which describes the format of
+the states returned by the games: target size, grayscale or RGB, and dtype.
+Instead of returning full resolution RGB frames that are then shrunk with
+skimage.transform.resize and skimage.color.rgb2grey, a game given a spec
+converts each rendered frame straight into the requested format.
+
+Downsampling uses area averaging: each output pixel is the mean of the input
+pixels it covers, with fractional weights at the borders when the sizes are
+not multiples of each other. Resizing is done with two small precomputed
+weight matrices, so a 240x240 RGB frame becomes an 80x80 grayscale state in
+a couple of matrix products.
+"""
+
+import numpy as np
+
+DTYPES = ('uint8', 'float32')
+
+# the luminance weights used by skimage.color.rgb2grey
+GRAY_WEIGHTS = np.array([0.2125, 0.7154, 0.0721], dtype=np.float32)
+
+
+def area_weights(n_in, n_out):
+    """
+    Build the (n_out, n_in) matrix that area-averages an axis of length n_in
+    down (or up) to length n_out.
+    """
+    scale = float(n_in) / n_out
+    weights = np.zeros((n_out, n_in), dtype=np.float32)
+    for i in range(n_out):
+        start = i * scale
+        end = (i + 1) * scale
+        for j in range(int(np.floor(start)), min(int(np.ceil(end)), n_in)):
+            overlap = min(end, j + 1) - max(start, j)
+            if overlap > 0:
+                weights[i, j] = overlap / scale
+    return weights
+
+
+class ObservationSpec:
+    def __init__(self, size=None, grayscale=False, dtype='uint8'):
+        """
+        Arguments:
+            size: (int, int) or None. Size of the first two axes of the state,
+            in the same order as the frame axes (x, y). None keeps the size of
+            the screen.
+            grayscale: boolean. If True the state has no channel axis.
+            dtype: 'uint8' for values in [0, 255], or 'float32' for values
+            in [0, 1] (the range returned by skimage).
+        """
+        if dtype not in DTYPES:
+            raise ValueError('dtype must be one of ' + str(DTYPES))
+        self.size = None if size is None else (int(size[0]), int(size[1]))
+        self.grayscale = grayscale
+        self.dtype = np.dtype(dtype)
+        # resize matrices, built on first use for each frame size
+        self._weights = {}
+        # float32 buffers of process with out, made on first use for each frames shape
+        self._buffers = {}
+
+    def shape(self, width, height):
+        """
+        Return the shape of a state for a screen of the given size.
+        """
+        size = (width, height) if self.size is None else self.size
+        return size if self.grayscale else size + (3,)
+
+    def _resize_weights(self, width, height):
+        key = (width, height)
+        if key not in self._weights:
+            self._weights[key] = (area_weights(width, self.size[0]), area_weights(height, self.size[1]).T.copy())
+        return self._weights[key]
+
+    def process(self, frames, out=None):
+        """
+        Convert rendered frames into states.
+
+        Arguments:
+            frames: uint8 array of shape (..., width, height, 3).
+            out: array of shape (...,) + self.shape(width, height) and dtype
+            self.dtype to write into, or None to allocate a new one. The
+            intermediate results go into buffers kept by the spec for that
+            frames shape, so converting frames of the same shape again
+            allocates nothing but the states (nothing at all with out). A
+            spec must thus not be used by several threads at once.
+        Return:
+            The states, in out if given.
+        """
+        width, height = frames.shape[-3], frames.shape[-2]
+        if self.size is None and not self.grayscale and self.dtype == np.uint8:
+            if out is None:
+                return frames.copy()
+            out[...] = frames
+            return out
+        if out is None:
+            out = np.empty(frames.shape[:-3] + self.shape(width, height), dtype=self.dtype)
+        return self._process_into(frames, out)
+
+    def _process_into(self, frames, out):
+        """
+        Convert frames into out through the buffers of the frames shape.
+        """
+        shape = frames.shape
+        width, height = shape[-3], shape[-2]
+        resize = self.size is not None and self.size != (width, height)
+        buffers = self._buffers.get(shape)
+        if buffers is None:
+            lead = shape[:-3]
+            size = self.size if resize else (width, height)
+            if self.grayscale:
+                pixels = np.empty((int(np.prod(shape[:-1])), 3), dtype=np.float32)
+                gray = np.empty(shape[:-1], dtype=np.float32)
+                buffers = [pixels, gray]
+                if resize:
+                    buffers += [np.empty(lead + (size[0], height), dtype=np.float32),
+                                np.empty(lead + size, dtype=np.float32)]
+            else:
+                # channels first, with the channels last in memory as in frames
+                buffers = [np.moveaxis(np.empty(shape, dtype=np.float32), -1, -3)]
+                if resize:
+                    buffers += [np.empty(lead + (3, size[0], height), dtype=np.float32),
+                                np.empty(lead + (3,) + size, dtype=np.float32)]
+            self._buffers[shape] = buffers
+
+        if self.grayscale:
+            pixels, gray = buffers[:2]
+            pixels.reshape(shape)[...] = frames
+            np.dot(pixels, GRAY_WEIGHTS, out=gray.reshape(-1))
+            states = gray
+        else:
+            states = buffers[0]
+            states[...] = np.moveaxis(frames, -1, -3)
+        if resize:
+            resize_x, resize_y = self._resize_weights(width, height)
+            half, resized = buffers[-2:]
+            if states.ndim == 2:
+                np.dot(resize_x, states, out=half)
+                np.dot(half, resize_y, out=resized)
+            else:
+                np.matmul(resize_x, states, out=half)
+                np.matmul(half, resize_y, out=resized)
+            states = resized
+        if not self.grayscale:
+            states = np.moveaxis(states, -3, -1)
+
+        if self.dtype == np.uint8:
+            np.clip(np.rint(states, out=states), 0, 255, out=states)
+            out[...] = states
+        else:
+            np.multiply(states, 1.0 / 255, out=out)
+        return out
+
+
+class LazyStates:
+    def __init__(self, build, available):
+        """
+        A read-only sequence holding one state per agent. The state of agent i
+        is only built, by calling build(i), the first time it is accessed.
+        Agents that are not available (e.g. dead preys) have no state and
+        read as None.
+
+        Arguments:
+            build: function taking the index of an agent and returning its state.
+            available: list of booleans, one per agent.
+        """
+        self._build = build
+        self.available = list(available)
+        self._states = [None] * len(self.available)
+        self._built = [False] * len(self.available)
+
+    def __len__(self):
+        return len(self.available)
+
+    def __getitem__(self, i):
+        if not self.available[i]:
+            return None
+        if not self._built[i]:
+            self._states[i] = self._build(i % len(self))
+            self._built[i] = True
+        return self._states[i]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
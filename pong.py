@@ -1,17 +1,14 @@
+import assets
 import pong_utils
-import pygame
-import skimage.transform
-import matplotlib.pyplot as plt
+import profiling
+import rasterizer
+import snapshot
 import numpy as np
 import sys
 import random
 import time
 import os
-import pygame.surfarray as surfarray
-from pygame.locals import *
 from itertools import cycle
-import skimage.io
-import skimage.color
 
 
 FPS = 20  # frame per second
@@ -28,23 +25,109 @@ BALL_SPEED_Y_LIMIT = 10
 BALL_SPEED_X_LIMIT = 10
 AUTOMOVE_RANDOM_FLIP_RATE = 0.15
 
+# render modes
+# 'human': draw to the window, update the display and throttle to FPS
+# 'headless': draw to an offscreen frame buffer, no display update and no throttling
+# 'none': skip drawing, states are returned as None
+RENDER_MODES = ('human', 'headless', 'none')
+
+# observation types
+# 'pixels': the states are rendered images
+# 'vector': the states are feature vectors built from the game variables, see Pong.features
+OBSERVATION_TYPES = ('pixels', 'vector')
+NUM_FEATURES = 8
+
 # initial the gameS
 
-#os.environ["SDL_VIDEODRIVER"] = "dummy"
-pygame.init()
-FPSCLOCK = pygame.time.Clock()
-SCREEN = pygame.display.set_mode((SCREENWIDTH, SCREENHEIGHT))
-pygame.display.set_caption('Pong')
+# sprites read from the cached atlas, read-only and shared by every instance.
+# pygame is only imported and initialized when a game in 'human' mode is created.
+SPRITES = assets.load_sprites('pong', pong_utils.FILES)
+
+# the window, opened by init_display and only drawn to by games in 'human'
+# mode. Each game renders into its own frame buffer.
+SCREEN = None
+
+PAD_WIDTH = SPRITES['paddle_self'].width
+PAD_HEIGHT = SPRITES['paddle_self'].height
+BALL_SIZE = SPRITES['ball'].width
+
 
-IMAGES = pong_utils.load()
+def init_display():
+    """
+    Initialize pygame and open the window, once, when the first game in
+    'human' mode is created.
+    """
+    global SCREEN
+    if SCREEN is None:
+        import pygame
+        # display-less machines fall back to the dummy video driver
+        if sys.platform.startswith('linux') and not os.environ.get('DISPLAY'):
+            os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        pygame.init()
+        SCREEN = pygame.display.set_mode((SCREENWIDTH, SCREENHEIGHT))
+        pygame.display.set_caption('Pong')
+    return SCREEN
 
-PAD_WIDTH = IMAGES['paddle_self'].get_width()
-PAD_HEIGHT = IMAGES['paddle_self'].get_height()
-BALL_SIZE = IMAGES['ball'].get_width()
 
 class Pong:
-    def __init__(self, two_players=True):
+    def __init__(self, two_players=True, render_mode='human', observation_spec=None, observation_type='pixels',
+                 profile=False, frame_skip=1, seed=None):
+        """
+        Arguments:
+            two_players: boolean, if False paddle 2 is moved automatically.
+            render_mode: 'human' (default), 'headless' or 'none'. See RENDER_MODES.
+            observation_spec: an observation.ObservationSpec giving the size,
+            color and dtype of the states, or None for full size RGB uint8 frames.
+            observation_type: 'pixels' (default) or 'vector'. See OBSERVATION_TYPES.
+            profile: boolean, if True the phases of step are timed, see profile_stats.
+            frame_skip: int, number of frames advanced by each call to step,
+            repeating the actions. Only the last frame is rendered.
+            seed: int, seed of the random generator of the game, or None to
+            draw it from the random module (so that random.seed reproduces
+            the games). The generator is kept when the game is reset.
+        """
+        if render_mode not in RENDER_MODES:
+            raise ValueError('render_mode must be one of ' + str(RENDER_MODES))
+        if observation_type not in OBSERVATION_TYPES:
+            raise ValueError('observation_type must be one of ' + str(OBSERVATION_TYPES))
+        if int(frame_skip) != frame_skip or frame_skip < 1:
+            raise ValueError('frame_skip must be a positive int')
         self.two_players = two_players
+        self.render_mode = render_mode
+        self.observation_spec = observation_spec
+        self.observation_type = observation_type
+        self.profiler = profiling.StepProfiler() if profile else None
+        self.frame_skip = int(frame_skip)
+        self.outputs = None # arrays filled by step_into when it is not given any, made on its first call
+        # frame buffer and clock (human mode) of this instance, kept when the game is reset
+        self.frame = np.zeros((SCREENWIDTH, SCREENHEIGHT, 3), dtype=np.uint8)
+        self.canvas = rasterizer.Canvas(self.frame, SPRITES['background'])
+        self.dirty_rects = [[], []]
+        self.window = None # copy of what the window shows, see keep_window
+        self.clock = None
+        if render_mode == 'human':
+            import pygame
+            init_display()
+            self.clock = pygame.time.Clock()
+        # random generator of this instance, kept when the game is reset
+        self.seed = random.getrandbits(32) if seed is None else int(seed)
+        self.rng = np.random.RandomState(self.seed)
+        self.reset()
+
+    def reset(self, seed=None):
+        """
+        Start a new game in place: the paddles go back to the middle and the
+        ball is served from a random side, drawing from the random generator
+        of the game exactly as a new game does. The frame buffer and the
+        other storage of the game are reused.
+
+        Argument:
+            seed: int to reseed the random generator with, or None to go on
+            with it. Pong(seed=s) and reset(seed=s) start the same game.
+        """
+        if seed is not None:
+            self.seed = int(seed)
+            self.rng.seed(self.seed)
         # paddle positions
         self.pad1_X = 10                  # right side of paddle 1
         self.pad2_X = SCREENWIDTH - 10     # left side of paddle 2
@@ -54,7 +137,7 @@ class Pong:
         self.pad1_vel = 0
         self.pad2_vel = 0
         # ball position and speed
-        if random.random() < 0.5:
+        if self.rng.random_sample() < 0.5:
             self.ball_X = SCREENWIDTH * 3 / 4        # x center of ball
             self.ball_vel_X = -BALL_SPEED_X
         else:
@@ -62,7 +145,7 @@ class Pong:
             self.ball_vel_X = BALL_SPEED_X
         self.ball_Y = SCREENHEIGHT / 2       # y center of ball
 
-        self.ball_vel_Y = random.randint(-int(BALL_SPEED_X * 1/3), int(BALL_SPEED_X * 1/3))
+        self.ball_vel_Y = self.rng.randint(-int(BALL_SPEED_X * 1/3), int(BALL_SPEED_X * 1/3) + 1)
 
         self.at_wall = False
         self.at_paddle = False
@@ -73,6 +156,67 @@ class Pong:
         """
         action is a list of length 1 or 2. Each element is the action index.
         0: Not move, 1: move up, 2: move down
+
+        The actions are repeated for frame_skip frames, or until a player
+        scores, and the state of the last frame is returned.
+        """
+        states, reward1, reward2, terminal = self._step(action_list, None)
+        return states, [reward1, reward2], terminal, [self.total_score_1, self.total_score_2]
+
+    def step_into(self, action_list, out=None):
+        """
+        Same as step, but the results are written into preallocated arrays
+        instead of new lists and arrays, so that a rollout loop allocates no
+        new buffers at each step.
+
+        Arguments:
+            action_list: same as step.
+            out: the tuple of arrays returned by output_arrays, or None to
+            use the arrays of this game, made on the first call.
+        Return:
+            out, (states, rewards, terminals, scores), filled with what step
+            would return. terminals holds the terminal flag of both players.
+            The arrays are overwritten by the next call.
+        """
+        if out is None:
+            if self.outputs is None:
+                self.outputs = self.output_arrays()
+            out = self.outputs
+        states, rewards, terminals, scores = out
+        if states is None and (self.render_mode != 'none' or self.observation_type == 'vector'):
+            raise ValueError('out has no states array, see output_arrays')
+        _, reward1, reward2, terminal = self._step(action_list, states)
+        rewards[0] = reward1
+        rewards[1] = reward2
+        terminals[:] = terminal
+        scores[0] = self.total_score_1
+        scores[1] = self.total_score_2
+        return out
+
+    def output_arrays(self):
+        """
+        Return new arrays for step_into: states, of shape (2,) + state shape
+        (None in 'none' mode with pixel states), rewards (float32), terminals
+        (boolean) and scores (float64), of shape (2,).
+        """
+        if self.observation_type == 'vector':
+            states = np.zeros((2, NUM_FEATURES), dtype=np.float32)
+        elif self.render_mode == 'none':
+            states = None
+        elif self.observation_spec is None:
+            states = np.zeros((2, SCREENWIDTH, SCREENHEIGHT, 3), dtype=np.uint8)
+        else:
+            states = np.zeros((2,) + self.observation_spec.shape(SCREENWIDTH, SCREENHEIGHT),
+                              dtype=self.observation_spec.dtype)
+        return states, np.zeros(2, dtype=np.float32), np.zeros(2, dtype=bool), np.zeros(2, dtype=np.float64)
+
+    def _step(self, action_list, out):
+        """
+        Advance the game as step does, drawing the states into out if it is
+        not None.
+
+        Return:
+            states, reward1, reward2, terminal.
         """
         if self.two_players:
             assert len(action_list) == 2
@@ -82,6 +226,96 @@ class Pong:
         if max(action_list) > 2 or min(action_list) < 0:
             raise ValueError('action index must be int from 0 to 2!!')
 
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.start()
+
+        frames = 0
+        while frames < self.frame_skip:
+            skipped = self.fast_forward(action_list, self.frame_skip - frames)
+            if skipped:
+                frames += skipped
+                continue
+            self.move(action_list)
+            frames += 1
+            if self.ball_X < BALL_SIZE/2 or self.ball_X > SCREENWIDTH - BALL_SIZE/2:
+                break # a player scored, the game is reset below
+
+        if self.observation_type == 'vector':
+            if self.render_mode == 'human':
+                self.render()
+            states = self.features(out)
+            if profiler is not None:
+                profiler.lap('features')
+        else:
+            states = self.render(out)
+
+        terminal = False
+        reward1 = 0
+        reward2 = 0
+        # score or not
+        if self.ball_X < BALL_SIZE/2:
+            reward1 = PENALTY
+            reward2 = REWARD
+            terminal = True
+            #self.total_score_1 += reward1
+            self.total_score_2 += reward2
+            total_score_1 = self.total_score_1
+            total_score_2 = self.total_score_2
+            pad1_Y = self.pad1_Y
+            pad2_Y = self.pad2_Y
+            self.reset()
+            self.total_score_1 = total_score_1
+            self.total_score_2 = total_score_2
+            if max(self.total_score_1, self.total_score_2) >= 210:
+                self.total_score_1 = 0
+                self.total_score_2 = 0
+            else:
+                self.pad1_Y = pad1_Y
+                self.pad2_Y = pad2_Y
+
+        elif self.ball_X > SCREENWIDTH - BALL_SIZE/2:
+            reward1 = REWARD
+            reward2 = PENALTY
+            terminal = True
+            self.total_score_1 += reward1
+            #self.total_score_2 += reward2
+            total_score_1 = self.total_score_1
+            total_score_2 = self.total_score_2
+            pad1_Y = self.pad1_Y
+            pad2_Y = self.pad2_Y
+            self.reset()
+            self.total_score_1 = total_score_1
+            self.total_score_2 = total_score_2
+            if max(self.total_score_1, self.total_score_2) >= 210:
+                self.total_score_1 = 0
+                self.total_score_2 = 0
+            else:
+                self.pad1_Y = pad1_Y
+                self.pad2_Y = pad2_Y
+
+        if profiler is not None:
+            profiler.lap('scoring')
+
+        if self.render_mode == 'human':
+            import pygame
+            # Update the view
+            pygame.display.update()
+            # Update time
+            self.clock.tick(FPS)
+            if profiler is not None:
+                profiler.lap('display')
+        if profiler is not None:
+            profiler.stop()
+
+        return states, reward1, reward2, terminal
+
+    def move(self, action_list):
+        """
+        Advance the paddles and the ball by one frame.
+        """
+        profiler = self.profiler
+
         # paddles' movements
         if action_list[0] == 1:
             self.pad1_vel = -PAD_SPEED_1
@@ -110,8 +344,12 @@ class Pong:
                 self.pad2_Y = SCREENHEIGHT - PAD_HEIGHT / 2
             if self.pad2_Y <= PAD_HEIGHT / 2:
                 self.pad2_Y = PAD_HEIGHT / 2
+            if profiler is not None:
+                profiler.lap('paddles')
 
         else: #Automatic move
+            if profiler is not None:
+                profiler.lap('paddles')
             if self.ball_vel_X > 0 and self.ball_vel_X > 2/3 * SCREENWIDTH:
                 if self.pad2_Y > self.ball_Y:
                     self.pad2_vel = -PAD_SPEED_2
@@ -121,7 +359,7 @@ class Pong:
                     self.pad2_vel = 0
             else:
                 pass
-            if random.random() < AUTOMOVE_RANDOM_FLIP_RATE:
+            if self.rng.random_sample() < AUTOMOVE_RANDOM_FLIP_RATE:
                 self.pad2_vel = -self.pad2_vel
 
 
@@ -132,6 +370,8 @@ class Pong:
             if self.pad2_Y <= PAD_HEIGHT / 2:
                 self.pad2_Y = PAD_HEIGHT / 2
                 self.pad2_vel = -self.pad2_vel
+            if profiler is not None:
+                profiler.lap('auto_paddle')
 
         # ball's movement
         self.ball_X += self.ball_vel_X
@@ -207,82 +447,211 @@ class Pong:
                         self.ball_vel_Y = -BALL_SPEED_Y_LIMIT
         if self.ball_vel_Y == 0:
             self.ball_vel_Y = 1
+        if profiler is not None:
+            profiler.lap('ball')
 
-        # Draw image and get state for each player
-        SCREEN.blit(IMAGES['background'], (0, 0))
-        SCREEN.blit(IMAGES['ball'], (self.ball_X - BALL_SIZE / 2, self.ball_Y - BALL_SIZE / 2))
-
-        # state1
-        SCREEN.blit(IMAGES['paddle_self'], (self.pad1_X - PAD_WIDTH / 2, self.pad1_Y - PAD_HEIGHT / 2))
-        SCREEN.blit(IMAGES['paddle_other'], (self.pad2_X - PAD_WIDTH / 2, self.pad2_Y - PAD_HEIGHT / 2))
-        state1 = pygame.surfarray.array3d(pygame.display.get_surface())
-
-        # state2
-        SCREEN.blit(IMAGES['paddle_other'], (self.pad1_X - PAD_WIDTH / 2, self.pad1_Y - PAD_HEIGHT / 2))
-        SCREEN.blit(IMAGES['paddle_self'], (self.pad2_X - PAD_WIDTH / 2, self.pad2_Y - PAD_HEIGHT / 2))
-        state2 = pygame.surfarray.array3d(pygame.display.get_surface())
-
-        state2 = np.flip(state2, axis=0)
+    def fast_forward(self, action_list, max_frames):
+        """
+        Advance up to max_frames frames at once while nothing happens but
+        straight moves: as long as the ball touches neither a wall nor the
+        zone of a paddle, move does nothing else than adding the velocities to
+        the positions (and clamping the paddles). These additions are done
+        here frame by frame, the same floating point operations as move, so
+        the game is bit-identical to one stepped by move alone. The ball is
+        never moved past a contact, whatever the number of frames.
+
+        Return:
+            The number of frames advanced, 0 if the next frame needs move
+            (ball at a contact, or paddle 2 moved automatically, which draws
+            random numbers every frame).
+        """
+        if not self.two_players or self.ball_vel_Y == 0:
+            return 0
+        # the ball is only moved while it stays strictly inside these bounds
+        low_X, high_X = self.pad1_X + BALL_SIZE / 2, self.pad2_X - BALL_SIZE / 2
+        low_Y, high_Y = BALL_SIZE / 2, SCREENHEIGHT - BALL_SIZE / 2
+        ball_X, ball_Y = self.ball_X, self.ball_Y
+        vel_X, vel_Y = self.ball_vel_X, self.ball_vel_Y
+        frames = 0
+        while frames < max_frames and low_X < ball_X + vel_X < high_X and low_Y < ball_Y + vel_Y < high_Y:
+            ball_X += vel_X
+            ball_Y += vel_Y
+            frames += 1
+        if frames == 0:
+            return 0
+
+        self.pad1_vel = (0, -PAD_SPEED_1, PAD_SPEED_1)[action_list[0]]
+        self.pad2_vel = (0, -PAD_SPEED_2, PAD_SPEED_2)[action_list[1]]
+        pad_low, pad_high = PAD_HEIGHT / 2, SCREENHEIGHT - PAD_HEIGHT / 2
+        for _ in range(frames):
+            self.pad1_Y = min(max(self.pad1_Y + self.pad1_vel, pad_low), pad_high)
+            self.pad2_Y = min(max(self.pad2_Y + self.pad2_vel, pad_low), pad_high)
+        self.ball_X = ball_X
+        self.ball_Y = ball_Y
+        self.at_wall = False
+        self.at_paddle = False
+        if self.profiler is not None:
+            self.profiler.lap('fast_forward')
+        return frames
 
-        SCREEN.blit(IMAGES['paddle_self'], (self.pad1_X - PAD_WIDTH / 2, self.pad1_Y - PAD_HEIGHT / 2))
-        SCREEN.blit(IMAGES['paddle_self'], (self.pad2_X - PAD_WIDTH / 2, self.pad2_Y - PAD_HEIGHT / 2))
+    def render(self, out=None):
+        """
+        Draw the current frame and return the state for each player, in the
+        format given by observation_spec. The frame is drawn by the rasterizer
+        into the frame buffer of this game, and in 'human' mode it is also
+        copied to the window. In 'none' mode nothing is drawn and both states
+        are None.
+
+        If out, an array of shape (2,) + state shape, is given, the states are
+        written into it and out is returned instead of a list.
+
+        The frame buffer is a rasterizer.Canvas, redrawn only where sprites
+        moved. Afterwards self.dirty_rects[i] is the list of rectangles
+        (x0, y0, x1, y1) of the full size state of player i+1 outside of
+        which it did not change since the previous render (the whole frame
+        after the first one).
+        """
+        if self.render_mode == 'none':
+            return [None, None]
+        profiler = self.profiler
+        frame = self.frame
+        ball = (SPRITES['ball'], self.ball_X - BALL_SIZE / 2, self.ball_Y - BALL_SIZE / 2)
+        pad1 = (self.pad1_X - PAD_WIDTH / 2, self.pad1_Y - PAD_HEIGHT / 2)
+        pad2 = (self.pad2_X - PAD_WIDTH / 2, self.pad2_Y - PAD_HEIGHT / 2)
+        # Draw image and get state for each player. The frame is kept from the
+        # last render, only the rectangles where a sprite moved are redrawn.
 
+        # state1
+        state1_rects = self.canvas.draw([ball, (SPRITES['paddle_self'],) + pad1, (SPRITES['paddle_other'],) + pad2])
+        if profiler is not None:
+            profiler.lap('draw')
+        state1 = self.observe(frame, None if out is None else out[0])
+        if profiler is not None:
+            profiler.lap('observe')
+
+        # state2: swap the paddle images, and swap them back afterwards so that
+        # the frame stays the one the canvas drew
+        rasterizer.blit(frame, SPRITES['paddle_other'], pad1[0], pad1[1])
+        rasterizer.blit(frame, SPRITES['paddle_self'], pad2[0], pad2[1])
+        if profiler is not None:
+            profiler.lap('draw')
+        state2 = self.observe(np.flip(frame, axis=0), None if out is None else out[1])
+        if profiler is not None:
+            profiler.lap('observe')
+        self.dirty_rects = [state1_rects, [(SCREENWIDTH - x1, y0, SCREENWIDTH - x0, y1) for x0, y0, x1, y1 in state1_rects]]
+
+        if self.render_mode == 'human' or self.window is not None:
+            # the window shows both paddles as 'paddle_self'
+            rasterizer.blit(frame, SPRITES['paddle_self'], pad1[0], pad1[1])
+            if self.window is not None:
+                self.window[...] = frame
+            if self.render_mode == 'human':
+                import pygame
+                pygame.surfarray.blit_array(SCREEN, frame)
+        rasterizer.blit(frame, SPRITES['paddle_other'], pad2[0], pad2[1])
+        rasterizer.blit(frame, SPRITES['paddle_self'], pad1[0], pad1[1])
+        if profiler is not None:
+            profiler.lap('draw')
+
+        if out is not None:
+            return out
+        return [state1, state2]
+
+    def keep_window(self):
+        """
+        Keep a copy of the frame the window shows (both paddles drawn as
+        'paddle_self') in self.window, redrawn by every render, also in
+        'headless' mode where there is no window. Used to record videos.
 
-        terminal = False
-        reward1 = 0
-        reward2 = 0
-        # score or not
-        if self.ball_X < BALL_SIZE/2:
-            reward1 = PENALTY
-            reward2 = REWARD
-            terminal = True
-            #self.total_score_1 += reward1
-            self.total_score_2 += reward2
-            total_score_1 = self.total_score_1
-            total_score_2 = self.total_score_2
-            two_players = self.two_players
-            pad1_Y = self.pad1_Y
-            pad2_Y = self.pad2_Y
-            self.__init__(two_players)
-            self.total_score_1 = total_score_1
-            self.total_score_2 = total_score_2
-            if max(self.total_score_1, self.total_score_2) >= 210:
-                self.total_score_1 = 0
-                self.total_score_2 = 0
-            else:
-                self.pad1_Y = pad1_Y
-                self.pad2_Y = pad2_Y
+        Return:
+            self.window, uint8 of shape (SCREENWIDTH, SCREENHEIGHT, 3).
+        """
+        if self.window is None:
+            self.window = np.zeros_like(self.frame)
+        return self.window
 
-        elif self.ball_X > SCREENWIDTH - BALL_SIZE/2:
-            reward1 = REWARD
-            reward2 = PENALTY
-            terminal = True
-            self.total_score_1 += reward1
-            #self.total_score_2 += reward2
-            total_score_1 = self.total_score_1
-            total_score_2 = self.total_score_2
-            two_players = self.two_players
-            pad1_Y = self.pad1_Y
-            pad2_Y = self.pad2_Y
-            self.__init__(two_players)
-            self.total_score_1 = total_score_1
-            self.total_score_2 = total_score_2
-            if max(self.total_score_1, self.total_score_2) >= 210:
-                self.total_score_1 = 0
-                self.total_score_2 = 0
-            else:
-                self.pad1_Y = pad1_Y
-                self.pad2_Y = pad2_Y
+    def profile_stats(self):
+        """
+        Return the timing statistics of the phases of step, as returned by
+        profiling.StepProfiler.stats: 'paddles', 'auto_paddle' (one player),
+        'ball' (movement and collisions), 'fast_forward' (frames advanced
+        in closed form, see fast_forward), 'draw' and 'observe' (pixel
+        states), 'features' (vector states), 'scoring' (rewards and reset),
+        'display' (human mode) and 'step' (the whole step). Empty if the game
+        was created with profile=False.
+        """
+        if self.profiler is None:
+            return {}
+        return self.profiler.stats()
 
-        # Update the view
-        pygame.display.update()
-        # Update time
-        FPSCLOCK.tick(FPS)
+    def clone_state(self):
+        """
+        Return the dynamic state of the game (paddles, ball, at_wall,
+        at_paddle, scores and random generator) as a flat float64 array, see
+        snapshot.py. restore_state sets it back, after which the game goes on
+        exactly as it did after clone_state.
+        """
+        return np.concatenate([snapshot.pack_numbers([self.pad1_Y, self.pad2_Y, self.pad1_vel, self.pad2_vel,
+                                                      self.ball_X, self.ball_Y, self.ball_vel_X, self.ball_vel_Y,
+                                                      self.at_wall, self.at_paddle,
+                                                      self.total_score_1, self.total_score_2]),
+                               snapshot.rng_state(self.rng)])
 
-        return [state1, state2], [reward1, reward2], terminal, [self.total_score_1, self.total_score_2]
+    def restore_state(self, state):
+        """
+        Set the dynamic state of the game from an array returned by
+        clone_state. The frame buffer is left as it is, the next render
+        redraws what changed.
+        """
+        state = np.asarray(state, dtype=np.float64)
+        if state.shape != (13 + snapshot.RNG_SIZE,):
+            raise ValueError('state must be an array returned by Pong.clone_state')
+        (self.pad1_Y, self.pad2_Y, self.pad1_vel, self.pad2_vel, self.ball_X, self.ball_Y, self.ball_vel_X,
+         self.ball_vel_Y, at_wall, at_paddle, self.total_score_1, self.total_score_2) = snapshot.unpack_numbers(state[:13])
+        self.at_wall = bool(at_wall)
+        self.at_paddle = bool(at_paddle)
+        snapshot.set_rng_state(self.rng, state[13:])
+
+    def features(self, out=None):
+        """
+        Return the state of each player as a feature vector, without drawing.
+        Row i of the returned (2, NUM_FEATURES) float32 array is the state of
+        player i+1, seen from that player: its own paddle (y, velocity), the
+        other paddle (y, velocity), then the ball (x, y, x velocity, y velocity).
+        As in the image states, the x axis is mirrored for player 2.
+        Positions are divided by the screen size and velocities by their limits.
+        The array is out if given.
+        """
+        pad1 = [self.pad1_Y / float(SCREENHEIGHT), self.pad1_vel / float(PAD_SPEED_1)]
+        pad2 = [self.pad2_Y / float(SCREENHEIGHT), self.pad2_vel / float(PAD_SPEED_2)]
+        ball_X = self.ball_X / float(SCREENWIDTH)
+        ball_Y = self.ball_Y / float(SCREENHEIGHT)
+        vel_X = self.ball_vel_X / float(BALL_SPEED_X_LIMIT)
+        vel_Y = self.ball_vel_Y / float(BALL_SPEED_Y_LIMIT)
+        if out is None:
+            out = np.empty((2, NUM_FEATURES), dtype=np.float32)
+        out[0] = pad1 + pad2 + [ball_X, ball_Y, vel_X, vel_Y]
+        out[1] = pad2 + pad1 + [1 - ball_X, ball_Y, -vel_X, vel_Y]
+        return out
+
+    def observe(self, frame, out=None):
+        """
+        Convert a rendered frame into a state following observation_spec,
+        written into out if given.
+        """
+        if self.observation_spec is None:
+            if out is None:
+                return frame.copy()
+            out[...] = frame
+            return out
+        return self.observation_spec.process(frame, out=out)
 
 
 def human_play():
+    import pygame
+    import skimage.color
+    import skimage.transform
+    import matplotlib.pyplot as plt
     game = Pong(two_players=True)
     t = 0
     while 1:
@@ -1,18 +1,25 @@
-import pygame
+import assets
 """
 This script loads all the images for every elements in the Pong
 """
 
+# image file of each element, in the directory of the package
+FILES = {
+    'paddle_self': 'paddle_self.png',
+    'paddle_other': 'paddle_other.png',
+    'background': 'background_pong.png',
+    'ball': 'ball.png',
+}
+
 def load():
+    """
+    Load the images as pygame surfaces. The window must be open (see init_display).
+    """
+    import pygame
 
     IMAGES = {}
 
-    IMAGES['paddle_self'] = pygame.image.load('paddle_self.png').convert_alpha()
-
-    IMAGES['paddle_other'] = pygame.image.load('paddle_other.png').convert_alpha()
-
-    IMAGES['background'] = pygame.image.load('background_pong.png').convert_alpha()
-
-    IMAGES['ball'] = pygame.image.load('ball.png').convert_alpha()
+    for name, filename in FILES.items():
+        IMAGES[name] = pygame.image.load(assets.asset_path(filename)).convert_alpha()
 
-    return IMAGES
\ No newline at end of file
+    return IMAGES
@@ -0,0 +1,165 @@
+"""
+This script builds the 'StepProfiler' class, which times the phases of the
+step function of a game (paddle or hunter logic, collisions, drawing, ...).
+
+A game created with profile=True calls start() at the beginning of step, then
+lap(name) at the end of each phase, and stop() before returning. The time
+spent in each phase during a step is added up, and when the step ends it goes
+into the histogram of that phase. Histograms have power-of-two buckets in
+microseconds, so recording a duration is a few integer operations. A game
+created without profiling has profiler None and only pays for the
+'if profiler is not None' tests.
+"""
+
+import sys
+import time
+
+
+def _monotonic_timer():
+    """
+    Return a function giving the time in seconds from a monotonic clock.
+
+    Python 3 has time.perf_counter. Python 2 has no monotonic clock in time,
+    so on Linux it reads clock_gettime(CLOCK_MONOTONIC) through ctypes (about
+    two microseconds per call). Elsewhere it falls back to time.time, which is
+    not monotonic: a step during which the wall clock is set back or forward
+    gets a wrong duration.
+    """
+    if hasattr(time, 'perf_counter'):
+        return time.perf_counter
+    if not sys.platform.startswith('linux'):
+        # the clock ids differ between systems (1 is CLOCK_VIRTUAL on FreeBSD)
+        return time.time
+    try:
+        import ctypes
+        import ctypes.util
+
+        class timespec(ctypes.Structure):
+            _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+        library = ctypes.CDLL(ctypes.util.find_library('rt') or ctypes.util.find_library('c'), use_errno=True)
+        clock_gettime = library.clock_gettime
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+        CLOCK_MONOTONIC = 1 # linux/time.h
+        value = timespec()
+        pointer = ctypes.pointer(value)
+        if clock_gettime(CLOCK_MONOTONIC, pointer) != 0:
+            raise OSError(ctypes.get_errno(), 'clock_gettime failed')
+    except (ImportError, OSError, AttributeError, TypeError):
+        return time.time
+
+    def monotonic():
+        clock_gettime(CLOCK_MONOTONIC, pointer)
+        return value.tv_sec + value.tv_nsec * 1e-9
+    return monotonic
+
+
+# time in seconds from a monotonic clock (but see _monotonic_timer outside Linux on python 2)
+timer = _monotonic_timer()
+
+NUM_BUCKETS = 32 # bucket 0: < 1us, bucket k: [2^(k-1), 2^k) us, the last one is unbounded
+
+
+def bucket_bounds(k):
+    """
+    Return the (low, high) bounds of bucket k, in seconds.
+    """
+    low = 0.0 if k == 0 else 2.0 ** (k - 1) * 1e-6
+    high = float('inf') if k == NUM_BUCKETS - 1 else 2.0 ** k * 1e-6
+    return low, high
+
+
+class PhaseStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = [0] * NUM_BUCKETS
+
+    def record(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.histogram[min(int(seconds * 1e6).bit_length(), NUM_BUCKETS - 1)] += 1
+
+    def percentile(self, q):
+        """
+        Estimate the q-th percentile (q in [0, 100]) as the upper bound of the
+        bucket where it falls, capped by the largest recorded duration.
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q / 100.0 * self.count
+        seen = 0
+        for k, n in enumerate(self.histogram):
+            seen += n
+            if n and seen >= rank:
+                return min(bucket_bounds(k)[1], self.max)
+        return self.max
+
+
+class StepProfiler:
+    def __init__(self):
+        self.phases = {}  # name -> PhaseStats
+        self.current = {} # name -> seconds spent in that phase in the current step
+        self.last = None  # time of the last start() or lap(), None outside of a step
+        self.step_start = None
+
+    def start(self):
+        self.last = self.step_start = timer()
+
+    def lap(self, name):
+        """
+        Count the time elapsed since the last start() or lap() in phase name.
+        Does nothing outside of a step.
+        """
+        if self.last is None:
+            return
+        now = timer()
+        self.current[name] = self.current.get(name, 0.0) + now - self.last
+        self.last = now
+
+    def stop(self):
+        """
+        End the step: record the time of each phase and of the whole step
+        (phase 'step').
+        """
+        if self.last is None:
+            return
+        self.record('step', timer() - self.step_start)
+        for name, seconds in self.current.items():
+            self.record(name, seconds)
+        self.current.clear()
+        self.last = None
+
+    def record(self, name, seconds):
+        """
+        Record one duration in the histogram of phase name directly.
+        """
+        stats = self.phases.get(name)
+        if stats is None:
+            stats = self.phases[name] = PhaseStats()
+        stats.record(seconds)
+
+    def reset(self):
+        self.phases.clear()
+        self.current.clear()
+        self.last = None
+
+    def stats(self):
+        """
+        Return a dict mapping each phase name to a dict with its count, total,
+        mean, max, p50 and p99 (in seconds) and its histogram (a list of
+        NUM_BUCKETS counts, see bucket_bounds).
+        """
+        result = {}
+        for name, stats in self.phases.items():
+            result[name] = {'count': stats.count,
+                            'total': stats.total,
+                            'mean': stats.total / stats.count,
+                            'max': stats.max,
+                            'p50': stats.percentile(50),
+                            'p99': stats.percentile(99),
+                            'histogram': list(stats.histogram)}
+        return result
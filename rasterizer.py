@@ -0,0 +1,276 @@
+"""
+This script is a small software rasterizer used to build the game states
+without going through pygame. Sprites are converted once from pygame
+surfaces into premultiplied uint8 arrays (and cached in a sprite atlas, see
+assets.py), and are then stamped into preallocated NumPy frame buffers with
+slice assignment.
+
+Frames use the same layout as pygame.surfarray.array3d: a frame has shape
+(width, height, 3) and is indexed as frame[x, y]. Batched frames have shape
+(N, width, height, 3). For opaque pixels (every sprite shipped with the games
+is fully opaque) the result is identical to SCREEN.blit followed by
+pygame.surfarray.array3d. Translucent pixels are composited with the
+premultiplied "over" operator.
+
+A Canvas keeps a frame buffer from one draw to the next and only redraws the
+rectangles where sprites changed, which it reports so that consumers of the
+frames can also work incrementally.
+"""
+
+import numpy as np
+
+
+class Sprite:
+    def __init__(self, rgb, alpha):
+        """
+        Arguments:
+            rgb: uint8 array of shape (width, height, 3), the colors of the
+            sprite premultiplied by alpha.
+            alpha: uint8 array of shape (width, height).
+        """
+        self.rgb = np.ascontiguousarray(rgb, dtype=np.uint8)
+        self.alpha = np.ascontiguousarray(alpha, dtype=np.uint8)
+        self.width, self.height = self.alpha.shape
+        self.opaque = bool((self.alpha == 255).all())
+        # weight of the destination pixel, only needed for translucent sprites
+        self.inv_alpha = None if self.opaque else (255 - self.alpha[:, :, None]).astype(np.uint16)
+
+
+def sprite_from_surface(surface):
+    """
+    Convert a pygame surface (with or without per-pixel alpha) into a Sprite.
+    """
+    import pygame
+    rgb = pygame.surfarray.array3d(surface).astype(np.uint16)
+    if surface.get_flags() & pygame.SRCALPHA:
+        alpha = pygame.surfarray.array_alpha(surface)
+    else:
+        alpha = np.full(rgb.shape[:2], 255, dtype=np.uint8)
+    premultiplied = (rgb * alpha[:, :, None] + 127) // 255
+    return Sprite(premultiplied.astype(np.uint8), alpha)
+
+
+def mirror(sprite):
+    """
+    Return the sprite flipped along x, for drawing into frames that are
+    mirrored left-right.
+    """
+    return Sprite(sprite.rgb[::-1], sprite.alpha[::-1])
+
+
+def load_sprites(images):
+    """
+    Convert a dict of pygame surfaces (e.g. the IMAGES dict of a game) into a
+    dict of Sprites with the same keys.
+    """
+    return dict((name, sprite_from_surface(surface)) for name, surface in images.items())
+
+
+def _clip(frame, sprite, x, y):
+    """
+    Intersect the sprite placed at (x, y) with the frame. Returns the frame
+    slices and the sprite slices, or None if the sprite is off the frame.
+    """
+    x = int(x) # pygame truncates blit positions toward zero
+    y = int(y)
+    width, height = frame.shape[0], frame.shape[1]
+    x0 = max(x, 0)
+    y0 = max(y, 0)
+    x1 = min(x + sprite.width, width)
+    y1 = min(y + sprite.height, height)
+    if x0 >= x1 or y0 >= y1:
+        return None
+    return (slice(x0, x1), slice(y0, y1)), (slice(x0 - x, x1 - x), slice(y0 - y, y1 - y))
+
+
+def blit(frame, sprite, x, y):
+    """
+    Draw sprite onto frame (shape (width, height, 3)) with its top-left corner
+    at (x, y), the same way SCREEN.blit(image, (x, y)) does.
+    """
+    clipped = _clip(frame, sprite, x, y)
+    if clipped is None:
+        return
+    dst, src = clipped
+    if sprite.opaque:
+        frame[dst] = sprite.rgb[src]
+    else:
+        blended = sprite.rgb[src] + (frame[dst] * sprite.inv_alpha[src] + 127) // 255
+        frame[dst] = blended
+
+
+def blit_many(frames, sprite, xs, ys, mask=None):
+    """
+    Draw sprite onto every frame of a batch: frames[k] receives the sprite at
+    (xs[k], ys[k]). Frames where mask is False are left untouched.
+
+    Arguments:
+        frames: uint8 array of shape (N, width, height, 3).
+        sprite: a Sprite.
+        xs, ys: arrays of shape (N,) with the top-left corners.
+        mask: boolean array of shape (N,) or None.
+    """
+    xs = np.asarray(xs).astype(np.int64).tolist() # truncates toward zero like int()
+    ys = np.asarray(ys).astype(np.int64).tolist()
+    if mask is None:
+        index = range(len(xs))
+    else:
+        index = np.flatnonzero(mask).tolist()
+    # one slice assignment per frame is much cheaper than a fancy-indexed scatter
+    for k in index:
+        blit(frames[k], sprite, xs[k], ys[k])
+
+
+def fill(frames, sprite):
+    """
+    Cover every frame with the background sprite drawn at (0, 0), clipped to
+    the frame size. frames is an array of shape (..., width, height, 3).
+    """
+    width, height = frames.shape[-3], frames.shape[-2]
+    w = min(width, sprite.width)
+    h = min(height, sprite.height)
+    if sprite.opaque:
+        frames[..., :w, :h, :] = sprite.rgb[:w, :h]
+    else:
+        blended = sprite.rgb[:w, :h] + (frames[..., :w, :h, :] * sprite.inv_alpha[:w, :h] + 127) // 255
+        frames[..., :w, :h, :] = blended
+
+
+class Canvas:
+    def __init__(self, frame, background):
+        """
+        A frame buffer kept from one draw to the next and redrawn
+        incrementally: only the rectangles covered by sprites that changed
+        (moved, appeared, disappeared or changed image) since the previous
+        draw are restored from the background and redrawn. When many sprites
+        changed, the whole frame is redrawn instead, which is then cheaper.
+
+        Arguments:
+            frame: uint8 array of shape (width, height, 3), drawn in place.
+            background: Sprite drawn at (0, 0) under every other sprite.
+        """
+        self.frame = frame
+        self.background = background
+        self.width, self.height = frame.shape[0], frame.shape[1]
+        self.items = None # (sprite, x, y) of the last draw, None when the frame content is unknown
+        self.dirty_rects = [] # rectangles changed by the last draw
+
+    def invalidate(self):
+        """
+        Force the next draw to redraw the whole frame, e.g. after the frame
+        was modified outside of the canvas.
+        """
+        self.items = None
+
+    def rect(self, sprite, x, y):
+        """
+        Return the rectangle (x0, y0, x1, y1) covered by the sprite drawn at
+        (x, y), clipped to the frame, or None if it is off the frame.
+        """
+        x0 = max(x, 0)
+        y0 = max(y, 0)
+        x1 = min(x + sprite.width, self.width)
+        y1 = min(y + sprite.height, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return None
+        return x0, y0, x1, y1
+
+    def draw(self, items):
+        """
+        Make the frame equal to the background with the sprites of items drawn
+        on it in order, the same as fill followed by one blit per item.
+
+        Arguments:
+            items: list of (sprite, x, y), x and y being the top-left corner.
+        Return:
+            list of possibly overlapping rectangles (x0, y0, x1, y1), each
+            covering frame[x0:x1, y0:y1], outside of which the frame did not
+            change. It is also kept as dirty_rects. It is the whole frame
+            when it was redrawn entirely.
+        """
+        old_items = self.items
+        # pygame truncates blit positions toward zero
+        items = self.items = [(sprite, int(x), int(y)) for sprite, x, y in items]
+        if old_items is not None:
+            changed = []
+            for k in range(max(len(old_items), len(items))):
+                old = old_items[k] if k < len(old_items) else None
+                new = items[k] if k < len(items) else None
+                if old is None or new is None or old[0] is not new[0] or old[1] != new[1] or old[2] != new[2]:
+                    changed.append((old, new))
+            # When most sprites changed, report the whole frame rather than
+            # computing a rectangle for each of them.
+            if len(changed) <= 8 or len(changed) * 2 <= len(items):
+                dirty = []
+                for old, new in changed:
+                    old_rect = None if old is None else self.rect(*old)
+                    rect = None if new is None else self.rect(*new)
+                    if old_rect is not None and rect is not None and _overlap(old_rect, rect):
+                        # a sprite moving by a few pixels: one rectangle around both positions
+                        dirty.append(_union(old_rect, rect))
+                        continue
+                    if old_rect is not None:
+                        dirty.append(old_rect)
+                    if rect is not None:
+                        dirty.append(rect)
+                self.dirty_rects = dirty
+                # Redrawing a rectangle costs about two blits plus a test of
+                # every item, a full redraw a fill (about two blits) and one
+                # blit per item.
+                if len(dirty) * (32 + len(items)) < 16 * (2 + len(items)):
+                    for rect in dirty:
+                        self._redraw(rect)
+                else:
+                    self._draw_all()
+                return dirty
+
+        # the first draw, or most sprites changed
+        self._draw_all()
+        self.dirty_rects = [(0, 0, self.width, self.height)]
+        return self.dirty_rects
+
+    def _draw_all(self):
+        """
+        Redraw the whole frame.
+        """
+        if not self.background.opaque:
+            self.frame[...] = 0
+        fill(self.frame, self.background)
+        for sprite, x, y in self.items:
+            blit(self.frame, sprite, x, y)
+
+    def _redraw(self, rect):
+        """
+        Redraw the background and every item overlapping rect, clipped to rect.
+        """
+        x0, y0, x1, y1 = rect
+        region = self.frame[x0:x1, y0:y1]
+        background = self.background
+        if background.opaque and background.width >= x1 and background.height >= y1:
+            region[...] = background.rgb[x0:x1, y0:y1]
+        else:
+            region[...] = 0
+            blit(region, background, -x0, -y0)
+        for sprite, x, y in self.items:
+            if x < x1 and y < y1 and x + sprite.width > x0 and y + sprite.height > y0:
+                blit(region, sprite, x - x0, y - y0)
+
+
+def _overlap(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def _union(a, b):
+    return min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])
+
+
+def tile(sprite, width, height):
+    """
+    Return a Sprite of size (width, height) covered with copies of sprite,
+    the first one at (0, 0), e.g. a background for a frame larger than its
+    image. The copies are cropped to the size.
+    """
+    reps = (-(-width // sprite.width), -(-height // sprite.height))
+    rgb = np.tile(sprite.rgb, reps + (1,))[:width, :height]
+    alpha = np.tile(sprite.alpha, reps)[:width, :height]
+    return Sprite(rgb, alpha)
@@ -0,0 +1,226 @@
+"""
+This script builds the 'ReplayBuffer' class, a DQN replay memory for the
+multi-agent games kept in memory-mapped files, so that its capacity is bound
+by the disk rather than by the RAM.
+
+Each call to add stores one row: the state of every agent (a preprocessed
+uint8 frame, see observation.py), its action, and the reward and terminal
+flag returned by the step. An agent that did not choose an action (the
+automatic paddle of single-player Pong) has the action -1, and its
+transitions are never sampled. Rows go into a circular buffer of capacity rows. A
+frame is stored once, in its row: the stacks of the last k states of a
+transition and of its next state are rebuilt from the row indices when
+sampling. Before the first state of an episode, a stack repeats that state.
+
+The episodes are tracked per agent, and restart exactly where FrameStack
+restarts its histories (see frame_stack.restarts): after a Pong point, with
+the first states of a new HunterPrey game, and after a prey was killed. So
+the sampled stacks are the ones a FrameStack returned while playing. Agents
+without a state in a row (dead preys) are never sampled from it.
+
+The files, in a directory:
+    frames.npy: uint8, (capacity, num_agents) + frame shape, created on the
+    first add, when the frame shape is known.
+    actions.npy: int8, (capacity, num_agents), -1 for no action.
+    rewards.npy: float32, (capacity, num_agents).
+    flags.npy: uint8, (capacity, num_agents), bits VALID, TERMINAL and FIRST.
+    meta.json: sizes and write position, written by flush. A buffer created
+    on a directory holding a flushed buffer goes on from it.
+"""
+
+import json
+import os
+
+import numpy as np
+
+import frame_stack
+
+VALID = 1    # the agent has a state in this row
+TERMINAL = 2 # the transition from this row ends the episode of the agent
+FIRST = 4    # the history of the agent restarts with the state of this row
+
+
+class ReplayBuffer:
+    def __init__(self, directory, capacity, num_agents, k=4, seed=None):
+        """
+        Arguments:
+            directory: path of the directory of the files, created if needed.
+            capacity: int, number of rows (steps of the game) kept.
+            num_agents: int, number of agents (2 for Pong, num_preys for
+            HunterPrey).
+            k: int, number of stacked states.
+            seed: int or None, seed of the random generator used by sample.
+        """
+        self.directory = directory
+        self.capacity = int(capacity)
+        self.num_agents = int(num_agents)
+        self.k = int(k)
+        self.rng = np.random.RandomState(seed)
+        self.position = 0 # row written by the next add
+        self.count = 0    # number of rows stored
+        self.frame_shape = None
+        self.frames = None
+        # agents whose history restarts with the states of the next add, and of the add after it
+        self.restart = np.ones(self.num_agents, dtype=bool)
+        self.restart_later = np.zeros(self.num_agents, dtype=bool)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        meta = None
+        if os.path.exists(self._path('meta.json')):
+            with open(self._path('meta.json')) as f:
+                meta = json.load(f)
+            if (meta['capacity'], meta['num_agents'], meta['k']) != (self.capacity, self.num_agents, self.k):
+                raise ValueError('the buffer in ' + directory + ' has another capacity, num_agents or k')
+        mode = 'w+' if meta is None else 'r+'
+        shape = (self.capacity, self.num_agents)
+        self.actions = self._open('actions.npy', mode, np.int8, shape)
+        self.rewards = self._open('rewards.npy', mode, np.float32, shape)
+        self.flags = self._open('flags.npy', mode, np.uint8, shape)
+        if meta is not None:
+            self.position = meta['position']
+            self.count = meta['count']
+            self.restart[:] = meta['restart']
+            self.restart_later[:] = meta['restart_later']
+            if meta['frame_shape'] is not None:
+                self.frame_shape = tuple(meta['frame_shape'])
+                self.frames = self._open('frames.npy', 'r+', np.uint8, shape + self.frame_shape)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _open(self, name, mode, dtype, shape):
+        array = np.lib.format.open_memmap(self._path(name), mode=mode, dtype=dtype, shape=shape)
+        if array.shape != shape:
+            raise ValueError(name + ' has shape ' + str(array.shape) + ' instead of ' + str(shape))
+        return array
+
+    def __len__(self):
+        return self.count
+
+    def add(self, states, action_list, result):
+        """
+        Store one row.
+
+        Arguments:
+            states: sequence with one state (uint8 array) or None per agent,
+            the states action_list was chosen from (those returned by the
+            previous step).
+            action_list: one action per agent, -1 for the agents that did
+            not choose one: the actions given to the step of the game, plus
+            -1 for paddle 2 of single-player Pong.
+            result: what that step returned.
+        """
+        if len(states) != self.num_agents:
+            raise ValueError('number of states != num_agents')
+        if len(action_list) != self.num_agents:
+            raise ValueError('number of actions != num_agents, use -1 for the agents without an action')
+        if self.frames is None:
+            first = next((state for state in states if state is not None), None)
+            if first is None:
+                raise ValueError('the first row must have at least one state')
+            if np.asarray(first).dtype != np.uint8:
+                raise ValueError('states must be uint8 frames')
+            self.frame_shape = np.shape(first)
+            self.frames = self._open('frames.npy', 'w+', np.uint8,
+                                     (self.capacity, self.num_agents) + self.frame_shape)
+
+        p = self.position
+        valid = np.array([state is not None for state in states])
+        # one terminal for both Pong players, one per prey for HunterPrey
+        terminals = np.zeros(self.num_agents, dtype=bool)
+        terminals[:] = result[2]
+        frames = self.frames[p]
+        for i, state in enumerate(states):
+            if state is not None:
+                frames[i] = state
+        self.actions[p] = action_list
+        self.rewards[p] = result[1]
+        self.flags[p] = valid * VALID | (valid & terminals) * TERMINAL | (valid & self.restart) * FIRST
+        restart_now, restart_next = frame_stack.restarts(result)
+        # the history also restarts after an agent without a state, as in FrameStack
+        self.restart = restart_now | self.restart_later | ~valid
+        self.restart_later = restart_next
+        self.position = (p + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def flush(self):
+        """
+        Write the arrays and the write position to disk.
+        """
+        for array in (self.frames, self.actions, self.rewards, self.flags):
+            if array is not None:
+                array.flush()
+        meta = {'capacity': self.capacity, 'num_agents': self.num_agents, 'k': self.k,
+                'position': self.position, 'count': self.count, 'restart': self.restart.tolist(),
+                'restart_later': self.restart_later.tolist(),
+                'frame_shape': None if self.frame_shape is None else list(self.frame_shape)}
+        with open(self._path('meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+    def stacks(self, rows, agents):
+        """
+        Return the stacks of the last k states of the given agents at the
+        given rows, an array of shape (len(rows), k) + frame shape, oldest
+        state first. The states before the first one of the episode (or the
+        oldest stored row) repeat it.
+
+        Arguments:
+            rows, agents: int arrays of the same shape (N,).
+        """
+        k = self.k
+        back = np.arange(k)
+        previous = (rows[:, None] - back) % self.capacity # rows of the stack, newest first
+        first = (self.flags[previous, agents[:, None]] & FIRST) != 0
+        # rows back from the oldest stored row are not in the buffer
+        first |= back >= (rows[:, None] - (self.position - self.count)) % self.capacity
+        first[:, -1] = True
+        start = np.argmax(first, axis=1) # rows back to the first state of the episode
+        source = (rows[:, None] - np.minimum(back[::-1], start[:, None])) % self.capacity
+        return self.frames[source, agents[:, None]]
+
+    def sample(self, batch_size, agent=None):
+        """
+        Draw batch_size transitions uniformly among the stored (row, agent)
+        pairs that have a state and an action, and whose next state is known.
+
+        Arguments:
+            batch_size: int.
+            agent: int or None, only draw the transitions of that agent.
+        Return:
+            states: uint8 array of shape (batch_size, k) + frame shape.
+            actions: int8 array of shape (batch_size,).
+            rewards: float32 array of shape (batch_size,).
+            next_states: same as states, meaningless where terminals is True.
+            terminals: boolean array of shape (batch_size,).
+            rows, agents: int arrays of shape (batch_size,), where the
+            transitions are stored.
+        """
+        if self.count < 2:
+            raise ValueError('the buffer needs at least two rows to sample')
+        oldest = self.position - self.count
+        newest = self.position - 1
+        rows = np.empty(0, dtype=np.int64)
+        agents = np.empty(0, dtype=np.int64)
+        for attempt in range(100):
+            # rejection sampling: draw more (row, agent) pairs than needed and keep the valid ones
+            n = 2 * (batch_size - len(rows)) + 16
+            candidates = (oldest + self.rng.randint(0, self.count - 1, size=n)) % self.capacity # not the newest row
+            if agent is None:
+                candidate_agents = self.rng.randint(0, self.num_agents, size=n)
+            else:
+                candidate_agents = np.full(n, agent, dtype=np.int64)
+            flags = self.flags[candidates, candidate_agents]
+            next_flags = self.flags[(candidates + 1) % self.capacity, candidate_agents]
+            keep = ((flags & VALID) != 0) & (((flags & TERMINAL) != 0) | ((next_flags & VALID) != 0)) & \
+                   (self.actions[candidates, candidate_agents] >= 0)
+            rows = np.concatenate([rows, candidates[keep]])[:batch_size]
+            agents = np.concatenate([agents, candidate_agents[keep]])[:batch_size]
+            if len(rows) == batch_size:
+                break
+        else:
+            raise ValueError('no transition to sample, newest row ' + str(newest % self.capacity))
+
+        return (self.stacks(rows, agents), self.actions[rows, agents], self.rewards[rows, agents],
+                self.stacks((rows + 1) % self.capacity, agents), (self.flags[rows, agents] & TERMINAL) != 0,
+                rows, agents)
@@ -0,0 +1,62 @@
+"""
+This script holds the helpers used by the games to save their dynamic state
+into a flat float64 array (clone_state) and to load it back (restore_state),
+e.g. to run many rollouts from the same state in a lookahead search.
+
+A snapshot has a fixed length for a given game configuration, so the
+snapshots of several games can be stacked into one 2-D array. float64 holds
+every int of the games, and every 32-bit word of the random generator,
+exactly. Scalars that can be either ints or floats are written with
+pack_numbers, which also records which ones are ints, so that they are read
+back with their original type (divisions of ints are floored in python 2).
+"""
+
+import numpy as np
+
+# MT19937 key (624 words), position in the key, has_gauss, cached_gaussian
+RNG_SIZE = 627
+
+
+def rng_state(rng):
+    """
+    Return the state of a np.random.RandomState as a float64 array of
+    RNG_SIZE.
+    """
+    name, key, pos, has_gauss, cached_gaussian = rng.get_state()
+    state = np.empty(RNG_SIZE, dtype=np.float64)
+    state[:624] = key
+    state[624:] = pos, has_gauss, cached_gaussian
+    return state
+
+
+def set_rng_state(rng, state):
+    """
+    Set the state of a np.random.RandomState from an array returned by
+    rng_state.
+    """
+    rng.set_state(('MT19937', state[:624].astype(np.uint32), int(state[624]), int(state[625]), float(state[626])))
+
+
+def pack_numbers(values):
+    """
+    Return a float64 array of length len(values) + 1: a bit mask of the
+    values that are not floats, followed by the values.
+
+    Arguments:
+        values: list of at most 52 ints, floats or booleans.
+    """
+    mask = 0
+    for k, value in enumerate(values):
+        if not isinstance(value, float):
+            mask |= 1 << k
+    return np.array([mask] + list(values), dtype=np.float64)
+
+
+def unpack_numbers(state):
+    """
+    Return the list of values packed by pack_numbers into state, booleans
+    being read as ints.
+    """
+    mask = int(state[0])
+    values = state[1:].tolist()
+    return [int(value) if mask >> k & 1 else value for k, value in enumerate(values)]
@@ -0,0 +1,86 @@
+"""
+This script builds the 'SpatialHash' class, a uniform grid over the arena used
+by HunterPrey to find the entities close to a point (kills, bonuses and the
+'egocentric' windows) without looking at every entity. The hunters pick their
+nearest prey from a distance matrix instead, see hunter_prey_2.hunter_actions.
+
+The arena is cut into square cells of side cell_size. Each entity, identified
+by an int, is stored in the cell containing its (x, y) position. Moving an
+entity only touches the grid when it changes cell. A radius query only looks
+at the cells overlapping the square around the query point, so with entities
+spread over the arena it costs about O(1) instead of O(number of entities).
+"""
+
+
+class SpatialHash:
+    def __init__(self, cell_size):
+        """
+        Argument:
+            cell_size: side of a cell, in pixels. Radius queries are cheapest
+            when it is about the query radius. Only the cells holding
+            entities are stored, so the grid needs no size.
+        """
+        self.cell_size = cell_size
+        self.cells = {}     # (cell_x, cell_y) -> set of ids
+        self.positions = {} # id -> (x, y)
+        self.keys = {}      # id -> (cell_x, cell_y)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, id):
+        return id in self.positions
+
+    def _key(self, x, y):
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def insert(self, id, x, y):
+        key = self._key(x, y)
+        self.positions[id] = (x, y)
+        self.keys[id] = key
+        self.cells.setdefault(key, set()).add(id)
+
+    def move(self, id, x, y):
+        self.positions[id] = (x, y)
+        key = self._key(x, y)
+        old_key = self.keys[id]
+        if key != old_key:
+            cell = self.cells[old_key]
+            cell.discard(id)
+            if not cell:
+                del self.cells[old_key]
+            self.keys[id] = key
+            self.cells.setdefault(key, set()).add(id)
+
+    def clear(self):
+        """
+        Remove every entity, keeping the grid.
+        """
+        self.cells.clear()
+        self.positions.clear()
+        self.keys.clear()
+
+    def remove(self, id):
+        key = self.keys.pop(id)
+        del self.positions[id]
+        cell = self.cells[key]
+        cell.discard(id)
+        if not cell:
+            del self.cells[key]
+
+    def query(self, x, y, radius):
+        """
+        Return the ids of the entities whose cell overlaps the square of half
+        side radius centered on (x, y), in no particular order. It contains
+        every entity closer than radius (in any norm), the caller does the
+        exact distance test.
+        """
+        x0, y0 = self._key(x - radius, y - radius)
+        x1, y1 = self._key(x + radius, y + radius)
+        ids = []
+        for cell_x in range(x0, x1 + 1):
+            for cell_y in range(y0, y1 + 1):
+                cell = self.cells.get((cell_x, cell_y))
+                if cell:
+                    ids.extend(cell)
+        return ids
@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# hunter_prey_2.py (and what imports it) only runs on python 2
+py2_only = pytest.mark.skipif(sys.version_info[0] > 2, reason='HunterPrey needs python 2')
+
+# the asyncio client only parses on python 3
+collect_ignore = ['test_env_server.py'] if sys.version_info[0] < 3 else []
@@ -0,0 +1,23 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+import run
+
+
+def test_compare_fails_on_slow_crashed_skipped_and_missing_cases():
+    baseline = dict((name, {'steps_per_sec': 100.0}) for name in ('fast', 'slow', 'crashed', 'skipped', 'missing'))
+    results = {
+        'fast': {'steps_per_sec': 95.0},
+        'slow': {'steps_per_sec': 50.0},
+        'crashed': {'error': 'exit status 1'},
+        'skipped': {'skipped': 'needs python 2'},
+        'new': {'steps_per_sec': 10.0},
+    }
+    failures = run.compare(results, baseline, 0.1, expected=list(baseline))
+    assert sorted(failures) == ['crashed', 'missing', 'skipped', 'slow']
+
+
+def test_compare_ignores_cases_without_baseline():
+    assert run.compare({'new': {'error': 'boom'}}, {}, 0.1) == []
@@ -0,0 +1,69 @@
+import functools
+
+import numpy as np
+import pytest
+
+import env_pool
+import observation
+import pong
+from conftest import py2_only
+
+SPEC = observation.ObservationSpec((20, 20), grayscale=True)
+
+
+def check_pool(make_env, num_actions, max_action, num_workers=2, envs_per_worker=2, steps=150):
+    """
+    Step a pool and one local game per row, built by the same make_env, with
+    the same actions, and compare what they return.
+    """
+    games = [make_env() for _ in range(num_workers * envs_per_worker)]
+    pool = env_pool.SubprocEnvPool(make_env, num_workers, envs_per_worker, seed=0)
+    try:
+        assert pool.num_actions == num_actions
+        rng = np.random.RandomState(5)
+        for t in range(steps):
+            actions = rng.randint(0, max_action + 1, size=(len(games), num_actions))
+            states, rewards, terminals, dones, alive = pool.step(actions)
+            for j, game in enumerate(games):
+                result = game.step(list(actions[j]))
+                assert list(rewards[j]) == list(result[1])
+                assert list(terminals[j]) == list(np.broadcast_to(result[2], (pool.num_agents,)))
+                if len(result) == 4:
+                    assert dones[j] == result[2]
+                    assert alive[j].all()
+                else:
+                    assert dones[j] == result[5]
+                if states is None:
+                    assert all(state is None for state in result[0])
+                    continue
+                for i, state in enumerate(result[0]):
+                    assert alive[j, i] == (state is not None)
+                    if state is None:
+                        assert not states[j, i].any()
+                    else:
+                        assert np.array_equal(states[j, i], state)
+    finally:
+        pool.close()
+
+
+@pytest.mark.parametrize('two_players', [True, False])
+def test_pong_pool_matches_local_games(two_players):
+    make_env = functools.partial(pong.Pong, two_players, 'headless', observation_spec=SPEC, seed=3)
+    check_pool(make_env, 2 if two_players else 1, 2)
+
+
+def test_pong_pool_without_states():
+    make_env = functools.partial(pong.Pong, True, 'none', seed=3)
+    pool = env_pool.SubprocEnvPool(make_env, 1)
+    try:
+        assert pool.states is None and pool.state_shape is None
+    finally:
+        pool.close()
+    check_pool(make_env, 2, 2, num_workers=1)
+
+
+@py2_only
+def test_hunter_prey_pool_matches_local_games():
+    import hunter_prey_2
+    make_env = functools.partial(hunter_prey_2.HunterPrey, 6, 4, 'headless', observation_spec=SPEC, seed=3)
+    check_pool(make_env, 4, 4, steps=300)
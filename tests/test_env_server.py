@@ -0,0 +1,86 @@
+import asyncio
+import os
+import socket
+import threading
+
+import numpy as np
+import pytest
+
+import env_client
+import env_server
+import observation
+import pong
+
+SPEC = {'size': [40, 40], 'grayscale': True}
+
+
+@pytest.fixture
+def server(tmpdir):
+    server = env_server.EnvServer(os.path.join(str(tmpdir), 'envs.sock'), 'pong', 3, observation_spec=SPEC)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield server
+    server.close()
+    thread.join(5)
+
+
+@pytest.mark.parametrize('shared_memory', [True, False])
+def test_round_trip_matches_local_games(server, shared_memory):
+    spec = observation.ObservationSpec(**SPEC)
+    games = [pong.Pong(render_mode='headless', observation_spec=spec, seed=10 + i) for i in range(3)]
+
+    async def play():
+        client = await env_client.EnvClient.connect(server.address, shared_memory=shared_memory)
+        info = await client.info()
+        assert info['num_envs'] == 3
+        first = await asyncio.gather(*[client.reset(i, seed=10 + i) for i in range(3)])
+        for states, game in zip(first, games):
+            for state, local in zip(states, game.render()):
+                assert np.array_equal(state, local)
+        for t in range(200):
+            action_lists = [[t % 3, (t // 3 + i) % 3] for i in range(3)]
+            # one request per game in flight at once, served together
+            results = await asyncio.gather(*[client.step(i, action_lists[i]) for i in range(3)])
+            for result, game, action_list in zip(results, games, action_lists):
+                local = game.step(action_list)
+                assert list(result[1:]) == [local[1], local[2], local[3]]
+                for state, local_state in zip(result[0], local[0]):
+                    assert np.array_equal(state, local_state)
+        with pytest.raises(RuntimeError):
+            await client.step(3, [0, 0])
+        await client.close()
+
+    asyncio.run(play())
+
+
+def test_malformed_request_only_fails_itself(server):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(server.address)
+    sock.settimeout(5)
+    incoming = bytearray()
+
+    def reply():
+        while True:
+            message = env_server.decode(incoming)
+            if message is not None:
+                return message[0]
+            data = sock.recv(1 << 16)
+            assert data, 'the server closed the connection'
+            incoming.extend(data)
+
+    text = b'not json'
+    sock.sendall(env_server.HEADER.pack(len(text), 0) + text)
+    assert 'not valid JSON' in reply()['error']
+    sock.sendall(env_server.encode([]))
+    assert 'JSON object' in reply()['error']
+    sock.sendall(env_server.encode({'op': 'info'}))
+    assert reply()['num_envs'] == 3
+    sock.close()
+
+    async def play():
+        client = await env_client.EnvClient.connect(server.address)
+        assert (await client.info())['num_envs'] == 3
+        await client.close()
+
+    asyncio.run(play())
@@ -0,0 +1,63 @@
+import os
+
+import numpy as np
+import pytest
+
+import episodes
+import observation
+from conftest import py2_only
+
+SPEC = observation.ObservationSpec((20, 20), grayscale=True)
+
+
+def record_and_replay(directory, game, num_actions, max_action, lengths, **kwargs):
+    """
+    Record one episode per length, restarting the game with reset between
+    them, save the log and check that the replayer gives back every step.
+    """
+    rng = np.random.RandomState(6)
+    recorder = episodes.EpisodeRecorder(game, seed=11, render_mode='headless', observation_spec=SPEC, **kwargs)
+    recorded = []
+    for k, length in enumerate(lengths):
+        if k > 0:
+            # a given seed, then one drawn by the recorder
+            recorder.reset(seed=100 + k if k % 2 else None)
+        steps = []
+        for t in range(length):
+            result = recorder.step(list(rng.randint(0, max_action + 1, size=num_actions)))
+            steps.append(([None if state is None else np.array(state) for state in result[0]], repr(result[1:])))
+        recorded.append(steps)
+    path = os.path.join(directory, 'log.npz')
+    recorder.save(path)
+
+    replayer = episodes.EpisodeReplayer(path)
+    assert len(replayer) == len(lengths)
+    assert replayer.seeds == recorder.seeds and replayer.lengths == list(lengths)
+    for index, steps in enumerate(recorded):
+        replayed = list(replayer.episode(index, observation_spec=SPEC))
+        assert len(replayed) == len(steps)
+        for (states, rest), result in zip(steps, replayed):
+            assert rest == repr(result[1:])
+            for state, state_again in zip(states, result[0]):
+                assert (state is None and state_again is None) or np.array_equal(state, state_again)
+
+
+@pytest.mark.parametrize('kwargs', [{}, {'frame_skip': 3}, {'two_players': False, 'frame_skip': 2}])
+def test_pong_replay_reproduces_the_episodes(tmpdir, kwargs):
+    num_actions = 1 if kwargs.get('two_players') is False else 2
+    record_and_replay(str(tmpdir), 'pong', num_actions, 2, [150, 40, 220, 1], **kwargs)
+
+
+@py2_only
+@pytest.mark.parametrize('kwargs', [{}, {'frame_skip': 2}])
+def test_hunter_prey_replay_reproduces_the_episodes(tmpdir, kwargs):
+    record_and_replay(str(tmpdir), 'hunter_prey', 4, 4, [300, 60, 250], num_hunters=6, num_preys=4, **kwargs)
+
+
+def test_replay_refuses_run_arguments(tmpdir):
+    recorder = episodes.EpisodeRecorder('pong', seed=0, render_mode='none')
+    recorder.step([0, 0])
+    path = os.path.join(str(tmpdir), 'log.npz')
+    recorder.save(path)
+    with pytest.raises(ValueError):
+        next(episodes.EpisodeReplayer(path).episode(0, frame_skip=2))
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+import pong
+
+
+def same_state(a, b):
+    return np.array_equal(a.clone_state(), b.clone_state())
+
+
+@pytest.mark.parametrize('two_players', [True, False])
+@pytest.mark.parametrize('frame_skip', [1, 4, 7])
+def test_frame_skip_equals_single_frames(two_players, frame_skip):
+    skipping = pong.Pong(two_players, 'headless', frame_skip=frame_skip, seed=1)
+    single = pong.Pong(two_players, 'headless', seed=1)
+    # the reference never takes the fast path: every frame goes through move
+    plain = pong.Pong(two_players, 'headless', seed=1)
+    plain.fast_forward = lambda action_list, max_frames: 0
+    rng = np.random.RandomState(2)
+    num_actions = 2 if two_players else 1
+    terminals = 0
+    for t in range(300):
+        action_list = list(rng.randint(0, 3, size=num_actions))
+        states, rewards, terminal, scores = skipping.step(action_list)
+        # frame_skip single steps, or fewer when a point ends first
+        for k in range(frame_skip):
+            single_result = single.step(action_list)
+            plain_result = plain.step(action_list)
+            assert same_state(single, plain)
+            if single_result[2]:
+                break
+        assert same_state(skipping, single)
+        assert (rewards, terminal, scores) == tuple(single_result[1:])
+        for state, single_state in zip(states, single_result[0]):
+            assert np.array_equal(state, single_state)
+        terminals += terminal
+    assert terminals > 0
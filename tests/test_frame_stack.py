@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+import frame_stack
+import observation
+import pong
+
+
+def test_first_push_needs_a_state():
+    stack = frame_stack.FrameStack(None, k=4)
+    with pytest.raises(ValueError):
+        stack.push([None, None])
+
+
+def test_stacks_hold_the_last_states():
+    env = pong.Pong(True, 'headless', observation_spec=observation.ObservationSpec((20, 20), True), seed=0)
+    stack = frame_stack.FrameStack(env, k=4)
+    history = []
+    for t in range(60):
+        result = stack.step([t % 3, (t + 1) % 3])
+        history.append([np.array(state) for state in env.render()])
+        if result[2]:
+            break
+        for agent in range(2):
+            expected = [history[max(j, 0)][agent] for j in range(len(history) - 4, len(history))]
+            assert np.array_equal(result[0][agent], np.stack(expected))
@@ -0,0 +1,62 @@
+import sys
+
+import numpy as np
+import pytest
+
+import observation
+import pong
+
+
+def reference(frames, size, grayscale, dtype):
+    """
+    The conversion written out plainly, in float64.
+    """
+    states = frames.astype(np.float64)
+    if grayscale:
+        states = np.dot(states, observation.GRAY_WEIGHTS.astype(np.float64))[..., None]
+    if size is not None:
+        resize_x = observation.area_weights(frames.shape[-3], size[0]).astype(np.float64)
+        resize_y = observation.area_weights(frames.shape[-2], size[1]).astype(np.float64)
+        states = np.einsum('ix,...xyc,jy->...ijc', resize_x, states, resize_y, optimize=True)
+    if grayscale:
+        states = states[..., 0]
+    if dtype == 'uint8':
+        return np.clip(np.rint(states), 0, 255)
+    return states / 255
+
+
+@pytest.mark.parametrize('size', [None, (80, 80), (33, 17), (300, 120)])
+@pytest.mark.parametrize('grayscale', [True, False])
+@pytest.mark.parametrize('dtype', ['uint8', 'float32'])
+def test_process_matches_reference(size, grayscale, dtype):
+    frames = np.random.RandomState(0).randint(0, 256, size=(2, 120, 90, 3)).astype(np.uint8)
+    spec = observation.ObservationSpec(size, grayscale, dtype)
+    expected = reference(frames, size, grayscale, dtype)
+    for k in range(2):
+        states = spec.process(frames)
+        assert states.dtype == spec.dtype and states.shape == (2,) + spec.shape(120, 90)
+        # float32 arithmetic: uint8 states may round the other way at .5
+        assert np.abs(states - expected).max() <= (1 if dtype == 'uint8' else 1e-5)
+        out = np.empty_like(states)
+        assert spec.process(frames, out=out) is out
+        assert np.array_equal(out, states)
+        # the views of player 2 are flipped, non contiguous frames
+        assert np.array_equal(spec.process(np.flip(frames, axis=1)), spec.process(frames[:, ::-1].copy()))
+
+
+@pytest.mark.skipif(sys.version_info < (3, 9), reason='needs tracemalloc.reset_peak')
+def test_step_allocates_only_the_states():
+    import tracemalloc
+    game = pong.Pong(render_mode='headless', observation_spec=observation.ObservationSpec((80, 80), True), seed=0)
+    for t in range(20):
+        game.step([t % 3, 1])
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        start = tracemalloc.get_traced_memory()[0]
+        game.step([0, 1])
+        peak = tracemalloc.get_traced_memory()[1] - start
+    finally:
+        tracemalloc.stop()
+    # two 80x80 uint8 states, no full-frame temporaries
+    assert peak < 64 * 1024
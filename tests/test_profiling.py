@@ -0,0 +1,37 @@
+import sys
+import time
+
+import pytest
+
+import profiling
+
+
+class WallClockOnly:
+    """
+    A time module without perf_counter, as on python 2.
+    """
+    time = staticmethod(time.time)
+
+
+def test_timer_is_monotonic():
+    values = [profiling.timer() for _ in range(1000)]
+    assert values == sorted(values)
+    start = profiling.timer()
+    time.sleep(0.02)
+    assert 0.015 < profiling.timer() - start < 1
+
+
+def test_wall_clock_outside_linux(monkeypatch):
+    monkeypatch.setattr(profiling, 'time', WallClockOnly)
+    monkeypatch.setattr(sys, 'platform', 'freebsd12')
+    assert profiling._monotonic_timer() is WallClockOnly.time
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='CLOCK_MONOTONIC through ctypes is Linux only')
+def test_clock_gettime_on_linux(monkeypatch):
+    monkeypatch.setattr(profiling, 'time', WallClockOnly)
+    timer = profiling._monotonic_timer()
+    assert timer is not WallClockOnly.time
+    start = timer()
+    time.sleep(0.02)
+    assert 0.015 < timer() - start < 1
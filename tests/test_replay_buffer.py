@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+import frame_stack
+import observation
+import pong
+import replay_buffer
+from conftest import py2_only
+
+SPEC = observation.ObservationSpec(size=(20, 20), grayscale=True)
+K = 4
+
+
+def play(env, directory, capacity, num_agents, max_action, steps, num_actions=None):
+    """
+    Play steps steps, adding every row to a ReplayBuffer (reopened from its
+    files halfway) and keeping the stacks FrameStack returned for each row.
+    The agents past num_actions (paddle 2 of single-player Pong) get the
+    action -1.
+    """
+    num_actions = num_agents if num_actions is None else num_actions
+    rng = np.random.RandomState(4)
+    stack = frame_stack.FrameStack(env, k=K)
+    buffer = replay_buffer.ReplayBuffer(directory, capacity, num_agents, k=K, seed=0)
+    stacks = {}
+
+    def push(result):
+        restart_now, restart_next = frame_stack.restarts(result)
+        states = [None if state is None else np.array(state) for state in result[0]]
+        stack.push(states, restart_now)
+        stack.restart |= restart_next
+        return states, stack.stacked().copy()
+
+    states, current = push(list(env.step(list(rng.randint(0, max_action + 1, size=num_actions)))))
+    for t in range(steps):
+        action_list = list(rng.randint(0, max_action + 1, size=num_actions))
+        result = list(env.step(action_list))
+        stacks[buffer.position] = (current, [state is not None for state in states])
+        buffer.add(states, action_list + [-1] * (num_agents - num_actions), result)
+        states, current = push(result)
+        if t == steps // 2:
+            buffer.flush()
+            buffer = replay_buffer.ReplayBuffer(directory, capacity, num_agents, k=K, seed=0)
+    return buffer, stacks
+
+
+def check_stacks(buffer, stacks, num_agents):
+    checked = 0
+    for row, (stacked, valid) in stacks.items():
+        # the oldest rows of a full buffer lost the start of their history
+        if (buffer.position - 1 - row) % buffer.capacity > buffer.capacity - K:
+            continue
+        for agent in range(num_agents):
+            if valid[agent]:
+                rows = np.array([row])
+                agents = np.array([agent])
+                assert np.array_equal(buffer.stacks(rows, agents)[0], stacked[agent])
+                checked += 1
+    assert checked > 0
+
+
+@pytest.mark.parametrize('capacity', [5000, 300])
+def test_pong_stacks_equal_frame_stack(tmpdir, capacity):
+    env = pong.Pong(True, 'headless', observation_spec=SPEC, seed=0)
+    buffer, stacks = play(env, str(tmpdir), capacity, 2, 2, 2000)
+    check_stacks(buffer, stacks, 2)
+
+
+@py2_only
+@pytest.mark.parametrize('capacity', [5000, 333])
+def test_hunter_prey_stacks_equal_frame_stack(tmpdir, capacity):
+    import hunter_prey_2
+    env = hunter_prey_2.HunterPrey(3, 5, 'headless', observation_spec=SPEC, seed=0)
+    buffer, stacks = play(env, str(tmpdir), capacity, 5, 4, 2000)
+    check_stacks(buffer, stacks, 5)
+
+
+def test_single_player_pong_samples_only_player_1(tmpdir):
+    env = pong.Pong(False, 'headless', observation_spec=SPEC, seed=0)
+    buffer, stacks = play(env, str(tmpdir), 1000, 2, 2, 600, num_actions=1)
+    check_stacks(buffer, stacks, 2)
+    states, actions, rewards, next_states, terminals, rows, agents = buffer.sample(256)
+    assert (agents == 0).all()
+    assert (actions >= 0).all()
+    with pytest.raises(ValueError):
+        buffer.sample(8, agent=1)
+
+
+def test_add_needs_one_action_per_agent(tmpdir):
+    buffer = replay_buffer.ReplayBuffer(str(tmpdir), 10, 2)
+    state = np.zeros((4, 4), dtype=np.uint8)
+    with pytest.raises(ValueError):
+        buffer.add([state, state], [0], ([state, state], [0, 0], False, [0, 0]))
+
+
+def test_first_row_needs_a_state(tmpdir):
+    buffer = replay_buffer.ReplayBuffer(str(tmpdir), 10, 2)
+    with pytest.raises(ValueError):
+        buffer.add([None, None], [0, 0], ([None, None], [0, 0], False, [0, 0]))
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+import pong
+from conftest import py2_only
+
+
+def rollout(game, actions):
+    steps = []
+    for action_list in actions:
+        result = game.step(action_list)
+        states = [None if state is None else np.array(state) for state in result[0]]
+        steps.append((states, repr(result[1:])))
+    return steps
+
+
+def check_restore(game, num_actions, max_action):
+    rng = np.random.RandomState(3)
+    for t in range(37):
+        game.step(list(rng.randint(0, max_action + 1, size=num_actions)))
+    snapshot = game.clone_state()
+    actions = [list(rng.randint(0, max_action + 1, size=num_actions)) for t in range(300)]
+    first = rollout(game, actions)
+    end = game.clone_state()
+
+    game.restore_state(snapshot)
+    assert np.array_equal(game.clone_state(), snapshot)
+    second = rollout(game, actions)
+    assert np.array_equal(game.clone_state(), end)
+    for (states, rest), (again, again_rest) in zip(first, second):
+        assert rest == again_rest
+        for state, state_again in zip(states, again):
+            assert (state is None and state_again is None) or np.array_equal(state, state_again)
+
+
+@pytest.mark.parametrize('two_players', [True, False])
+def test_pong_restore_replays_the_game(two_players):
+    game = pong.Pong(two_players, 'headless', seed=0)
+    check_restore(game, 2 if two_players else 1, 2)
+
+
+def test_pong_restore_checks_the_length():
+    game = pong.Pong(render_mode='none', seed=0)
+    with pytest.raises(ValueError):
+        game.restore_state(game.clone_state()[:-1])
+
+
+@py2_only
+@pytest.mark.parametrize('kwargs', [{}, {'frame_skip': 2}, {'observation_type': 'egocentric'}])
+def test_hunter_prey_restore_replays_the_game(kwargs):
+    import hunter_prey_2
+    game = hunter_prey_2.HunterPrey(3, 5, render_mode='headless', seed=0, **kwargs)
+    check_restore(game, 5, 4)
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+import observation
+import pong
+from conftest import py2_only
+
+GRAY_80 = observation.ObservationSpec((80, 80), grayscale=True)
+
+
+def check_step_into(make, num_actions, max_action, steps=500):
+    game = make()
+    twin = make()
+    out = twin.output_arrays()
+    rng = np.random.RandomState(1)
+    for t in range(steps):
+        action_list = list(rng.randint(0, max_action + 1, size=num_actions))
+        result = game.step(action_list)
+        # every other step in the arrays kept by the game
+        into = twin.step_into(action_list, out if t % 2 else None)
+        for expected, value in zip(result[1:], into[1:]):
+            assert np.array_equal(np.broadcast_to(np.asarray(expected, dtype=float), np.shape(value)), value)
+        if into[0] is None:
+            assert all(state is None for state in result[0])
+            continue
+        for state, value in zip(result[0], into[0]):
+            if state is None:
+                assert not value.any() # dead prey
+            else:
+                assert value.dtype == np.asarray(state).dtype
+                assert np.array_equal(value, state)
+    assert np.array_equal(game.clone_state(), twin.clone_state())
+
+
+@pytest.mark.parametrize('kwargs', [
+    {},
+    {'observation_spec': GRAY_80},
+    {'observation_type': 'vector'},
+    {'two_players': False, 'frame_skip': 3},
+    {'render_mode': 'none'},
+])
+def test_pong_step_into_equals_step(kwargs):
+    kwargs = dict({'render_mode': 'headless'}, **kwargs)
+    num_actions = 2 if kwargs.get('two_players', True) else 1
+    check_step_into(lambda: pong.Pong(seed=7, **kwargs), num_actions, 2)
+
+
+@py2_only
+@pytest.mark.parametrize('kwargs', [
+    {},
+    {'observation_spec': GRAY_80, 'frame_skip': 2},
+    {'observation_type': 'vector'},
+    {'observation_type': 'egocentric'},
+    {'render_mode': 'none'},
+])
+def test_hunter_prey_step_into_equals_step(kwargs):
+    import hunter_prey_2
+    kwargs = dict({'render_mode': 'headless'}, **kwargs)
+    check_step_into(lambda: hunter_prey_2.HunterPrey(3, 4, seed=7, **kwargs), 4, 4)
+
+
+def test_reset_with_a_seed_restarts_the_game():
+    game = pong.Pong(render_mode='headless', seed=1)
+    for t in range(50):
+        game.step([t % 3, 1])
+    game.reset(seed=5)
+    assert np.array_equal(game.clone_state(), pong.Pong(render_mode='headless', seed=5).clone_state())
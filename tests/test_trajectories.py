@@ -0,0 +1,95 @@
+import threading
+
+import numpy as np
+import pytest
+
+import observation
+import pong
+import trajectories
+from conftest import py2_only
+
+SPEC = observation.ObservationSpec((20, 20), grayscale=True)
+
+
+def record(env, directory, num_actions, max_action, steps, shard_size):
+    """
+    Play steps steps, push every step into a TrajectoryWriter and return
+    what was pushed.
+    """
+    rng = np.random.RandomState(2)
+    pushed = []
+    with trajectories.TrajectoryWriter(directory, shard_size=shard_size) as writer:
+        for t in range(steps):
+            action_list = list(rng.randint(0, max_action + 1, size=num_actions))
+            result = env.step(action_list)
+            isalive = result[3] if len(result) == 6 else None
+            scores = result[4] if len(result) == 6 else result[3]
+            writer.push(result[0], action_list, result[1], result[2], isalive, scores)
+            pushed.append(([None if state is None else np.array(state) for state in result[0]],
+                           action_list, list(result[1]), result[2], isalive, scores))
+    return pushed
+
+
+def check_dataset(directory, pushed, shard_size):
+    reader = trajectories.TrajectoryReader(directory)
+    index = reader.read_index()
+    assert [shard['count'] for shard in index][:-1] == [shard_size] * (len(index) - 1)
+    assert 0 < index[-1]['count'] <= shard_size
+    assert len(reader) == len(pushed)
+    steps = list(reader)
+    assert len(steps) == len(pushed)
+    for step, (states, action_list, rewards, terminals, isalive, scores) in zip(steps, pushed):
+        num_agents = len(states)
+        for i, state in enumerate(states):
+            assert step['has_state'][i] == (state is not None)
+            if state is None:
+                assert not step['states'][i].any()
+            else:
+                assert np.array_equal(step['states'][i], state)
+        # the agents without an action (single-player Pong) read -1
+        assert list(step['actions']) == action_list + [-1] * (num_agents - len(action_list))
+        assert list(step['rewards']) == list(np.float32(rewards))
+        assert list(step['terminals']) == list(np.broadcast_to(terminals, (num_agents,)))
+        assert list(step['isalive']) == ([True] * num_agents if isalive is None else list(isalive))
+        assert list(step['scores']) == list(np.atleast_1d(scores))
+
+
+@pytest.mark.parametrize('two_players', [True, False])
+def test_pong_round_trip(tmpdir, two_players):
+    env = pong.Pong(two_players, 'headless', observation_spec=SPEC, seed=0)
+    # 250 steps in shards of 60: the last shard is partial
+    pushed = record(env, str(tmpdir), 2 if two_players else 1, 2, 250, 60)
+    check_dataset(str(tmpdir), pushed, 60)
+
+
+@py2_only
+def test_hunter_prey_round_trip_with_dead_preys(tmpdir):
+    import hunter_prey_2
+    env = hunter_prey_2.HunterPrey(6, 4, 'headless', observation_spec=SPEC, seed=0)
+    pushed = record(env, str(tmpdir), 4, 4, 500, 64)
+    assert any(state is None for step in pushed for state in step[0])
+    check_dataset(str(tmpdir), pushed, 64)
+
+
+def test_too_many_actions(tmpdir):
+    with trajectories.TrajectoryWriter(str(tmpdir)) as writer:
+        with pytest.raises(ValueError):
+            writer.push([None], [0, 1], [0.0], False)
+
+
+def test_full_queue_drops_without_blocking(tmpdir):
+    writer = trajectories.TrajectoryWriter(str(tmpdir), shard_size=1, max_queue=2)
+    # hold the thread in its first write: at most one record out of the queue and two in it
+    gate = threading.Event()
+    write = writer._write
+    writer._write = lambda records: (gate.wait(), write(records))
+    kept = []
+    for t in range(6):
+        if writer.push([np.full(3, t, dtype=np.uint8)], [t], [0.0], False, block=False):
+            kept.append(t)
+    assert writer.dropped == 6 - len(kept) >= 3
+    gate.set()
+    writer.close()
+    steps = list(trajectories.TrajectoryReader(str(tmpdir)))
+    assert [int(step['actions'][0]) for step in steps] == kept
+    assert [int(step['states'][0][0]) for step in steps] == kept
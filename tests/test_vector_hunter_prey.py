@@ -0,0 +1,68 @@
+import numpy as np
+
+from conftest import py2_only
+
+pytestmark = py2_only
+
+
+class BonusTestRandom(np.random.RandomState):
+    """
+    HunterPrey draws random_sample() for a bonus test that always passes,
+    which VectorHunterPrey skips. Answer that draw without using the stream,
+    so that both games read the same numbers.
+    """
+    def random_sample(self, size=None):
+        if size is None:
+            return 0.0
+        return np.random.RandomState.random_sample(self, size)
+
+
+def copy_game(game, vector):
+    # the resets draw in a different order, so a new game starts from the state of HunterPrey
+    vector.hunter_x[0] = [hunter['x'] for hunter in game.hunter_list]
+    vector.hunter_y[0] = [hunter['y'] for hunter in game.hunter_list]
+    vector.prey_x[0] = [prey['x'] for prey in game.prey_list]
+    vector.prey_y[0] = [prey['y'] for prey in game.prey_list]
+    vector.isalive[0] = game.isalive
+    vector.nearest_prey_list[0] = game.nearest_prey_list
+    vector.continous_moving_step[0] = game.continous_moving_step
+    vector.num_bonus[0] = len(game.bonus_list)
+    for j, bonus in enumerate(game.bonus_list):
+        vector.bonus_x[0, j] = bonus['x']
+        vector.bonus_y[0, j] = bonus['y']
+    vector.total_score[0] = game.total_score
+    vector.rng.set_state(game.rng.get_state())
+
+
+def test_step_matches_hunter_prey():
+    import hunter_prey_2
+    import vector_hunter_prey
+    num_hunters, num_preys = 3, 4
+    game = hunter_prey_2.HunterPrey(num_hunters, num_preys, render_mode='headless', seed=5)
+    state = game.rng.get_state()
+    game.rng = BonusTestRandom()
+    game.rng.set_state(state)
+    vector = vector_hunter_prey.VectorHunterPrey(1, num_hunters, num_preys, seed=0)
+    copy_game(game, vector)
+    rng = np.random.RandomState(0)
+    kills = overs = 0
+    for t in range(2000):
+        actions = rng.randint(0, 5, size=(1, num_preys))
+        states, rewards, terminals, isalive, total_score, over = game.step(list(actions[0]))
+        vector_rewards, vector_terminals, vector_isalive, vector_score, vector_over = vector.step(actions)
+        assert rewards == list(vector_rewards[0])
+        assert terminals == list(vector_terminals[0])
+        assert isalive == list(vector_isalive[0])
+        assert total_score == vector_score[0]
+        assert over == vector_over[0]
+        if over:
+            overs += 1
+            copy_game(game, vector)
+        frames = vector.render()
+        for i, state in enumerate(states):
+            if state is None:
+                assert not vector.isalive[0, i]
+            else:
+                assert np.array_equal(state, frames[0, i])
+        kills += sum(terminals)
+    assert kills > 0 and overs > 0
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+import pong
+import vector_pong
+
+BALL = ('ball_X', 'ball_Y', 'ball_vel_X', 'ball_vel_Y')
+
+
+def copy_ball(vector, k, game):
+    # the serves draw from different generators, so a new point starts from the ball of the vector game
+    for name in BALL:
+        setattr(game, name, getattr(vector, name)[k].item())
+
+
+def test_step_matches_pong():
+    num_envs = 3
+    vector = vector_pong.VectorPong(num_envs, seed=0)
+    games = [pong.Pong(render_mode='headless', seed=k) for k in range(num_envs)]
+    for k, game in enumerate(games):
+        for name in ('pad1_Y', 'pad2_Y') + BALL:
+            setattr(game, name, getattr(vector, name)[k].item())
+    out = np.zeros((num_envs, 2, vector_pong.SCREENWIDTH, vector_pong.SCREENHEIGHT, 3), dtype=np.uint8)
+    rng = np.random.RandomState(1)
+    terminals = 0
+    for t in range(1500):
+        actions = rng.randint(0, 3, size=(num_envs, 2))
+        rewards, terminal, scores = vector.step(actions, out=out)
+        for k, game in enumerate(games):
+            states, game_rewards, game_terminal, game_scores = game.step(list(actions[k]))
+            assert game_terminal == terminal[k]
+            assert game_rewards == list(rewards[k])
+            assert game_scores == list(scores[k])
+            # out holds the frame that ended the point, as Pong.step returns it
+            assert np.array_equal(out[k, 0], states[0])
+            assert np.array_equal(out[k, 1], states[1])
+            if game_terminal:
+                terminals += 1
+                copy_ball(vector, k, game)
+    assert terminals > 0
+
+
+def test_render_after_step_shows_the_new_point():
+    vector = vector_pong.VectorPong(1, seed=0)
+    out = np.zeros((1, 2, vector_pong.SCREENWIDTH, vector_pong.SCREENHEIGHT, 3), dtype=np.uint8)
+    for t in range(1000):
+        terminal = vector.step(np.zeros((1, 2), dtype=int), out=out)[1]
+        if terminal[0]:
+            break
+    assert terminal[0]
+    assert not np.array_equal(vector.render(), out)
+
+
+def test_step_checks_actions():
+    vector = vector_pong.VectorPong(2)
+    with pytest.raises(ValueError):
+        vector.step(np.zeros((2, 1), dtype=int))
+    with pytest.raises(ValueError):
+        vector.step(np.full((2, 2), 3))
@@ -0,0 +1,232 @@
+"""
+This script builds the 'TrajectoryWriter' class, which saves what the games
+return at every step into a dataset on disk without slowing down the loop
+that steps them, and the 'TrajectoryReader' class, which streams it back.
+
+push copies the record of a step (states, actions, rewards, terminals,
+isalive, scores) and puts it in a bounded queue. A background thread takes
+the records out of the queue, gathers them into shards of shard_size steps
+and writes each shard as an .npz file, compressed unless compress is False
+(zlib and the file writes release the GIL, so on a machine with several
+cores the game keeps running meanwhile). When the thread falls behind by
+max_queue records, push blocks until there is room again, or drops the
+record if it was called with block=False.
+
+A dataset is a directory holding the shards and index.json, the list of the
+shards in order, each as {'file', 'first' (index of its first step), 'count'}.
+The index is only updated once a shard is completely written, so a reader
+never sees a partial shard. A shard holds, for its count steps:
+    states: (count, num_agents) + state shape, zeros where there was no state.
+    has_state: boolean, (count, num_agents).
+    actions: int64, (count, num_agents), -1 for the agents that did not
+    choose an action (the automatic paddle of single-player Pong).
+    rewards: float32, (count, num_agents).
+    terminals: boolean, (count, num_agents).
+    isalive: boolean, (count, num_agents).
+    scores: float64, (count, number of scores).
+The states are left out when no step of the shard had any.
+"""
+
+import json
+import os
+import threading
+
+try:
+    import queue
+except ImportError: # python 2
+    import Queue as queue
+
+import numpy as np
+
+
+class TrajectoryWriter:
+    def __init__(self, directory, shard_size=1000, max_queue=256, compress=True):
+        """
+        Arguments:
+            directory: path of the dataset, created if needed. It must not
+            already hold a dataset.
+            shard_size: int, number of steps per shard.
+            max_queue: int, number of records waiting to be written after
+            which push blocks (or drops).
+            compress: boolean, if False the shards are written uncompressed,
+            which takes much less CPU time and more disk space.
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        if os.path.exists(os.path.join(directory, 'index.json')):
+            raise ValueError(directory + ' already holds a dataset')
+        self.directory = directory
+        self.shard_size = int(shard_size)
+        self.compress = compress
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.index = []
+        self.num_steps = 0 # steps written to the shards
+        self.dropped = 0   # records dropped by push(block=False)
+        self.error = None  # exception raised in the thread, raised again by push and close
+        self.closed = False
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def push(self, states, actions, rewards, terminals, isalive=None, scores=None, block=True):
+        """
+        Add the record of one step. The arguments are copied, so the states
+        may be views that the game overwrites at its next step.
+
+        Arguments:
+            states: sequence with one state (array) or None per agent.
+            actions: sequence with one action per agent that chose one, as
+            given to step. Single-player Pong has one action for two
+            states: the missing actions are stored as -1.
+            rewards: sequence with one value per agent.
+            terminals: a boolean for all agents (Pong) or one per agent.
+            isalive: sequence of booleans per agent, or None for all alive.
+            scores: a number or a sequence of numbers, or None.
+            block: boolean, if False the record is dropped (and counted in
+            dropped) instead of waiting when the queue is full.
+        Return:
+            boolean, False if the record was dropped.
+        """
+        if self.error is not None:
+            raise self.error
+        if self.closed:
+            raise ValueError('push after close')
+        num_agents = len(states)
+        chosen = np.array(actions, dtype=np.int64).reshape(-1)
+        if len(chosen) > num_agents:
+            raise ValueError('number of actions > number of states')
+        padded = np.full(num_agents, -1, dtype=np.int64)
+        padded[:len(chosen)] = chosen
+        record = ([None if state is None else np.array(state) for state in states],
+                  padded,
+                  np.array(rewards, dtype=np.float32).reshape(num_agents),
+                  np.broadcast_to(np.array(terminals, dtype=bool), (num_agents,)),
+                  np.ones(num_agents, dtype=bool) if isalive is None else np.array(isalive, dtype=bool),
+                  np.atleast_1d(np.array([] if scores is None else scores, dtype=np.float64)))
+        try:
+            self.queue.put(record, block=block)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def close(self):
+        """
+        Write the records still queued, the last (partial) shard and the
+        index, then stop the thread.
+        """
+        if not self.closed:
+            self.closed = True
+            self.queue.put(None)
+            self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _run(self):
+        """
+        Main loop of the thread: gather the records into shards and write
+        them, until close puts None in the queue.
+        """
+        records = []
+        while True:
+            record = self.queue.get()
+            if record is not None and self.error is None:
+                records.append(record)
+            if len(records) == self.shard_size or (record is None and records):
+                try:
+                    self._write(records)
+                except Exception as error:
+                    self.error = error
+                records = []
+            if record is None:
+                return
+
+    def _write(self, records):
+        """
+        Write one shard and add it to the index.
+        """
+        states, actions, rewards, terminals, isalive, scores = zip(*records)
+        arrays = {'actions': np.stack(actions), 'rewards': np.stack(rewards), 'terminals': np.stack(terminals),
+                  'isalive': np.stack(isalive), 'scores': np.stack(scores)}
+        has_state = np.array([[state is not None for state in step] for step in states], dtype=bool)
+        arrays['has_state'] = has_state
+        if has_state.any():
+            first = next(state for step in states for state in step if state is not None)
+            frames = np.zeros(has_state.shape + first.shape, dtype=first.dtype)
+            for t, step in enumerate(states):
+                for i, state in enumerate(step):
+                    if state is not None:
+                        frames[t, i] = state
+            arrays['states'] = frames
+
+        name = 'shard_%06d.npz' % len(self.index)
+        path = os.path.join(self.directory, name)
+        with open(path + '.tmp', 'wb') as f:
+            (np.savez_compressed if self.compress else np.savez)(f, **arrays)
+        os.rename(path + '.tmp', path)
+        self.index.append({'file': name, 'first': self.num_steps, 'count': len(records)})
+        self.num_steps += len(records)
+        # the new index replaces the old one at once, readers see either of them
+        index_path = os.path.join(self.directory, 'index.json')
+        with open(index_path + '.tmp', 'w') as f:
+            json.dump(self.index, f)
+        os.rename(index_path + '.tmp', index_path)
+
+
+class TrajectoryReader:
+    def __init__(self, directory):
+        """
+        Arguments:
+            directory: path of a dataset written by a TrajectoryWriter,
+            possibly still being written.
+        """
+        self.directory = directory
+
+    def read_index(self):
+        """
+        Return the list of the shards written so far, see the index format
+        above.
+        """
+        path = os.path.join(self.directory, 'index.json')
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            return json.load(f)
+
+    def __len__(self):
+        return sum(shard['count'] for shard in self.read_index())
+
+    def load_shard(self, shard):
+        """
+        Return the arrays of a shard (an entry of the index) as a dict.
+        """
+        with np.load(os.path.join(self.directory, shard['file'])) as data:
+            return dict((name, data[name]) for name in data.files)
+
+    def shards(self, start=0):
+        """
+        Yield the arrays of the shards one at a time, from shard start, as
+        dicts. Shards written while iterating are yielded too.
+        """
+        k = start
+        while True:
+            index = self.read_index()
+            if k >= len(index):
+                return
+            yield self.load_shard(index[k])
+            k += 1
+
+    def __iter__(self):
+        """
+        Yield the steps one at a time, as dicts with the same keys as the
+        shards, only one shard being in memory at a time.
+        """
+        for shard in self.shards():
+            for t in range(len(shard['actions'])):
+                yield dict((name, array[t]) for name, array in shard.items())
@@ -0,0 +1,204 @@
+"""
+This script builds the 'VectorHunterPrey' class, a batched version of 'HunterPrey'
+that advances num_envs games at once. Instead of a list of dicts per game, every
+entity is stored as a struct of arrays:
+
+    hunter_x, hunter_y: int arrays of shape (num_envs, num_hunters)
+    prey_x, prey_y, isalive: arrays of shape (num_envs, num_preys)
+    nearest_prey_list, continous_moving_step: int arrays of shape (num_envs, num_hunters)
+    bonus_x, bonus_y: int arrays of shape (num_envs, MAX_BONUS), the first
+    num_bonus[k] entries of row k are the bonuses of game k, oldest first.
+
+Prey movement, the hunters' scripted policy (hunter_prey_2.hunter_actions),
+hunter movement, clamping, kills and bonus pickup are array operations over all
+games. A game whose preys are all killed is reset in place.
+
+VectorHunterPrey.render draws the states of all preys of all games at once
+with the rasterizer, without going through pygame.
+"""
+
+import numpy as np
+
+import rasterizer
+from hunter_prey_2 import SCREENWIDTH, SCREENHEIGHT, REWARD, BONUS, PENALTY, HUNTER_SPEED, \
+    PREY_SPEED, HUNTER_WIDTH, HUNTER_HEIGHT, PREY_WIDTH, PREY_HEIGHT, BONUS_SIZE, MAX_BONUS, \
+    SPRITES, hunter_actions
+
+# moves along x and y for actions 0: left, 1: up, 2: right, 3: down, 4: don't move
+ACTION_DX = np.array([-1, 0, 1, 0, 0])
+ACTION_DY = np.array([0, -1, 0, 1, 0])
+
+
+class VectorHunterPrey:
+    def __init__(self, num_envs, num_hunters, num_preys, seed=None):
+        """
+        Arguments:
+            num_envs: int, number of games simulated together.
+            num_hunters: int, number of hunters in each game.
+            num_preys: int, number of preys in each game.
+            seed: int or None, seed of the random generator of this instance.
+        """
+        self.num_envs = num_envs
+        self.num_hunters = num_hunters
+        self.num_preys = num_preys
+        self.rng = np.random.RandomState(seed)
+
+        self.hunter_x = np.zeros((num_envs, num_hunters), dtype=np.int64)
+        self.hunter_y = np.zeros((num_envs, num_hunters), dtype=np.int64)
+        self.prey_x = np.zeros((num_envs, num_preys), dtype=np.int64)
+        self.prey_y = np.zeros((num_envs, num_preys), dtype=np.int64)
+        self.isalive = np.zeros((num_envs, num_preys), dtype=bool)
+        self.nearest_prey_list = np.zeros((num_envs, num_hunters), dtype=np.int64)
+        self.continous_moving_step = np.zeros((num_envs, num_hunters), dtype=np.int64)
+        self.bonus_x = np.zeros((num_envs, MAX_BONUS), dtype=np.int64)
+        self.bonus_y = np.zeros((num_envs, MAX_BONUS), dtype=np.int64)
+        self.num_bonus = np.zeros(num_envs, dtype=np.int64)
+        self.total_score = np.zeros(num_envs)
+
+        self.reset()
+
+    def reset(self, mask=None):
+        """
+        Start a new game in the selected environments, the same way
+        HunterPrey.__init__ does.
+
+        Argument:
+            mask: boolean array of shape (num_envs,), or None for all games.
+        """
+        if mask is None:
+            mask = np.ones(self.num_envs, dtype=bool)
+        n = int(np.count_nonzero(mask))
+        if n == 0:
+            return
+        rng = self.rng
+        self.hunter_x[mask] = rng.randint(0, int(SCREENWIDTH - HUNTER_WIDTH) + 1, size=(n, self.num_hunters))
+        self.hunter_y[mask] = rng.randint(0, int(SCREENHEIGHT - HUNTER_HEIGHT) + 1, size=(n, self.num_hunters))
+        self.prey_x[mask] = rng.randint(0, int(SCREENWIDTH - PREY_WIDTH) + 1, size=(n, self.num_preys))
+        self.prey_y[mask] = rng.randint(0, int(SCREENHEIGHT - PREY_HEIGHT) + 1, size=(n, self.num_preys))
+        self.isalive[mask] = True
+        self.total_score[mask] = 0
+        self.nearest_prey_list[mask] = rng.randint(0, self.num_preys, size=(n, self.num_hunters))
+        self.continous_moving_step[mask] = rng.randint(7, 13, size=(n, self.num_hunters))
+        self.num_bonus[mask] = 0
+
+    def step(self, actions):
+        """
+        Advance every game by one frame.
+
+        Argument:
+            actions: int array of shape (num_envs, num_preys), each action is
+            an int from 0 to 4.
+            0: left, 1: up, 2: right, 3: down, 4: don't move
+        Return:
+            rewards: float array of shape (num_envs, num_preys).
+            terminals: boolean array of shape (num_envs, num_preys), True for
+            the preys killed in this frame.
+            isalive: boolean array of shape (num_envs, num_preys), before reset.
+            total_score: float array of shape (num_envs,), before reset.
+            over: boolean array of shape (num_envs,). True if all preys of
+            that game are killed, in which case the game is reset.
+        """
+        actions = np.asarray(actions)
+        if actions.shape != (self.num_envs, self.num_preys):
+            raise ValueError('actions must have shape ' + str((self.num_envs, self.num_preys)))
+        if actions.max() > 4 or actions.min() < 0:
+            raise ValueError('action index must be int from 0 to 4!!')
+        rng = self.rng
+        rows = np.arange(self.num_envs)
+
+        # append bonus
+        add = self.num_bonus <= 1
+        n = int(np.count_nonzero(add))
+        slot = self.num_bonus[add]
+        self.bonus_x[rows[add], slot] = rng.randint(0, int(SCREENWIDTH - BONUS_SIZE) + 1, size=n)
+        self.bonus_y[rows[add], slot] = rng.randint(0, int(SCREENHEIGHT - BONUS_SIZE) + 1, size=n)
+        self.num_bonus[add] += 1
+
+        # preys' movement
+        alive = self.isalive
+        self.prey_x = np.where(alive, np.clip(self.prey_x + ACTION_DX[actions] * PREY_SPEED,
+                                              0, int(SCREENWIDTH - PREY_WIDTH)), self.prey_x)
+        self.prey_y = np.where(alive, np.clip(self.prey_y + ACTION_DY[actions] * PREY_SPEED,
+                                              0, int(SCREENHEIGHT - PREY_HEIGHT)), self.prey_y)
+
+        # HUNTERs' movement (Move towards the direction of the NEAREST prey)
+        hunter_action = hunter_actions(rng, self.hunter_x, self.hunter_y, self.prey_x, self.prey_y, alive,
+                                       self.nearest_prey_list, self.continous_moving_step)
+        self.hunter_x = np.clip(self.hunter_x + ACTION_DX[hunter_action] * HUNTER_SPEED,
+                                0, int(SCREENWIDTH - HUNTER_WIDTH))
+        self.hunter_y = np.clip(self.hunter_y + ACTION_DY[hunter_action] * HUNTER_SPEED,
+                                0, int(SCREENHEIGHT - HUNTER_HEIGHT))
+
+        # Check if any hunter kill any prey, and then assign rewards.
+        dist2 = (self.hunter_x[:, :, None] - self.prey_x[:, None, :]) ** 2 + \
+                (self.hunter_y[:, :, None] - self.prey_y[:, None, :]) ** 2
+        killed = alive & (dist2 < ((HUNTER_HEIGHT + PREY_HEIGHT)/2) ** 2).any(axis=1)
+        rewards = np.where(alive, np.where(killed, PENALTY, REWARD), 0.0)
+        terminals = killed
+        self.isalive = alive & ~killed
+
+        # bonus pickup, each living prey takes the first bonus it touches
+        for i in range(self.num_preys):
+            near = (self.bonus_x - self.prey_x[:, i:i + 1]) ** 2 + (self.bonus_y - self.prey_y[:, i:i + 1]) ** 2 \
+                   <= ((BONUS_SIZE + PREY_HEIGHT)/2) ** 2
+            near &= np.arange(MAX_BONUS) < self.num_bonus[:, None]
+            near &= self.isalive[:, i:i + 1]
+            taken = near.any(axis=1)
+            if not taken.any():
+                continue
+            rewards[taken, i] += BONUS
+            self.total_score[taken] += BONUS
+            # remove the taken bonus and keep the others in order
+            first = taken & near[:, 0]
+            self.bonus_x[first, 0] = self.bonus_x[first, 1]
+            self.bonus_y[first, 0] = self.bonus_y[first, 1]
+            self.num_bonus[taken] -= 1
+
+        total_score = self.total_score.copy()
+        isalive = self.isalive
+        # Check if terminal. If there is no prey alive, then over=True, and initialize the game.
+        over = ~isalive.any(axis=1)
+        self.isalive = isalive.copy()
+        self.total_score[~over] += 1
+        self.reset(over)
+
+        return rewards, terminals, isalive, total_score, over
+
+    def render(self, out=None):
+        """
+        Draw the state of each prey of every game, the same images that
+        HunterPrey.render returns: the prey itself is drawn with 'prey_self'
+        and the other living preys with 'prey_other'.
+
+        Argument:
+            out: C-contiguous uint8 array of shape
+            (num_envs, num_preys, SCREENWIDTH, SCREENHEIGHT, 3) to draw into,
+            or None to allocate a new one.
+        Return:
+            out, where out[k, i] is the state of prey i in game k.
+        """
+        shape = (self.num_envs, self.num_preys, SCREENWIDTH, SCREENHEIGHT, 3)
+        if out is None:
+            out = np.empty(shape, dtype=np.uint8)
+        elif out.shape != shape or not out.flags['C_CONTIGUOUS']:
+            raise ValueError('out must be a C-contiguous array of shape ' + str(shape))
+        # all views of all games as a single batch
+        views = out.reshape((-1, SCREENWIDTH, SCREENHEIGHT, 3))
+        agent = np.tile(np.arange(self.num_preys), self.num_envs)
+
+        def per_view(values):
+            return np.repeat(values, self.num_preys)
+
+        rasterizer.fill(out, SPRITES['background'])
+        for i in range(self.num_hunters):
+            rasterizer.blit_many(views, SPRITES['hunter'], per_view(self.hunter_x[:, i]), per_view(self.hunter_y[:, i]))
+        for i in range(MAX_BONUS):
+            rasterizer.blit_many(views, SPRITES['bonus'], per_view(self.bonus_x[:, i]), per_view(self.bonus_y[:, i]),
+                                 mask=per_view(self.num_bonus > i))
+        for j in range(self.num_preys):
+            # Other preys are grey, the prey itself is black
+            rasterizer.blit_many(views, SPRITES['prey_other'], per_view(self.prey_x[:, j]), per_view(self.prey_y[:, j]),
+                                 mask=per_view(self.isalive[:, j]) & (agent != j))
+            rasterizer.blit_many(out[:, j], SPRITES['prey_self'], self.prey_x[:, j], self.prey_y[:, j],
+                                 mask=self.isalive[:, j])
+        return out
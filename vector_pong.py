@@ -0,0 +1,277 @@
+"""
+This script builds the 'VectorPong' class, a batched version of 'Pong' that
+advances num_envs games at once. All paddle, ball and score state is kept in
+NumPy arrays of length num_envs, and every rule of Pong.step (paddle movement,
+automatic paddle, wall bounce, paddle collision and scoring) is applied to all
+games with masked array operations. Finished games are reset in place.
+
+VectorPong.render draws the states of all players of all games at once with
+the rasterizer, without going through pygame. Since step resets the finished
+games before returning, render called after step shows the new point of
+these games, where Pong.step returns the frame that ended the point. Pass
+out to step to get the frames Pong.step returns: they are drawn before the
+reset.
+"""
+
+import numpy as np
+
+import rasterizer
+from pong import SCREENWIDTH, SCREENHEIGHT, REWARD, PENALTY, PAD_SPEED_1, PAD_SPEED_2, \
+    BALL_SPEED_X, BALL_SPEED_Y_LIMIT, BALL_SPEED_X_LIMIT, AUTOMOVE_RANDOM_FLIP_RATE, \
+    PAD_WIDTH, PAD_HEIGHT, BALL_SIZE, SPRITES
+
+# Pong's arithmetic follows the interpreter's '/' (floor division of ints on
+# Python 2, true division on Python 3). The state arrays use the matching dtype
+# so that VectorPong reproduces Pong.step exactly.
+DTYPE = np.float64 if 1 / 2 else np.int64
+
+MAX_SCORE = 210 # both scores are cleared once one of them reaches MAX_SCORE
+
+# player 2 sees the screen flipped left-right, its view is drawn with mirrored sprites
+MIRRORED = dict((name, rasterizer.mirror(sprite)) for name, sprite in SPRITES.items())
+
+
+class VectorPong:
+    def __init__(self, num_envs, two_players=True, seed=None):
+        """
+        Arguments:
+            num_envs: int, number of games simulated together.
+            two_players: boolean, if False paddle 2 is moved automatically
+            as in Pong(two_players=False).
+            seed: int or None, seed of the random generator of this instance.
+        """
+        self.num_envs = num_envs
+        self.two_players = two_players
+        self.num_players = 2 if two_players else 1
+        self.rng = np.random.RandomState(seed)
+
+        # paddle positions
+        self.pad1_X = 10                  # right side of paddle 1
+        self.pad2_X = SCREENWIDTH - 10     # left side of paddle 2
+        self.pad1_Y = np.zeros(num_envs, dtype=DTYPE)
+        self.pad2_Y = np.zeros(num_envs, dtype=DTYPE)
+        # paddle speed
+        self.pad1_vel = np.zeros(num_envs, dtype=DTYPE)
+        self.pad2_vel = np.zeros(num_envs, dtype=DTYPE)
+        # ball position and speed
+        self.ball_X = np.zeros(num_envs, dtype=DTYPE)
+        self.ball_Y = np.zeros(num_envs, dtype=DTYPE)
+        self.ball_vel_X = np.zeros(num_envs, dtype=DTYPE)
+        self.ball_vel_Y = np.zeros(num_envs, dtype=DTYPE)
+
+        self.at_wall = np.zeros(num_envs, dtype=bool)
+        self.at_paddle = np.zeros(num_envs, dtype=bool)
+        self.total_score_1 = np.zeros(num_envs)
+        self.total_score_2 = np.zeros(num_envs)
+
+        self.reset()
+
+    def reset(self, mask=None):
+        """
+        Start a new game in the selected environments, the same way Pong.__init__
+        does. Scores are cleared and paddles are centered.
+
+        Argument:
+            mask: boolean array of shape (num_envs,), or None for all games.
+        """
+        if mask is None:
+            mask = np.ones(self.num_envs, dtype=bool)
+        self.pad1_Y[mask] = SCREENHEIGHT / 2
+        self.pad2_Y[mask] = SCREENWIDTH / 2
+        self.total_score_1[mask] = 0
+        self.total_score_2[mask] = 0
+        self._serve(mask)
+
+    def _serve(self, mask):
+        """
+        Put the ball back in the middle with a random direction and stop the
+        paddles in the selected environments.
+        """
+        n = int(np.count_nonzero(mask))
+        if n == 0:
+            return
+        right = self.rng.random_sample(n) < 0.5
+        self.ball_X[mask] = np.where(right, SCREENWIDTH * 3 / 4, SCREENWIDTH * 1 / 4)
+        self.ball_vel_X[mask] = np.where(right, -BALL_SPEED_X, BALL_SPEED_X)
+        self.ball_Y[mask] = SCREENHEIGHT / 2
+        self.ball_vel_Y[mask] = self.rng.randint(-int(BALL_SPEED_X * 1/3), int(BALL_SPEED_X * 1/3) + 1, size=n)
+        self.pad1_vel[mask] = 0
+        self.pad2_vel[mask] = 0
+        self.at_wall[mask] = False
+        self.at_paddle[mask] = False
+
+    def step(self, actions, out=None):
+        """
+        Advance every game by one frame.
+
+        Arguments:
+            actions: int array of shape (num_envs, 2), or (num_envs, 1) if
+            two_players is False. 0: Not move, 1: move up, 2: move down
+            out: None, or an array for render, to draw the states into before
+            the finished games are reset, as Pong.step does.
+        Return:
+            rewards: float array of shape (num_envs, 2).
+            terminals: boolean array of shape (num_envs,). Games that
+            terminate are reset before returning.
+            scores: float array of shape (num_envs, 2).
+        """
+        actions = np.asarray(actions)
+        if actions.shape != (self.num_envs, self.num_players):
+            raise ValueError('actions must have shape ' + str((self.num_envs, self.num_players)))
+        if actions.max() > 2 or actions.min() < 0:
+            raise ValueError('action index must be int from 0 to 2!!')
+
+        pad_low = PAD_HEIGHT / 2
+        pad_high = SCREENHEIGHT - PAD_HEIGHT / 2
+
+        # paddles' movements
+        self.pad1_vel = np.where(actions[:, 0] == 1, -PAD_SPEED_1,
+                                 np.where(actions[:, 0] == 2, PAD_SPEED_1, 0)).astype(DTYPE)
+        self.pad1_Y = np.maximum(np.minimum(self.pad1_Y + self.pad1_vel, pad_high), pad_low)
+
+        if self.two_players:
+            self.pad2_vel = np.where(actions[:, 1] == 1, -PAD_SPEED_2,
+                                     np.where(actions[:, 1] == 2, PAD_SPEED_2, 0)).astype(DTYPE)
+            self.pad2_Y = np.maximum(np.minimum(self.pad2_Y + self.pad2_vel, pad_high), pad_low)
+        else: #Automatic move
+            follow = (self.ball_vel_X > 0) & (self.ball_vel_X > 2/3 * SCREENWIDTH)
+            chase = np.where(self.pad2_Y > self.ball_Y, -PAD_SPEED_2,
+                             np.where(self.pad2_Y < self.ball_Y, PAD_SPEED_2, 0))
+            self.pad2_vel = np.where(follow, chase, self.pad2_vel)
+            flip = self.rng.random_sample(self.num_envs) < AUTOMOVE_RANDOM_FLIP_RATE
+            self.pad2_vel = np.where(flip, -self.pad2_vel, self.pad2_vel)
+
+            self.pad2_Y = self.pad2_Y + self.pad2_vel
+            high = self.pad2_Y >= pad_high
+            self.pad2_Y = np.where(high, pad_high, self.pad2_Y)
+            self.pad2_vel = np.where(high, -self.pad2_vel, self.pad2_vel)
+            low = self.pad2_Y <= pad_low
+            self.pad2_Y = np.where(low, pad_low, self.pad2_Y)
+            self.pad2_vel = np.where(low, -self.pad2_vel, self.pad2_vel)
+
+        # ball's movement
+        ball_X = self.ball_X + self.ball_vel_X
+        ball_Y = self.ball_Y + self.ball_vel_Y
+        vel_X = self.ball_vel_X
+        vel_Y = self.ball_vel_Y
+        # vel_Y can be 0 only before the first frame, guard the divisions below
+        safe_vel_Y = np.where(vel_Y != 0, vel_Y, 1)
+
+        # run into the wall
+        top = ball_Y <= BALL_SIZE/2
+        ball_X = np.where(top & (vel_Y != 0), ball_X - (BALL_SIZE/2 - ball_Y) * vel_X / safe_vel_Y, ball_X)
+        ball_Y = np.where(top, BALL_SIZE/2, ball_Y)
+        vel_Y = np.where(top, -vel_Y, vel_Y)
+
+        bottom = (ball_Y >= SCREENHEIGHT - BALL_SIZE/2) & ~top
+        ball_X = np.where(bottom & (vel_Y != 0), ball_X - (ball_Y - SCREENHEIGHT + BALL_SIZE/2) * vel_X / safe_vel_Y, ball_X)
+        ball_Y = np.where(bottom, SCREENHEIGHT - BALL_SIZE/2, ball_Y)
+        vel_Y = np.where(bottom, -vel_Y, vel_Y)
+        self.at_wall = top | bottom
+
+        # run into paddle 1
+        virtual_Y = ball_Y - (self.pad1_X + BALL_SIZE/2 - ball_X) * vel_Y / vel_X
+        hit1 = (ball_X <= self.pad1_X + BALL_SIZE / 2) & \
+               (self.pad1_Y + PAD_HEIGHT/2 + BALL_SIZE/2 > virtual_Y) & \
+               (virtual_Y > self.pad1_Y - PAD_HEIGHT/2 - BALL_SIZE/2)
+        ball_X, ball_Y, vel_X, vel_Y = self._bounce(hit1, self.pad1_X + BALL_SIZE / 2, self.pad1_vel,
+                                                    virtual_Y, ball_X, ball_Y, vel_X, vel_Y)
+
+        # run into paddle 2
+        virtual_Y = ball_Y - (-self.pad2_X + BALL_SIZE/2 + ball_X) * vel_Y / vel_X
+        hit2 = (ball_X >= self.pad2_X - BALL_SIZE / 2) & \
+               (self.pad2_Y + PAD_HEIGHT/2 + BALL_SIZE/2 > virtual_Y) & \
+               (virtual_Y > self.pad2_Y - PAD_HEIGHT/2 - BALL_SIZE/2) & ~hit1
+        ball_X, ball_Y, vel_X, vel_Y = self._bounce(hit2, self.pad2_X - BALL_SIZE / 2, self.pad2_vel,
+                                                    virtual_Y, ball_X, ball_Y, vel_X, vel_Y)
+        self.at_paddle = hit1 | hit2
+
+        vel_Y = np.where(vel_Y == 0, 1, vel_Y)
+
+        self.ball_X = ball_X.astype(DTYPE)
+        self.ball_Y = ball_Y.astype(DTYPE)
+        self.ball_vel_X = vel_X.astype(DTYPE)
+        self.ball_vel_Y = vel_Y.astype(DTYPE)
+
+        # score or not
+        lost_1 = self.ball_X < BALL_SIZE/2
+        lost_2 = ~lost_1 & (self.ball_X > SCREENWIDTH - BALL_SIZE/2)
+        terminals = lost_1 | lost_2
+        rewards = np.zeros((self.num_envs, 2))
+        rewards[lost_1] = (PENALTY, REWARD)
+        rewards[lost_2] = (REWARD, PENALTY)
+        self.total_score_2[lost_1] += REWARD
+        self.total_score_1[lost_2] += REWARD
+
+        if out is not None:
+            self.render(out)
+        if terminals.any():
+            self._serve(terminals)
+            over = terminals & (np.maximum(self.total_score_1, self.total_score_2) >= MAX_SCORE)
+            self.total_score_1[over] = 0
+            self.total_score_2[over] = 0
+            self.pad1_Y[over] = SCREENHEIGHT / 2
+            self.pad2_Y[over] = SCREENWIDTH / 2
+
+        scores = np.stack([self.total_score_1, self.total_score_2], axis=1)
+        return rewards, terminals, scores
+
+    def render(self, out=None):
+        """
+        Draw the state of each player of every game, the same images that
+        Pong.render returns. Player 2's view is drawn directly mirrored.
+
+        Argument:
+            out: uint8 array of shape (num_envs, 2, SCREENWIDTH, SCREENHEIGHT, 3)
+            to draw into, or None to allocate a new one.
+        Return:
+            out, where out[k, 0] is the state of player 1 in game k and
+            out[k, 1] the state of player 2.
+        """
+        shape = (self.num_envs, 2, SCREENWIDTH, SCREENHEIGHT, 3)
+        if out is None:
+            out = np.empty(shape, dtype=np.uint8)
+        elif out.shape != shape:
+            raise ValueError('out must have shape ' + str(shape))
+        view1 = out[:, 0]
+        view2 = out[:, 1]
+
+        # the background covers the whole screen, so it is drawn at (0, 0) in both views
+        rasterizer.fill(view1, SPRITES['background'])
+        rasterizer.fill(view2, MIRRORED['background'])
+
+        ball_X = (self.ball_X - BALL_SIZE / 2).astype(np.int64)
+        ball_Y = (self.ball_Y - BALL_SIZE / 2).astype(np.int64)
+        pad1_X = np.full(self.num_envs, int(self.pad1_X - PAD_WIDTH / 2))
+        pad2_X = np.full(self.num_envs, int(self.pad2_X - PAD_WIDTH / 2))
+        pad1_Y = (self.pad1_Y - PAD_HEIGHT / 2).astype(np.int64)
+        pad2_Y = (self.pad2_Y - PAD_HEIGHT / 2).astype(np.int64)
+
+        # state1
+        rasterizer.blit_many(view1, SPRITES['ball'], ball_X, ball_Y)
+        rasterizer.blit_many(view1, SPRITES['paddle_self'], pad1_X, pad1_Y)
+        rasterizer.blit_many(view1, SPRITES['paddle_other'], pad2_X, pad2_Y)
+
+        # state2, x positions are mirrored
+        rasterizer.blit_many(view2, MIRRORED['ball'], SCREENWIDTH - ball_X - BALL_SIZE, ball_Y)
+        rasterizer.blit_many(view2, MIRRORED['paddle_other'], SCREENWIDTH - pad1_X - PAD_WIDTH, pad1_Y)
+        rasterizer.blit_many(view2, MIRRORED['paddle_self'], SCREENWIDTH - pad2_X - PAD_WIDTH, pad2_Y)
+        return out
+
+    def _bounce(self, hit, contact_X, pad_vel, virtual_Y, ball_X, ball_Y, vel_X, vel_Y):
+        """
+        Bounce the ball off a paddle in the games selected by hit, speeding it up
+        with the paddle's velocity. Returns the new ball position and velocity.
+        """
+        ball_Y = np.where(hit, virtual_Y, ball_Y)
+        ball_X = np.where(hit, contact_X, ball_X)
+        # speed change
+        vel_X = np.where(hit, -vel_X, vel_X)
+        boost = abs(pad_vel / 9)
+        vel_X = np.where(hit & (abs(vel_X) < BALL_SPEED_X_LIMIT),
+                         np.where(vel_X > 0, vel_X + boost, vel_X - boost), vel_X)
+
+        vel_Y = np.where(hit, vel_Y + pad_vel, vel_Y)
+        vel_Y = np.where(hit & (abs(vel_Y) >= BALL_SPEED_Y_LIMIT),
+                         np.where(vel_Y > 0, BALL_SPEED_Y_LIMIT, -BALL_SPEED_Y_LIMIT), vel_Y)
+        return ball_X, ball_Y, vel_X, vel_Y
@@ -0,0 +1,217 @@
+"""
+This script builds the 'VideoRecorder' class, a wrapper around Pong or
+HunterPrey that saves one episode in every n as a video, from a background
+thread, to watch the agents play without slowing their games down.
+
+After each step of a recorded episode, the frame the game's window shows
+(see the keep_window method of the games: both paddles drawn as
+'paddle_self' for Pong, every living prey as 'prey_self' for HunterPrey,
+rather than the view of one agent) is copied into a free slot of a
+preallocated ring of frames, and the slot is handed to the worker thread,
+which encodes it and gives the slot back. When no slot is free, the frame is
+dropped (and counted in dropped) rather than waiting for the thread. Steps of
+the episodes that are not recorded cost nothing more than the test.
+
+Episodes end where FrameStack restarts all the histories (see
+frame_stack.restarts): after a Pong point, and when a HunterPrey game is
+over. Each recorded episode goes into its own file, episode_<number>.<format>
+in the directory:
+    'mp4' or 'gif': encoded with imageio (mp4 also needs its ffmpeg plugin),
+    frames of shape (height, width, 3).
+    'npy': the raw frames, uint8 of shape (num_frames, width, height, 3) in
+    the layout of the games. Used instead of the other formats when imageio
+    can not write them.
+"""
+
+import os
+import shutil
+import threading
+
+try:
+    import queue
+except ImportError: # python 2
+    import Queue as queue
+
+import numpy as np
+
+import frame_stack
+
+FORMATS = ('mp4', 'gif', 'npy')
+
+
+class VideoRecorder:
+    def __init__(self, env, directory, every=100, capacity=64, format='mp4', fps=20):
+        """
+        Arguments:
+            env: a Pong or a HunterPrey instance which draws its full frame:
+            in 'human' mode, or in 'headless' mode with observation_type
+            'pixels'.
+            directory: path of the directory of the videos, created if needed.
+            every: int, record episodes 0, every, 2 * every, ...
+            capacity: int, number of frames in the ring.
+            format: 'mp4', 'gif' or 'npy', see FORMATS.
+            fps: frames per second of the videos.
+        """
+        if format not in FORMATS:
+            raise ValueError('format must be one of ' + str(FORMATS))
+        if not (env.render_mode == 'human' or (env.render_mode == 'headless' and env.observation_type == 'pixels')):
+            raise ValueError('the game does not draw its full frame')
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.env = env
+        self.directory = directory
+        self.every = int(every)
+        self.format = format
+        self.fps = fps
+        self.episode = 0   # number of the current episode
+        self.dropped = 0   # frames dropped because the ring was full
+        self.window = env.keep_window()
+        self.ring = np.zeros((capacity,) + self.window.shape, dtype=np.uint8)
+        self.free = queue.Queue()
+        for slot in range(capacity):
+            self.free.put(slot)
+        # (slot, episode) of the frames to encode, (None, episode) when an episode ends, None to stop
+        self.frames = queue.Queue()
+        self.files = [] # paths of the videos written so far
+        self.error = None
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def __getattr__(self, name):
+        return getattr(self.env, name)
+
+    def step(self, action_list):
+        """
+        Step the wrapped game and record its frame. Returns what its step
+        function returns.
+        """
+        result = self.env.step(action_list)
+        restart_now, restart_next = frame_stack.restarts(result)
+        if restart_now.any():
+            # HunterPrey game over: this frame is the first of the new game
+            self._end_episode()
+        if self.episode % self.every == 0:
+            try:
+                slot = self.free.get_nowait()
+            except queue.Empty:
+                self.dropped += 1
+            else:
+                self.ring[slot] = self.window
+                self.frames.put((slot, self.episode))
+        if restart_next.all():
+            # Pong point: this frame is the last of the game
+            self._end_episode()
+        return result
+
+    def _end_episode(self):
+        if self.episode % self.every == 0:
+            self.frames.put((None, self.episode))
+        self.episode += 1
+
+    def close(self):
+        """
+        Finish the video of the current episode, if it is recorded, and stop
+        the thread once every frame is encoded.
+        """
+        if self.thread is not None:
+            if self.episode % self.every == 0:
+                self.frames.put((None, self.episode))
+            self.frames.put(None)
+            self.thread.join()
+            self.thread = None
+        if self.error is not None:
+            raise self.error
+
+    def _run(self):
+        """
+        Main loop of the thread: encode the frames of each recorded episode
+        into its file. When writing a file fails, the error is kept (and
+        raised by close), the file is closed as it is and the remaining
+        frames of that episode are skipped.
+        """
+        writer = None
+        failed = None # episode whose file failed
+        while True:
+            item = self.frames.get()
+            if item is None:
+                return
+            slot, episode = item
+            try:
+                if slot is None:
+                    if writer is not None:
+                        self.files.append(writer.close())
+                        writer = None
+                    continue
+                if episode == failed:
+                    continue
+                if writer is None:
+                    writer = self._open(episode)
+                writer.append(self.ring[slot])
+            except Exception as error:
+                self.error = error
+                failed = episode
+                if writer is not None:
+                    try:
+                        self.files.append(writer.close())
+                    except Exception:
+                        pass
+                    writer = None
+            finally:
+                if slot is not None:
+                    self.free.put(slot)
+
+    def _open(self, episode):
+        """
+        Return the writer of the file of an episode.
+        """
+        path = os.path.join(self.directory, 'episode_%06d' % episode)
+        if self.format != 'npy':
+            try:
+                return _ImageioWriter(path + '.' + self.format, self.fps)
+            except Exception:
+                # imageio, or its plugin for this format, is not installed
+                self.format = 'npy'
+        return _NpyWriter(path + '.npy')
+
+
+class _ImageioWriter:
+    def __init__(self, path, fps):
+        import imageio
+        self.path = path
+        # without its ffmpeg plugin, imageio would pick a plugin that can not write videos
+        plugin = {'mp4': 'FFMPEG'}.get(path.rsplit('.', 1)[-1])
+        self.writer = imageio.get_writer(path, format=plugin, fps=fps)
+
+    def append(self, frame):
+        # the games index their frames as [x, y], images are [row, column]
+        self.writer.append_data(np.ascontiguousarray(frame.transpose(1, 0, 2)))
+
+    def close(self):
+        self.writer.close()
+        return self.path
+
+
+class _NpyWriter:
+    def __init__(self, path):
+        # the frames go into a raw file, the .npy is made once their number is known
+        self.path = path
+        self.raw = open(path + '.tmp', 'wb')
+        self.count = 0
+        self.shape = None
+
+    def append(self, frame):
+        self.shape = frame.shape
+        self.raw.write(frame.tobytes())
+        self.count += 1
+
+    def close(self):
+        self.raw.close()
+        with open(self.path, 'wb') as f:
+            np.lib.format.write_array_header_1_0(f, {'descr': np.lib.format.dtype_to_descr(np.dtype(np.uint8)),
+                                                     'fortran_order': False,
+                                                     'shape': (self.count,) + tuple(self.shape)})
+            with open(self.path + '.tmp', 'rb') as raw:
+                shutil.copyfileobj(raw, f)
+        os.remove(self.path + '.tmp')
+        return self.path